@@ -0,0 +1,83 @@
+"""同步 dblock 与异步 dblock 的并发吞吐对比
+
+在 appserv 目录下运行（需要本地 PostgreSQL 与 examdb 数据）：
+
+    python -m bench.bench_dblock --concurrency 50 --requests 500
+
+模拟 async 处理函数中的查询：每个“请求”执行一次班次名单查询，
+再加上一次 pg_sleep 模拟慢查询。同步版本会阻塞事件循环，
+请求实际上被串行执行；异步版本则可以在等待数据库时切换到其他请求。
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from serv.dblock import create_dpool, create_async_dpool
+
+DSN = os.getenv("DATABASE_URL", "host=localhost dbname=examdb user=examdb")
+
+ROSTER_SQL = """
+    SELECT s.sn AS stu_sn, s.no AS stu_no, s.name AS stu_name, g.grade
+    FROM student AS s
+    JOIN class_student AS cs ON s.sn = cs.stu_sn
+    LEFT JOIN class_grade AS g ON g.stu_sn = s.sn AND g.class_sn = cs.class_sn
+    WHERE cs.class_sn = (SELECT min(sn) FROM class)
+    ORDER BY s.no
+"""
+
+
+async def run_sync(args):
+    dblock, lifespan = create_dpool(DSN, min_size=args.pool_size)
+    sem = asyncio.Semaphore(args.concurrency)
+
+    async def one_request():
+        async with sem:
+            # 与旧处理函数相同：在 async def 中直接调用同步 dblock
+            with dblock() as db:
+                db.execute("SELECT pg_sleep(%s)", (args.sleep,))
+                db.execute(ROSTER_SQL)
+                db.fetchall()
+
+    async with lifespan(None):
+        return await _timed(one_request, args.requests)
+
+
+async def run_async(args):
+    dblock, lifespan = create_async_dpool(DSN, min_size=args.pool_size)
+    sem = asyncio.Semaphore(args.concurrency)
+
+    async def one_request():
+        async with sem:
+            async with dblock() as db:
+                await db.execute("SELECT pg_sleep(%s)", (args.sleep,))
+                await db.execute(ROSTER_SQL)
+                await db.fetchall()
+
+    async with lifespan(None):
+        return await _timed(one_request, args.requests)
+
+
+async def _timed(one_request, n):
+    started = time.perf_counter()
+    await asyncio.gather(*(one_request() for _ in range(n)))
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--pool-size", type=int, default=10)
+    parser.add_argument("--sleep", type=float, default=0.01,
+                        help="每个请求附加的数据库等待时间（秒）")
+    args = parser.parse_args()
+
+    for name, runner in (("sync dblock", run_sync), ("async dblock", run_async)):
+        elapsed = asyncio.run(runner(args))
+        print(f"{name:>13}: {args.requests} 请求 / {elapsed:.2f}s = "
+              f"{args.requests / elapsed:.1f} req/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""登录风暴下的 API 延迟基准
+
+先启动服务（关闭登录限流，否则同一 IP 每分钟只能登录 5 次）：
+
+    RATELIMIT_ENABLED=0 uvicorn main:app --port 8501
+
+再在 appserv 目录下运行：
+
+    python -m bench.bench_login_storm --logins 200 --concurrency 50
+
+同时发起大量 /api/token 登录请求，并持续探测一个轻量接口
+（/api/users/me/），统计探测请求在风暴期间的 p50/p99 延迟。
+哈希若在事件循环中执行，探测请求会被成批阻塞，p99 明显升高。
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def login(client, args):
+    resp = await client.post("/api/token", json={
+        "username": args.username, "password": args.password,
+    })
+    resp.raise_for_status()
+    return resp.json()["access_token"]
+
+
+async def storm(client, args, latencies, statuses):
+    sem = asyncio.Semaphore(args.concurrency)
+
+    async def one():
+        async with sem:
+            started = time.perf_counter()
+            resp = await client.post("/api/token", json={
+                "username": args.username, "password": args.password,
+            })
+            latencies.append(time.perf_counter() - started)
+            statuses[resp.status_code] = statuses.get(resp.status_code, 0) + 1
+
+    await asyncio.gather(*(one() for _ in range(args.logins)))
+
+
+async def probe(client, token, stop, latencies):
+    headers = {"Authorization": f"Bearer {token}"}
+    while not stop.is_set():
+        started = time.perf_counter()
+        await client.get("/api/users/me/", headers=headers)
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(0.005)
+
+
+async def run(args):
+    async with httpx.AsyncClient(base_url=args.url, timeout=60) as client:
+        token = await login(client, args)
+        login_latencies, probe_latencies, statuses = [], [], {}
+        stop = asyncio.Event()
+        probe_task = asyncio.create_task(probe(client, token, stop, probe_latencies))
+        started = time.perf_counter()
+        await storm(client, args, login_latencies, statuses)
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await probe_task
+
+    print(f"登录 {args.logins} 次，用时 {elapsed:.2f}s，状态码 {statuses}")
+    for name, samples in (("登录", login_latencies), ("探测", probe_latencies)):
+        print(f"{name}: n={len(samples)} "
+              f"p50={statistics.median(samples) * 1000:.1f}ms "
+              f"p99={percentile(samples, 0.99) * 1000:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8501")
+    parser.add_argument("--username", default="jiaomi_admin")
+    parser.add_argument("--password", default="Admin@1234")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
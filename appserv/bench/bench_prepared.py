@@ -0,0 +1,78 @@
+"""热点语句预备前后的单次查询耗时对比
+
+在 appserv 目录下运行（需要本地 PostgreSQL 与 examdb 数据）：
+
+    python -m bench.bench_prepared --iterations 2000
+
+对语句目录中每条可预热的只读语句，分别在两条连接上串行执行：
+一条关闭自动预备（prepare_threshold=None，每次都解析/规划），
+一条先执行 warm_up 再以 prepare=True 执行（只执行已规划的语句）。
+两者之差即热路径上每次查询节省的解析/规划开销。
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+import psycopg
+
+from serv.statements import STATEMENTS, typed_params, warm_up
+
+DSN = os.getenv("DATABASE_URL", "host=localhost dbname=examdb user=examdb")
+
+
+async def sample_params(conn) -> dict:
+    """用真实数据替换预热参数，使查询有结果可返回"""
+    cur = await conn.execute("""
+        SELECT
+            (SELECT username FROM sys_users ORDER BY user_sn LIMIT 1) AS username,
+            (SELECT class_sn FROM class_student GROUP BY class_sn
+             ORDER BY COUNT(*) DESC LIMIT 1) AS class_sn
+    """)
+    username, class_sn = await cur.fetchone()  # type: ignore
+    await conn.rollback()
+    return {"username": username or "", "class_sn": class_sn or 0}
+
+
+async def measure(conn, sql: str, params: dict, iterations: int, prepare: bool) -> list[float]:
+    timings = []
+    async with conn.cursor() as cur:
+        for _ in range(iterations):
+            started = time.perf_counter()
+            await cur.execute(sql, params, prepare=prepare)
+            await cur.fetchall()
+            timings.append(time.perf_counter() - started)
+    await conn.rollback()
+    return timings
+
+
+async def main_async(args):
+    plain = await psycopg.AsyncConnection.connect(DSN, prepare_threshold=None)
+    prepared = await psycopg.AsyncConnection.connect(DSN)
+    async with plain, prepared:
+        await warm_up(prepared)
+        values = await sample_params(plain)
+
+        print(f"{'statement':<20} {'unprepared':>12} {'prepared':>12} {'saved':>10}")
+        for stmt in STATEMENTS.values():
+            if stmt.warmup is None:
+                continue
+            params = typed_params({key: values[key] for key in stmt.warmup})
+            before = await measure(plain, stmt.sql, params, args.iterations, prepare=False)
+            after = await measure(prepared, stmt.sql, params, args.iterations, prepare=True)
+            p50_before = statistics.median(before) * 1e6
+            p50_after = statistics.median(after) * 1e6
+            print(f"{stmt.name:<20} {p50_before:>10.1f}us {p50_after:>10.1f}us "
+                  f"{p50_before - p50_after:>8.1f}us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""行工厂微基准：旧版 dict_row_factory 与缓存行类型的对比
+
+不需要数据库，在 appserv 目录下运行：
+
+    python -m bench.bench_rows
+
+每一轮模拟一次“执行查询 + 构造所有行 + 转为 dict”，
+分别统计小结果集（单行查询）和整页结果集下的 rows/s。
+"""
+import argparse
+import datetime as dt
+import time
+from dataclasses import asdict, make_dataclass
+from types import SimpleNamespace
+
+from serv.rows import dict_row_factory, row_to_dict
+
+COLUMNS = ["stu_sn", "stu_no", "stu_name", "gender", "enrollment_date"]
+VALUES = (10000, "230650101", "张三", "M", dt.date(2023, 9, 1))
+
+
+def legacy_dict_row_factory(cursor):
+    # 改造前 serv/dblock.py 中的实现：每次执行都新建一个数据类
+    if cursor.connection.autocommit:
+        cursor.execute("SET TRANSACTION READ ONLY")
+    if cursor.description is None:
+        return None
+
+    field_names = [c.name for c in cursor.description]
+    _dataclass = make_dataclass("Row", field_names)
+
+    def make_row(values):
+        return _dataclass(*values)
+
+    return make_row
+
+
+def fake_cursor():
+    return SimpleNamespace(
+        connection=SimpleNamespace(autocommit=False),
+        description=[SimpleNamespace(name=n) for n in COLUMNS],
+    )
+
+
+def run(factory, to_dict, executions, rows_per_execution):
+    cursor = fake_cursor()
+    started = time.perf_counter()
+    for _ in range(executions):
+        make_row = factory(cursor)
+        [to_dict(make_row(VALUES)) for _ in range(rows_per_execution)]
+    elapsed = time.perf_counter() - started
+    return executions * rows_per_execution / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--executions", type=int, default=2000)
+    args = parser.parse_args()
+
+    for rows in (1, 20, 100):
+        legacy = run(legacy_dict_row_factory, asdict, args.executions, rows)
+        cached = run(dict_row_factory, row_to_dict, args.executions, rows)
+        print(f"{rows:>4} 行/次查询: 旧版 {legacy:>12,.0f} rows/s, "
+              f"缓存行类型 {cached:>12,.0f} rows/s ({cached / legacy:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
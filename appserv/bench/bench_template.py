@@ -0,0 +1,94 @@
+"""成绩导入模板生成基准：pandas + BytesIO 与 constant_memory 流式写入的对比
+
+不需要数据库，在 appserv 目录下运行：
+
+    python -m bench.bench_template --rows 10000
+
+每种实现在独立子进程中运行，统计峰值 RSS（含模块导入）、
+首块数据可输出的时间（time-to-first-byte）和总耗时。
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+
+TEMPLATE_COLUMNS = ["学号", "姓名", "成绩", "备注"]
+FETCH_SIZE = 1000
+
+
+def fake_roster(rows):
+    return [(f"{230650000 + i:09d}", f"学生{i:05d}") for i in range(rows)]
+
+
+def run_legacy(roster):
+    # 改造前 download_template 的实现：DataFrame -> openpyxl -> BytesIO -> getvalue()
+    from io import BytesIO
+    import pandas as pd
+
+    started = time.perf_counter()
+    df = pd.DataFrame([{"学号": no, "姓名": name, "成绩": "", "备注": ""} for no, name in roster])
+    buffer = BytesIO()
+    df.to_excel(buffer, index=False, engine="openpyxl")
+    buffer.seek(0)
+    body = buffer.getvalue()
+    first_byte = time.perf_counter() - started
+    return first_byte, time.perf_counter() - started, len(body)
+
+
+def run_streaming(roster):
+    from serv.xlsx import StreamingWorkbook
+
+    started = time.perf_counter()
+    book = StreamingWorkbook(TEMPLATE_COLUMNS)
+    try:
+        for start in range(0, len(roster), FETCH_SIZE):
+            book.write_rows(roster[start:start + FETCH_SIZE])
+        book.close()
+        first_byte, size = None, 0
+        while chunk := book.read_chunk():
+            if first_byte is None:
+                first_byte = time.perf_counter() - started
+            size += len(chunk)
+    finally:
+        book.discard()
+    return first_byte, time.perf_counter() - started, size
+
+
+VARIANTS = {"legacy": run_legacy, "streaming": run_streaming}
+
+
+def child(variant, rows):
+    roster = fake_roster(rows)
+    first_byte, elapsed, size = VARIANTS[variant](roster)
+    # Linux 下 ru_maxrss 单位为 KB
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"first_byte": first_byte, "elapsed": elapsed, "size": size, "peak_kb": peak}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--child", choices=VARIANTS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.rows)
+        return
+
+    for variant in VARIANTS:
+        out = subprocess.run(
+            [sys.executable, "-m", "bench.bench_template", "--child", variant, "--rows", str(args.rows)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        result = json.loads(out)
+        print(f"{variant:>9}: rows={args.rows} "
+              f"peak_rss={result['peak_kb'] / 1024:.1f}MB "
+              f"ttfb={result['first_byte'] * 1000:.1f}ms "
+              f"total={result['elapsed'] * 1000:.1f}ms "
+              f"size={result['size'] / 1024:.1f}KB")
+
+
+if __name__ == "__main__":
+    main()
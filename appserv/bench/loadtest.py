@@ -0,0 +1,328 @@
+"""HTTP 压测：按真实业务场景模拟并发用户
+
+先准备数据库（建议用 dbscripts/gen_data.py 生成的大数据量测试库，
+gradebook / enrollment 场景会修改成绩与选课数据，不要对生产库运行），
+关闭登录限流后启动服务：
+
+    RATELIMIT_ENABLED=0 uvicorn main:app --port 8501 --workers 1
+
+再在 appserv 目录下运行：
+
+    python -m bench.loadtest run --scenario gradebook --users 20 --duration 30
+    python -m bench.loadtest run --scenario all
+    python -m bench.loadtest compare bench/results/gradebook-abc1234.json bench/results/gradebook-def5678.json
+
+场景：
+    login       登录风暴：并发调用 /api/token
+    gradebook   教师录入成绩：加载名单与成绩，定时自动保存 /api/grade/batch，轮询版本
+    enrollment  教秘批量选课：查看名单、搜索学生、整体更新班次学生
+    transcript  成绩单导出：单个学生 PDF/xlsx 与按班次批量导出 ZIP
+
+结果按接口（路由模板）统计请求数、错误数、吞吐及 p50/p95/p99，
+保存为 JSON（含当前 git 提交），可用 compare 对比两次结果。
+随机数按 --seed 与用户序号生成，同样的参数每次产生相同的请求序列。
+"""
+import argparse
+import asyncio
+import datetime as dt
+import json
+import os
+import random
+import subprocess
+import time
+from pathlib import Path
+
+import httpx
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            check=True, capture_output=True, text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+class Recorder:
+    """按接口记录每次请求的耗时与状态码"""
+
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = {}
+        self.statuses: dict[str, dict[int, int]] = {}
+        self.errors: dict[str, int] = {}
+
+    def add(self, label: str, elapsed: float, status: int | None):
+        self.latencies.setdefault(label, []).append(elapsed)
+        statuses = self.statuses.setdefault(label, {})
+        statuses[status or 0] = statuses.get(status or 0, 0) + 1
+        # 304 为正常的缓存验证结果，不计为错误
+        if status is None or status >= 400:
+            self.errors[label] = self.errors.get(label, 0) + 1
+
+    def summary(self, elapsed: float) -> dict:
+        endpoints = {}
+        for label, samples in sorted(self.latencies.items()):
+            endpoints[label] = stats(samples, elapsed)
+            endpoints[label]["errors"] = self.errors.get(label, 0)
+            endpoints[label]["statuses"] = self.statuses[label]
+        everything = [s for samples in self.latencies.values() for s in samples]
+        total = stats(everything, elapsed) if everything else {}
+        total["errors"] = sum(self.errors.values())
+        return {"endpoints": endpoints, "total": total}
+
+
+def stats(samples: list[float], elapsed: float) -> dict:
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "rps": round(len(ordered) / elapsed, 2),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 2),
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 2),
+    }
+
+
+class Session:
+    """一个模拟用户：带令牌的 HTTP 客户端，请求按 label 记录"""
+
+    def __init__(self, client: httpx.AsyncClient, recorder: Recorder, token: str | None = None):
+        self.client = client
+        self.recorder = recorder
+        self.headers = {"Authorization": f"Bearer {token}"} if token else {}
+
+    async def request(self, label: str, method: str, url: str, **kwargs) -> httpx.Response | None:
+        headers = {**self.headers, **kwargs.pop("headers", {})}
+        started = time.perf_counter()
+        try:
+            # 流式读取完整响应体，导出类接口的耗时包含传输时间
+            async with self.client.stream(method, url, headers=headers, **kwargs) as resp:
+                await resp.aread()
+        except httpx.HTTPError:
+            self.recorder.add(label, time.perf_counter() - started, None)
+            return None
+        self.recorder.add(label, time.perf_counter() - started, resp.status_code)
+        return resp
+
+
+async def login(client: httpx.AsyncClient, username: str, password: str) -> str:
+    resp = await client.post("/api/token", json={"username": username, "password": password})
+    resp.raise_for_status()
+    return resp.json()["access_token"]
+
+
+async def fixtures(session: Session) -> dict:
+    """读取场景需要的班次与学生"""
+    resp = await session.client.get("/api/class/list", params={"page_size": 100},
+                                    headers=session.headers)
+    resp.raise_for_status()
+    classes = [row["class_sn"] for row in resp.json()["data"]]
+    resp = await session.client.get("/api/student/list", params={"page_size": 100},
+                                    headers=session.headers)
+    resp.raise_for_status()
+    students = [(row["stu_sn"], row["stu_no"]) for row in resp.json()["data"]]
+    if not classes or not students:
+        raise SystemExit("数据库中没有班次或学生，请先导入测试数据")
+    return {"classes": classes, "students": students}
+
+
+# ---- 场景 ----
+# 每个场景函数模拟一个用户，直到 deadline 为止循环执行
+
+async def scenario_login(session: Session, rng: random.Random, data: dict, args, deadline: float):
+    while time.perf_counter() < deadline:
+        await session.request("POST /api/token", "POST", "/api/token", json={
+            "username": args.username, "password": args.password,
+        })
+
+
+async def scenario_gradebook(session: Session, rng: random.Random, data: dict, args, deadline: float):
+    class_sn = rng.choice(data["classes"])
+    etag = None
+    resp = await session.request("GET /api/class/{class_sn}/students-with-grades", "GET",
+                                 f"/api/class/{class_sn}/students-with-grades")
+    roster = resp.json() if resp is not None and resp.status_code == 200 else []
+    if resp is not None:
+        etag = resp.headers.get("etag")
+
+    while time.perf_counter() < deadline:
+        # 录入几名学生的成绩后自动保存
+        await asyncio.sleep(rng.uniform(0.5, 1.5) * args.think)
+        if roster:
+            edited = rng.sample(roster, min(len(roster), rng.randint(1, 5)))
+            await session.request("POST /api/grade/batch", "POST", "/api/grade/batch", json={
+                "grades": [
+                    {"stu_sn": row["stu_sn"], "class_sn": class_sn, "grade": rng.randint(40, 100)}
+                    for row in edited
+                ],
+            })
+
+        # 检查其他人的改动，有变化时重新加载（带 If-None-Match）
+        await session.request("GET /api/grade/check-conflict/{class_sn}", "GET",
+                              f"/api/grade/check-conflict/{class_sn}")
+        resp = await session.request("GET /api/class/{class_sn}/students-with-grades", "GET",
+                                     f"/api/class/{class_sn}/students-with-grades",
+                                     headers={"If-None-Match": etag} if etag else {})
+        if resp is not None and resp.status_code == 200:
+            roster = resp.json()
+            etag = resp.headers.get("etag")
+
+
+async def scenario_enrollment(session: Session, rng: random.Random, data: dict, args, deadline: float):
+    while time.perf_counter() < deadline:
+        class_sn = rng.choice(data["classes"])
+        resp = await session.request("GET /api/class/{class_sn}/students", "GET",
+                                     f"/api/class/{class_sn}/students")
+        if resp is None or resp.status_code != 200:
+            continue
+        current = [row["stu_sn"] for row in resp.json()]
+
+        # 按学号前缀搜索并选中若干学生
+        _, stu_no = rng.choice(data["students"])
+        await session.request("GET /api/student/search", "GET", "/api/student/search",
+                              params={"q": stu_no[:rng.randint(4, 7)], "exclude_class_sn": class_sn})
+        added = rng.sample(data["students"], min(len(data["students"]), rng.randint(5, 30)))
+        await session.request("PUT /api/class/{class_sn}/students", "PUT",
+                              f"/api/class/{class_sn}/students", json={
+                                  "student_sns": sorted(set(current) | {sn for sn, _ in added}),
+                              })
+        await asyncio.sleep(rng.uniform(0.5, 1.5) * args.think)
+
+
+async def scenario_transcript(session: Session, rng: random.Random, data: dict, args, deadline: float):
+    while time.perf_counter() < deadline:
+        if rng.random() < 0.1:
+            class_sn = rng.choice(data["classes"])
+            await session.request("GET /api/student/reports/export", "GET",
+                                  "/api/student/reports/export",
+                                  params={"class_sn": class_sn, "format": "xlsx"})
+        else:
+            stu_sn, _ = rng.choice(data["students"])
+            fmt = rng.choice(("pdf", "xlsx"))
+            await session.request("GET /api/student/{stu_sn}/report/export", "GET",
+                                  f"/api/student/{stu_sn}/report/export", params={"format": fmt})
+        await asyncio.sleep(rng.uniform(0.5, 1.5) * args.think)
+
+
+SCENARIOS = {
+    "login": scenario_login,
+    "gradebook": scenario_gradebook,
+    "enrollment": scenario_enrollment,
+    "transcript": scenario_transcript,
+}
+
+
+async def run_scenario(name: str, args) -> dict:
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        token = await login(client, args.username, args.password)
+        recorder = Recorder()
+        data = await fixtures(Session(client, recorder, token))
+
+        deadline = time.perf_counter() + args.duration
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            SCENARIOS[name](Session(client, recorder, token),
+                            random.Random(f"{args.seed}-{name}-{i}"), data, args, deadline)
+            for i in range(args.users)
+        ))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "meta": {
+            "scenario": name,
+            "commit": git_commit(),
+            "time": dt.datetime.now().isoformat(timespec="seconds"),
+            "url": args.url,
+            "users": args.users,
+            "duration": round(elapsed, 2),
+            "think": args.think,
+            "seed": args.seed,
+        },
+        **recorder.summary(elapsed),
+    }
+
+
+def print_result(result: dict):
+    meta = result["meta"]
+    print(f"\n[{meta['scenario']}] commit={meta['commit']} users={meta['users']} "
+          f"duration={meta['duration']}s")
+    print(f"{'endpoint':<52} {'count':>7} {'err':>5} {'rps':>8} "
+          f"{'p50':>9} {'p95':>9} {'p99':>9}")
+    rows = [*result["endpoints"].items(), ("TOTAL", result["total"])]
+    for label, s in rows:
+        if not s.get("count"):
+            continue
+        print(f"{label:<52} {s['count']:>7} {s['errors']:>5} {s['rps']:>8.1f} "
+              f"{s['p50_ms']:>7.1f}ms {s['p95_ms']:>7.1f}ms {s['p99_ms']:>7.1f}ms")
+
+
+def run(args):
+    names = list(SCENARIOS) if args.scenario == "all" else [args.scenario]
+    for name in names:
+        result = asyncio.run(run_scenario(name, args))
+        print_result(result)
+        out = Path(args.out) if args.out and len(names) == 1 else \
+            RESULTS_DIR / f"{name}-{result['meta']['commit']}.json"
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_text(json.dumps(result, ensure_ascii=False, indent=2))
+        print(f"结果已保存到 {out}")
+
+
+def compare(args):
+    base = json.loads(Path(args.base).read_text())
+    head = json.loads(Path(args.head).read_text())
+    print(f"{base['meta']['scenario']}: {base['meta']['commit']} -> {head['meta']['commit']}")
+    print(f"{'endpoint':<52} {'rps':>16} {'p50':>18} {'p95':>18} {'p99':>18}")
+
+    def change(key, old, new):
+        if old[key] == 0:
+            return f"{new[key]:>9.1f}"
+        return f"{new[key]:>9.1f} {(new[key] - old[key]) / old[key]:>+6.0%}"
+
+    rows = [(label, s, head["endpoints"].get(label)) for label, s in base["endpoints"].items()]
+    rows.append(("TOTAL", base["total"], head["total"]))
+    for label, old, new in rows:
+        if not new or not old.get("count") or not new.get("count"):
+            print(f"{label:<52} {'(missing)':>16}")
+            continue
+        print(f"{label:<52} {change('rps', old, new):>16} {change('p50_ms', old, new):>18} "
+              f"{change('p95_ms', old, new):>18} {change('p99_ms', old, new):>18}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="运行场景并保存结果")
+    run_parser.add_argument("--scenario", choices=[*SCENARIOS, "all"], default="all")
+    run_parser.add_argument("--url", default=os.getenv("LOADTEST_URL", "http://localhost:8501"))
+    run_parser.add_argument("--username", default="jiaomi_admin")
+    run_parser.add_argument("--password", default="Admin@1234")
+    run_parser.add_argument("--users", type=int, default=20, help="并发用户数")
+    run_parser.add_argument("--duration", type=float, default=30, help="每个场景持续时间（秒）")
+    run_parser.add_argument("--think", type=float, default=1.0, help="用户操作间隔的平均值（秒）")
+    run_parser.add_argument("--timeout", type=float, default=60)
+    run_parser.add_argument("--seed", type=int, default=1)
+    run_parser.add_argument("--out", help="结果文件（默认 bench/results/<场景>-<提交>.json）")
+    run_parser.set_defaults(func=run)
+
+    compare_parser = sub.add_parser("compare", help="对比两次结果")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("head")
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
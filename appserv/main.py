@@ -5,6 +5,8 @@ from serv.course_class import router as class_router
 from serv.student import router as student_router 
 from serv.grade import router as grade_router
 from serv.login import router as login_router
+from serv.internal import router as internal_router
+from serv.stats import router as stats_router
 
 # 在main.py中添加路由注册
 app.include_router(selection_router)
@@ -12,4 +14,6 @@ app.include_router(course_router)
 app.include_router(class_router)
 app.include_router(student_router)
 app.include_router(grade_router)
-app.include_router(login_router)
\ No newline at end of file
+app.include_router(login_router)
+app.include_router(internal_router)
+app.include_router(stats_router)
\ No newline at end of file
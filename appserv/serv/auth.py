@@ -5,15 +5,20 @@ from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from fastapi_cache import FastAPICache
-from fastapi_cache.backends.redis import RedisBackend  # 需要安装redis依赖
 from fastapi_cache.decorator import cache
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from pydantic import BaseModel, field_validator
+import json
 import os
+import secrets
 
 from .config import dblock
+from .statements import execute
 from .error import ConflictError, InvalidError
+from .authcache import token_cache, token_digest
+from .cache import NS_AUTH, cache_key
+from .pwhash import PasswordHasher, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE
 
 
 
@@ -30,6 +35,8 @@ pwd_context = CryptContext(
     deprecated="auto",
     bcrypt__rounds=12  # 增加计算成本
 )
+# bcrypt 在专用线程池中执行，不占用事件循环
+pwd_hasher = PasswordHasher(pwd_context, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE)
 
 # OAuth2 方案
 oauth2_scheme = HTTPBearer()
@@ -48,22 +55,16 @@ class User(BaseModel):
     class Config:
         from_attributes = True
 
-def verify_password(plain_password: str, hashed_password: str):
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password: str, hashed_password: str):
+    return await pwd_hasher.verify(plain_password, hashed_password)
 
-def get_password_hash(password: str):
-    return pwd_context.hash(password)
+async def get_password_hash(password: str):
+    return await pwd_hasher.hash(password)
 
 async def get_user(username: str) -> Optional[User]:
-    with dblock() as db:
-        db.execute("""
-            SELECT user_sn, username 
-            FROM sys_users 
-            WHERE username = %(username)s
-            """,
-            {"username": username}
-        )
-        row = db.fetchone()
+    async with dblock() as db:
+        await execute(db, "user.by_name", {"username": username})
+        row = await db.fetchone()
     
         if not row:
             return None
@@ -71,18 +72,11 @@ async def get_user(username: str) -> Optional[User]:
     return User(user_sn=row.user_sn, user_name=row.username) # type: ignore
 
 async def authenticate_user(username: str, password: str) -> Optional[User]:
-    with dblock() as db:
-        db.execute("""
-            SELECT u.user_sn, u.username, p.hashed_password 
-            FROM sys_users u
-            JOIN user_passwords p ON u.user_sn = p.user_sn
-            WHERE u.username = %(username)s
-            """, 
-            {"username": username}
-        )
-        row = db.fetchone()
+    async with dblock() as db:
+        await execute(db, "user.credentials", {"username": username})
+        row = await db.fetchone()
     
-    if not row or not verify_password(password, row.hashed_password):
+    if not row or not await verify_password(password, row.hashed_password):
         return None
     
     return User(user_sn=row.user_sn, user_name=row.username)
@@ -101,19 +95,66 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(oauth2_scheme)) -> User:
     token = credentials.credentials  # 关键修复：提取真正的token字符串
+    return await user_from_token(token)
+
+
+# 一次性票据有效期（秒）：EventSource 无法设置请求头，用票据代替放在查询参数中的 JWT
+TICKET_TTL = 30
+
+
+async def issue_ticket(user: User, scope: str) -> str:
+    """签发只能用于 scope、只能使用一次的短期票据
+
+    票据保存在缓存后端中；多个 worker 时需要共享后端（redis/file），
+    否则换票请求可能落到没有该票据的 worker 上。
+    """
+    ticket = secrets.token_urlsafe(32)
+    await FastAPICache.get_backend().set(
+        cache_key(NS_AUTH, "ticket", token_digest(ticket)),
+        json.dumps({"user": user.model_dump(), "scope": scope}).encode(),
+        expire=TICKET_TTL,
+    )
+    return ticket
+
+
+async def redeem_ticket(ticket: str, scope: str) -> User:
+    """校验并作废票据，返回签发时的用户"""
+    backend = FastAPICache.get_backend()
+    key = cache_key(NS_AUTH, "ticket", token_digest(ticket))
+    raw = await backend.get(key)
+    entry = None
+    if raw:
+        await backend.clear(key=key)
+        entry = json.loads(raw)
+    if not entry or entry["scope"] != scope:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="票据无效或已过期",
+        )
+    return User(**entry["user"])
+
+
+async def user_from_token(token: str) -> User:
+    # 缓存键为令牌摘要；进程内命中时不解码 JWT
+    digest = token_digest(token)
+    user = await token_cache.get(digest)
+    if user is not None:
+        return user
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
 
-    # 生成缓存键
-    cache_key = f"user:{token}"
     try:
-        # 尝试从缓存获取
-        cached_user = await FastAPICache.get_backend().get(cache_key)
-        if cached_user:
-            return User(**cached_user)
+        # 尝试从共享缓存获取
+        shared = await token_cache.get_shared(digest)
+        if shared:
+            cached_user, expires_at = shared
+            user = User(**cached_user)
+            token_cache.put_local(digest, user, expires_at)
+            return user
         
         # 缓存未命中，从数据库获取
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -126,8 +167,10 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(o
         if user is None:
             raise credentials_exception   
         
-        # 缓存用户信息（有效期5分钟）
-        await FastAPICache.get_backend().set(cache_key, user.model_dump(), expire=300)
+        # 缓存用户信息（有效期不超过令牌的过期时间）
+        expires_at = token_cache.expires_at(payload.get("exp"))
+        token_cache.put_local(digest, user, expires_at)
+        await token_cache.put_shared(digest, user.model_dump(), expires_at)
         
         return user         
     
@@ -0,0 +1,124 @@
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+
+from fastapi_cache import FastAPICache
+
+from .cache import CACHE_BACKEND, NS_AUTH, cache_key
+
+# 进程内缓存条目数上限与默认有效期（秒）
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "4096"))
+AUTH_CACHE_TTL = int(os.getenv("AUTH_CACHE_TTL", "300"))
+# 是否把缓存同步写入共享后端（FastAPICache 后端）；后端不是进程内存时默认开启
+AUTH_CACHE_SHARED = os.getenv(
+    "AUTH_CACHE_SHARED", "0" if CACHE_BACKEND == "memory" else "1"
+) == "1"
+
+
+def token_digest(token: str) -> str:
+    """缓存键使用令牌摘要，不在内存/后端中保存完整 JWT"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class TokenCache:
+    """get_current_user 的两级缓存
+
+    L1：进程内 LRU，命中时不解码 JWT；
+    L2：可选的共享后端（FastAPICache 后端），多个 worker 之间共享。
+    条目有效期不超过令牌自身的 exp。按用户失效时，同时在 L2 写入撤销时间，
+    其他 worker 的 L1 或 L2 条目早于撤销时间时视为未命中
+    （启用共享后端时，L1 命中也要读一次撤销标记）。
+    """
+
+    def __init__(self, max_entries: int, ttl: int, shared: bool):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.shared = shared
+        # 摘要 -> (用户, 截止时间, 缓存时间)
+        self._entries: OrderedDict[str, tuple[object, float, float]] = OrderedDict()
+        self._by_user: dict[int, set[str]] = {}
+
+    async def get(self, digest: str):
+        """查 L1；启用共享后端时核对撤销标记，其他 worker 撤销后不再命中"""
+        user = self.get_local(digest)
+        if user is None or not self.shared:
+            return user
+        if await self._revoked(user.user_sn, self._entries[digest][2]):
+            self._drop(digest)
+            return None
+        return user
+
+    def get_local(self, digest: str):
+        entry = self._entries.get(digest)
+        if entry is None:
+            return None
+        user, expires_at, _ = entry
+        if expires_at <= time.time():
+            self._drop(digest)
+            return None
+        self._entries.move_to_end(digest)
+        return user
+
+    def put_local(self, digest: str, user, expires_at: float):
+        self._entries[digest] = (user, expires_at, time.time())
+        self._entries.move_to_end(digest)
+        self._by_user.setdefault(user.user_sn, set()).add(digest)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+
+    def expires_at(self, token_exp: float | None) -> float:
+        """缓存截止时间：默认 ttl 与令牌 exp 取较早者"""
+        expires_at = time.time() + self.ttl
+        return min(expires_at, token_exp) if token_exp else expires_at
+
+    async def get_shared(self, digest: str) -> tuple[dict, float] | None:
+        """从共享后端读取 (用户字段, 截止时间)"""
+        if not self.shared:
+            return None
+        backend = FastAPICache.get_backend()
+        raw = await backend.get(cache_key(NS_AUTH, "token", digest))
+        if not raw:
+            return None
+        entry = json.loads(raw)
+        if await self._revoked(entry["user"]["user_sn"], entry["cached_at"]):
+            return None
+        return entry["user"], entry["expires_at"]
+
+    async def _revoked(self, user_sn: int, cached_at: float) -> bool:
+        """条目缓存之后该用户是否被撤销过"""
+        revoked_at = await FastAPICache.get_backend().get(cache_key(NS_AUTH, "revoked", user_sn))
+        return bool(revoked_at) and float(revoked_at) >= cached_at
+
+    async def put_shared(self, digest: str, user: dict, expires_at: float):
+        if not self.shared:
+            return
+        expire = int(expires_at - time.time())
+        if expire <= 0:
+            return
+        value = {"user": user, "expires_at": expires_at, "cached_at": time.time()}
+        await FastAPICache.get_backend().set(
+            cache_key(NS_AUTH, "token", digest), json.dumps(value).encode(), expire=expire
+        )
+
+    async def invalidate_user(self, user_sn: int):
+        """修改密码、删除用户等操作后调用，丢弃该用户的所有缓存条目"""
+        for digest in self._by_user.pop(user_sn, set()):
+            self._entries.pop(digest, None)
+        if self.shared:
+            backend = FastAPICache.get_backend()
+            await backend.set(
+                cache_key(NS_AUTH, "revoked", user_sn), str(time.time()).encode(), expire=self.ttl
+            )
+
+    def _drop(self, digest: str):
+        user, _, _ = self._entries.pop(digest)
+        digests = self._by_user.get(user.user_sn)
+        if digests:
+            digests.discard(digest)
+            if not digests:
+                del self._by_user[user.user_sn]
+
+
+token_cache = TokenCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL, AUTH_CACHE_SHARED)
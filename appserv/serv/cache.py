@@ -0,0 +1,182 @@
+import functools
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from fastapi.encoders import jsonable_encoder
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends import Backend
+from fastapi_cache.backends.inmemory import InMemoryBackend
+
+_log = logging.getLogger("cache")
+
+# 缓存后端：memory（进程内，默认）| redis（任何 Redis 协议服务）| file（本机共享目录）
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_URL = os.getenv("CACHE_URL", "redis://localhost:6379/0")
+# 放在 /dev/shm 下即为共享内存，同一台机器上的多个 worker 共用，无需网络
+CACHE_DIR = os.getenv("CACHE_DIR", "/dev/shm/cgms-cache")
+CACHE_PREFIX = "cgms"
+
+# 各类缓存的命名空间
+NS_AUTH = "auth"
+NS_LIST = "list"
+NS_REPORT = "report"
+NS_TAG = "tag"
+
+# 响应缓存默认有效期（秒），写操作会按标签提前失效
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "300"))
+# 标签版本的有效期（秒），必须长于任何带标签的缓存条目：
+# 版本过期后退回 "0"，若旧条目仍在，就会重新命中失效前的内容
+TAG_VERSION_TTL = 7 * 24 * 3600
+# 不参与缓存键的参数（与用户身份、请求对象相关）
+_UNKEYED_PARAMS = {"current_user", "request", "response"}
+
+
+def cache_key(namespace: str, *parts) -> str:
+    """统一的缓存键格式：cgms:<命名空间>:<各部分>"""
+    return ":".join([CACHE_PREFIX, namespace, *map(str, parts)])
+
+
+class FileBackend(Backend):
+    """本地文件缓存后端，每个键一个文件，首行记录过期时间和原始键"""
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / hashlib.sha1(key.encode()).hexdigest()
+
+    def _read(self, path: Path) -> tuple[float, str, bytes] | None:
+        try:
+            raw = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        header, _, value = raw.partition(b"\n")
+        expires_at, _, key = header.decode().partition("\t")
+        return float(expires_at), key, value
+
+    async def get_with_ttl(self, key: str) -> tuple[int, bytes | None]:
+        entry = self._read(self._path(key))
+        if entry is None:
+            return 0, None
+        expires_at, _, value = entry
+        if expires_at and expires_at <= time.time():
+            self._path(key).unlink(missing_ok=True)
+            return 0, None
+        return (int(expires_at - time.time()) if expires_at else -1), value
+
+    async def get(self, key: str) -> bytes | None:
+        return (await self.get_with_ttl(key))[1]
+
+    async def set(self, key: str, value: bytes, expire: int | None = None) -> None:
+        expires_at = time.time() + expire if expire else 0
+        # 先写临时文件再原子替换，并发读取时不会看到写了一半的内容
+        fd, tmp = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, "wb") as f:
+            f.write(f"{expires_at}\t{key}\n".encode())
+            f.write(value)
+        os.replace(tmp, self._path(key))
+
+    async def clear(self, namespace: str | None = None, key: str | None = None) -> int:
+        if key:
+            path = self._path(key)
+            existed = path.exists()
+            path.unlink(missing_ok=True)
+            return int(existed)
+        count = 0
+        for path in self.directory.iterdir():
+            entry = self._read(path)
+            if entry and (not namespace or entry[1].startswith(namespace)):
+                path.unlink(missing_ok=True)
+                count += 1
+        return count
+
+
+def create_backend(kind: str = CACHE_BACKEND, url: str = CACHE_URL,
+                   directory: str = CACHE_DIR) -> Backend:
+    """按配置创建缓存后端
+
+    共享后端不可用时（未安装 redis 依赖、缓存目录无法创建）退回进程内缓存并记录警告，
+    服务仍可启动，只是各 worker 的缓存互不共享。
+    """
+    if kind == "memory":
+        return InMemoryBackend()
+    if kind == "redis":
+        try:
+            from redis import asyncio as aioredis  # 需要安装redis依赖
+            from fastapi_cache.backends.redis import RedisBackend
+        except ImportError:
+            _log.warning("redis is not installed, falling back to in-memory cache")
+            return InMemoryBackend()
+        return RedisBackend(aioredis.from_url(url))
+    if kind == "file":
+        try:
+            return FileBackend(directory)
+        except OSError as e:
+            _log.warning("cache directory %s unavailable (%s), falling back to in-memory cache",
+                         directory, e)
+            return InMemoryBackend()
+    raise ValueError(f"未知的缓存后端: {kind}")
+
+
+def init_cache():
+    FastAPICache.init(create_backend(), prefix=CACHE_PREFIX)
+    _log.info("%s cache initialized", CACHE_BACKEND)
+
+
+async def tag_versions(tags: list[str]) -> list[str]:
+    """读取各标签的当前版本，缓存键包含这些版本，标签失效后旧条目不再被命中"""
+    backend = FastAPICache.get_backend()
+    versions = []
+    for tag in tags:
+        version = await backend.get(cache_key(NS_TAG, tag))
+        versions.append(version.decode() if isinstance(version, bytes) else str(version or 0))
+    return versions
+
+
+async def invalidate_tags(*tags: str):
+    """写操作提交后调用：更新标签版本，使带这些标签的缓存全部失效"""
+    backend = FastAPICache.get_backend()
+    version = str(time.time_ns()).encode()
+    for tag in tags:
+        # 必须带 expire：InMemoryBackend 把 expire=None 当作 0，下一次读取即删除
+        await backend.set(cache_key(NS_TAG, tag), version, expire=TAG_VERSION_TTL)
+
+
+def cached(*tags: str, expire: int = RESPONSE_CACHE_TTL, namespace: str = NS_LIST):
+    """GET 路由的响应缓存，按实体标签失效
+
+    标签可以引用路由参数，例如 "student:{stu_sn}"。
+    缓存内容为 JSON，命中与未命中时都返回同样的可序列化结果。
+    用法：放在 @router.get 之下。
+    """
+    if expire > TAG_VERSION_TTL:
+        raise ValueError(f"缓存有效期不能超过标签版本有效期 {TAG_VERSION_TTL}s")
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(**kwargs):
+            keyed = {k: v for k, v in kwargs.items() if k not in _UNKEYED_PARAMS}
+            resolved = [tag.format(**kwargs) for tag in tags]
+            digest = hashlib.md5(
+                json.dumps(jsonable_encoder(keyed), sort_keys=True).encode()
+            ).hexdigest()
+            key = cache_key(namespace, func.__name__, digest, *await tag_versions(resolved))
+
+            backend = FastAPICache.get_backend()
+            raw = await backend.get(key)
+            if raw is not None:
+                return json.loads(raw)
+
+            result = jsonable_encoder(await func(**kwargs))
+            await backend.set(key, json.dumps(result).encode(), expire=expire)
+            return result
+
+        return wrapper
+
+    return decorator
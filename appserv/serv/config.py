@@ -1,13 +1,53 @@
 import logging
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from .dblock import create_dpool
+from .dblock import create_async_dpool
+from .cache import init_cache
+from .notify import ClassEventHub
+from .statements import warm_up
+from .querystats import QueryStatsMiddleware
+from .reports import report_renderer
 from fastapi.middleware.cors import CORSMiddleware
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s"
 )
 
-dblock, lifespan = create_dpool("host=localhost dbname=examdb user=examdb", min_size=4)
+DB_DSN = os.getenv("DATABASE_URL", "host=localhost dbname=examdb user=examdb")
+
+# 连接池：最小/最大连接数、等待连接超时（秒）、连接最长使用时间与最长空闲时间（秒）
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "4"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "3600"))
+DB_POOL_MAX_IDLE = float(os.getenv("DB_POOL_MAX_IDLE", "600"))
+# 借出连接前检查连接是否可用（多一次往返，数据库重启或网络中断后可避免报错）
+DB_POOL_CHECK = os.getenv("DB_POOL_CHECK", "0") != "0"
+
+# 新连接加入连接池前预备已登记的热点语句
+dblock, db_lifespan = create_async_dpool(
+    DB_DSN,
+    min_size=DB_POOL_MIN_SIZE,
+    max_size=max(DB_POOL_MAX_SIZE, DB_POOL_MIN_SIZE),
+    timeout=DB_POOL_TIMEOUT,
+    max_lifetime=DB_POOL_MAX_LIFETIME,
+    max_idle=DB_POOL_MAX_IDLE,
+    check=DB_POOL_CHECK,
+    configure=warm_up,
+)
+# 班次版本变更通知（单独一条 LISTEN 连接）
+class_events = ClassEventHub(DB_DSN)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 缓存系统初始化（后端由 CACHE_BACKEND 配置）
+    init_cache()
+    async with db_lifespan(app), class_events.lifespan():
+        yield
+    report_renderer.shutdown()
+
 
 app = FastAPI(lifespan=lifespan)
 
@@ -18,4 +58,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-)
\ No newline at end of file
+)
+
+# 按请求统计数据库查询：Server-Timing 响应头、access 日志、慢查询与 N+1 告警
+app.add_middleware(QueryStatsMiddleware)
@@ -1,12 +1,15 @@
 import asyncio
 from dataclasses import asdict
 from fastapi import status, APIRouter, Query, Depends, HTTPException
-from fastapi_cache.decorator import cache
 import datetime as dt
 from psycopg.errors import ForeignKeyViolation
+from psycopg_pool import PoolTimeout
 from pydantic import BaseModel, field_validator
 from .config import app, dblock
 from .error import ConflictError, InvalidError
+from .paging import decode_cursor, next_cursor
+from .totals import totals
+from .cache import cached, invalidate_tags
 from .auth import get_current_active_user, User
 
 router = APIRouter(tags=["课程管理"])
@@ -37,34 +40,44 @@ class Course(BaseModel):
         return v
 
 @router.get("/api/course/list", summary="获取课程列表")
-#@cache(expire=300)  # 添加5分钟缓存
+@cached("course")  # 课程增删改时失效
 async def get_course_list(
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
+    after: str | None = Query(None, description="分页游标（上一页返回的 next），优先于 page"),
+    approx_total: bool = Query(False, description="接受规划器估算的总数，不执行 COUNT(*)"),
     current_user: User = Depends(get_current_active_user)
 ) -> dict:
+    after_key = decode_cursor(after, int) if after else None
     try:
-        with dblock() as db:
-            # 计算偏移量
-            offset = (page - 1) * page_size
-
-            # 查询总记录数
-            db.execute("SELECT COUNT(*) AS total FROM course")
-            total_row = db.fetchone()
-            total = total_row.total if total_row and hasattr(total_row, "total") else 0
+        async with dblock() as db:
+            # 查询总记录数（缓存或估算）
+            total, estimated = await totals.total(
+                db, "course", "FROM course",
+                tables=("course",), approx=approx_total)
+
+            # 游标模式按主键定位，不再用 OFFSET 跳过前面的所有行
+            if after_key:
+                where, paging = "WHERE sn > %(after_sn)s", ""
+                params = {"page_size": page_size, "after_sn": after_key[0]}
+            else:
+                where, paging = "", "OFFSET %(offset)s"
+                params = {"page_size": page_size, "offset": (page - 1) * page_size}
 
             # 查询当前页数据
-            db.execute("""
+            await db.execute(f"""
                     SELECT sn AS course_sn, 
                         no AS course_no, 
                         name AS course_name, 
                         credit, 
                         hours 
                     FROM course
-                    LIMIT %(page_size)s OFFSET %(offset)s
+                    {where}
+                    ORDER BY sn
+                    LIMIT %(page_size)s {paging}
                     """, 
-                    {"page_size": page_size, "offset": offset})
-            result = db.fetchall()
+                    params)
+            result = await db.fetchall()
 
             courses = [
                 {
@@ -79,26 +92,32 @@ async def get_course_list(
 
             return {
                 "data": courses,
-                "total": total
+                "total": total,
+                "total_estimated": estimated,
+                "next": next_cursor(result, page_size, "course_sn")
             }
+    except PoolTimeout:
+        # 等待连接超时由 error.pool_timeout_handler 返回 503
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/api/course/{course_sn}")
+@cached("course:{course_sn}")
 async def get_course_profile(
     course_sn, 
     current_user: User = Depends(get_current_active_user)
 ) -> Course:
-    with dblock() as db:
-        db.execute(
+    async with dblock() as db:
+        await db.execute(
             """
             SELECT sn AS course_sn, no AS course_no, name AS course_name, credit, hours
             FROM course WHERE sn=%(course_sn)s
             """,
             dict(course_sn=course_sn),
         )
-        row = db.fetchone()
+        row = await db.fetchone()
 
     if row is None:
         raise HTTPException(
@@ -113,20 +132,20 @@ async def new_course(
     course: Course, 
     current_user: User = Depends(get_current_active_user)
 ) -> Course:
-    with dblock() as db:
+    async with dblock() as db:
         # 检查课程号是否已存在（避免重复课程号）
-        db.execute(
+        await db.execute(
             "SELECT sn FROM course WHERE no = %(course_no)s",
             {"course_no": course.course_no}
         )
-        if db.fetchone():
+        if await db.fetchone():
             raise HTTPException(
                 status_code=status.HTTP_409_CONFLICT,
                 detail=f"课程号 {course.course_no} 已存在"
             )
 
         # 插入时不传递 sn，使用数据库自增序列
-        db.execute(
+        await db.execute(
             """
             INSERT INTO course (no, name, credit, hours)
             VALUES (%(course_no)s, %(course_name)s, %(credit)s, %(hours)s)
@@ -134,7 +153,7 @@ async def new_course(
             """,
             course.model_dump()
         )
-        row = db.fetchone()
+        row = await db.fetchone()
         if not row:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -142,7 +161,10 @@ async def new_course(
             )
         course_data = course.model_dump()
         course_data["course_sn"] = row.course_sn  # 覆盖原有可能的 null 或重复值
-        return Course(**course_data)
+
+    await totals.invalidate("course")
+    await invalidate_tags("course")
+    return Course(**course_data)
 
 
 @router.put("/api/course/{course_sn}")
@@ -153,8 +175,8 @@ async def update_course(
 ):
     assert course_sn == course.course_sn
     course_no = course.course_no
-    with dblock() as db:
-        db.execute(
+    async with dblock() as db:
+        await db.execute(
             """
             UPDATE course SET
                 no=%(course_no)s, name=%(course_name)s, 
@@ -163,14 +185,17 @@ async def update_course(
             course.model_dump(),
         )
 
+    # 班次列表中带有课程名，一并失效
+    await invalidate_tags("course", f"course:{course_sn}")
+
 @router.get("/api/course/{course_sn}/has-references")
 async def course_has_references(
     course_sn: int,
     current_user: User = Depends(get_current_active_user)
 ):
-    with dblock() as db:
+    async with dblock() as db:
         # 检查课程是否被班次引用
-        db.execute(
+        await db.execute(
             """
             SELECT 1 AS has_references
             FROM class
@@ -179,7 +204,7 @@ async def course_has_references(
             """,
             dict(course_sn=course_sn)
         )
-        row = db.fetchone()
+        row = await db.fetchone()
 
     has_references = row is not None
     return {"has_references": has_references}
@@ -189,11 +214,14 @@ async def delete_course(
     course_sn, 
     current_user: User = Depends(get_current_active_user)
 ):
-    with dblock() as db:
+    async with dblock() as db:
         try:
-            db.execute("DELETE FROM course WHERE sn=%(course_sn)s", {"course_sn": course_sn})
+            await db.execute("DELETE FROM course WHERE sn=%(course_sn)s", {"course_sn": course_sn})
         except ForeignKeyViolation:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"课程(sn={course_sn}) 被班次引用，不能删除"
-            )
\ No newline at end of file
+            )
+
+    await totals.invalidate("course")
+    await invalidate_tags("course", f"course:{course_sn}")
\ No newline at end of file
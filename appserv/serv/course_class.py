@@ -1,13 +1,18 @@
 import asyncio
-from dataclasses import asdict
+from .rows import row_to_dict
 from fastapi import status, Depends, Query, Body
 import datetime as dt
 from fastapi import HTTPException, APIRouter
 import re
 
 from pydantic import BaseModel, field_validator
+from psycopg_pool import PoolTimeout
 from .config import app, dblock
 from .error import ConflictError, InvalidError
+from .paging import decode_cursor, next_cursor
+from .totals import totals
+from .cache import cached, invalidate_tags
+from .etag import class_etag
 from .auth import get_current_user, get_current_active_user, User
 
 router = APIRouter(tags=["班次管理"])
@@ -36,29 +41,56 @@ def validate_jiaomi_role(username: str):
             detail="仅教秘用户可执行此操作"
         )
 
+
+async def require_jiaomi_user(current_user: User = Depends(get_current_active_user)) -> User:
+    """依赖形式的教秘角色校验，需要在其他依赖（如 ETag 校验）之前执行时使用"""
+    validate_jiaomi_role(current_user.user_name)
+    return current_user
+
 @router.get("/api/class/list", summary="获取班次列表")
+@cached("class", "course")
 async def get_class_list(
     course_sn: int = Query(None),
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
+    after: str | None = Query(None, description="分页游标（上一页返回的 next），优先于 page"),
+    approx_total: bool = Query(False, description="接受规划器估算的总数，不执行 COUNT(*)"),
     current_user: User = Depends(get_current_active_user)
 ) -> dict:
+    # semester 可为空，末行学期为 NULL 时游标中为 null
+    after_key = decode_cursor(after, (str, type(None)), str) if after else None
     try:
-        with dblock() as db:
-            offset = (page - 1) * page_size
-            base_query = """
-                SELECT COUNT(*) AS total
+        async with dblock() as db:
+            from_sql = """
                 FROM class cl
                 JOIN course c ON cl.cou_sn = c.sn
             """
             params = {}
             if course_sn:
-                base_query += " WHERE cl.cou_sn = %(course_sn)s"
+                from_sql += " WHERE cl.cou_sn = %(course_sn)s"
                 params["course_sn"] = course_sn
-            
-            db.execute(base_query, params)
-            total_row = db.fetchone()
-            total = total_row.total if total_row and hasattr(total_row, "total") else 0
+
+            # 查询总记录数（缓存或估算）
+            total, estimated = await totals.total(
+                db, f"class:{course_sn}", from_sql, params,
+                tables=("class", "course"), approx=approx_total)
+
+            where_clauses = []
+            if course_sn:
+                where_clauses.append("cl.cou_sn = %(course_sn)s")
+            # 游标模式：按 (semester DESC, class_no) 从上一页最后一行之后继续，
+            # semester 为 NULL 的班次在 DESC 排序中排在最前
+            if after_key:
+                after_semester, after_class_no = after_key
+                if after_semester is None:
+                    where_clauses.append(
+                        "(cl.semester IS NOT NULL OR cl.class_no > %(after_class_no)s)")
+                else:
+                    where_clauses.append(
+                        "(cl.semester < %(after_semester)s OR "
+                        "(cl.semester = %(after_semester)s AND cl.class_no > %(after_class_no)s))")
+                params["after_semester"] = after_semester
+                params["after_class_no"] = after_class_no
 
             base_query = """
                 SELECT cl.sn AS class_sn, cl.class_no, cl.name, 
@@ -66,21 +98,28 @@ async def get_class_list(
                 FROM class cl
                 JOIN course c ON cl.cou_sn = c.sn
             """
-            if course_sn:
-                base_query += " WHERE cl.cou_sn = %(course_sn)s"
+            if where_clauses:
+                base_query += " WHERE " + " AND ".join(where_clauses)
             base_query += " ORDER BY cl.semester DESC, cl.class_no"
-            base_query += " LIMIT %(page_size)s OFFSET %(offset)s"
+            base_query += " LIMIT %(page_size)s"
             params["page_size"] = page_size
-            params["offset"] = offset
+            if not after_key:
+                base_query += " OFFSET %(offset)s"
+                params["offset"] = (page - 1) * page_size
 
-            db.execute(base_query, params)
-            result = db.fetchall()
-            classes = [asdict(row) for row in result]
+            await db.execute(base_query, params)
+            result = await db.fetchall()
+            classes = [row_to_dict(row) for row in result]
 
             return {
                 "data": classes,
-                "total": total
+                "total": total,
+                "total_estimated": estimated,
+                "next": next_cursor(result, page_size, "semester", "class_no")
             }
+    except PoolTimeout:
+        # 等待连接超时由 error.pool_timeout_handler 返回 503
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -95,7 +134,7 @@ async def get_class_sequence(
 ):  # 使用别名# 新增参数，用于排除当前班次
     
     # 匹配某课程特定学期（比如2023S1）的班次，返回最大的序号
-    with dblock() as db:
+    async with dblock() as db:
         query = """
             SELECT MAX(CAST(SPLIT_PART(class_no, '-', 3) AS INTEGER)) AS max_seq
             FROM class 
@@ -112,26 +151,28 @@ async def get_class_sequence(
             query += " AND sn != %(exclude_sn)s"
             params["exclude_sn"] = exclude_class_sn
             
-        db.execute(query, params)
-        row = db.fetchone()
+        await db.execute(query, params)
+        row = await db.fetchone()
 
         max_sequence = row.max_seq if (row and row.max_seq is not None) else 0
         return {"max_sequence": max_sequence}
 
 @router.get("/api/class/{class_sn}", summary="获取班次详情")
+@cached("class:{class_sn}")
 async def get_class_profile(
     class_sn,
+    version: str = Depends(class_etag),  # 参与缓存键，缓存内容不会比 ETag 旧
     current_user: User = Depends(get_current_active_user)
 ) -> Class:
-    with dblock() as db:
-        db.execute(
+    async with dblock() as db:
+        await db.execute(
             """
             SELECT sn AS class_sn, class_no, name, semester, location, cou_sn
             FROM class WHERE sn=%(class_sn)s
             """,
             dict(class_sn=class_sn),
         )
-        row = db.fetchone()
+        row = await db.fetchone()
 
     if row is None:
         raise HTTPException(
@@ -149,31 +190,31 @@ async def create_class(
 
     validate_jiaomi_role(current_user.user_name)  # 新增角色校验
     class_no = class_data.class_no
-    with dblock() as db:
+    async with dblock() as db:
         # 检查班次号是否已存在
-        db.execute(
+        await db.execute(
             """
             SELECT sn FROM class 
             WHERE class_no=%(class_no)s
             """,
             dict(class_no=class_no)
         )
-        record = db.fetchone()
+        record = await db.fetchone()
         if record:
             raise ConflictError(f"班次号'{class_no}'已存在")
         
         # 验证课程号匹配
         course_no_part = class_no.split('-')[0]
-        db.execute(
+        await db.execute(
             """SELECT sn AS course_sn, no AS course_no FROM course 
             WHERE sn=%(cou_sn)s AND no=%(course_no)s
             """,
             {"cou_sn": class_data.cou_sn, "course_no": course_no_part}
         )
-        if not db.fetchone():
+        if not await db.fetchone():
             raise HTTPException(status.HTTP_400_BAD_REQUEST, "班次号中的课程号与关联课程不匹配")
         # 插入数据
-        db.execute(
+        await db.execute(
             """
             INSERT INTO class (class_no, name, semester, location, cou_sn) 
             VALUES (%(class_no)s, %(name)s, %(semester)s, %(location)s, %(cou_sn)s) 
@@ -181,8 +222,11 @@ async def create_class(
             """,
             class_data.model_dump()
         )
-        row = db.fetchone()
+        row = await db.fetchone()
         class_data.class_sn = row.class_sn  # type: ignore
+
+    await totals.invalidate("class")
+    await invalidate_tags("class")
     return class_data
 
 
@@ -199,27 +243,27 @@ async def update_class(
         raise HTTPException(400, "班次SN不匹配")
     class_no = class_data.class_no
 
-    with dblock() as db:
+    async with dblock() as db:
         # 检查班次号是否已存在（排除自身）
-        db.execute(
+        await db.execute(
             """
             SELECT sn FROM class 
             WHERE class_no=%(class_no)s AND sn!=%(class_sn)s
             """,
             {"class_no": class_no, "class_sn": class_sn})
-        if db.fetchone():
+        if await db.fetchone():
             raise ConflictError(f"班次号'{class_no}'已存在")
         
         # 验证课程号匹配
         course_no_part = class_no.split('-')[0]
-        db.execute(
+        await db.execute(
             """
             SELECT sn AS course_sn, no AS course_no FROM course 
             WHERE sn=%(cou_sn)s AND no=%(course_no)s
             """,
             {"cou_sn": class_data.cou_sn, "course_no": course_no_part}
         )
-        if not db.fetchone():
+        if not await db.fetchone():
             raise HTTPException(status.HTTP_400_BAD_REQUEST, "班次号中的课程号与关联课程不匹配")
         
         # 更新数据库 - 确保只更新允许的字段（地点）
@@ -233,18 +277,19 @@ async def update_class(
             "cou_sn": class_data.cou_sn
         }
 
-        db.execute("""
+        await db.execute("""
             UPDATE class SET 
-            location=%(location)s
+            location=%(location)s, updated_at=NOW()
             WHERE sn=%(class_sn)s
             RETURNING sn as class_sn, class_no, name, semester, location, cou_sn
             """,
             update_data
         )
-        row = db.fetchone()
+        row = await db.fetchone()
         if not row:
             raise HTTPException(status.HTTP_404_NOT_FOUND, "班次不存在")
-    
+
+    await invalidate_tags("class", f"class:{class_sn}")
     return class_data
 
 @router.delete("/api/class/{class_sn}", summary="删除班次", status_code=status.HTTP_204_NO_CONTENT)
@@ -253,22 +298,22 @@ async def delete_class(
     current_user: User = Depends(get_current_active_user)
 ):
     validate_jiaomi_role(current_user.user_name)
-    with dblock() as db:
+    async with dblock() as db:
         try:
             # 检查班次下是否有学生记录
-            db.execute(
+            await db.execute(
                 "SELECT COUNT(*) AS student_count FROM class_student WHERE class_sn = %(class_sn)s",
                 {"class_sn": class_sn}
             )
-            student_row = db.fetchone()
+            student_row = await db.fetchone()
             student_count = student_row.student_count if student_row else 0
 
             # 检查班次下是否有成绩记录
-            db.execute(
+            await db.execute(
                 "SELECT COUNT(*)  AS grade_count FROM class_grade WHERE class_sn = %(class_sn)s",
                 {"class_sn": class_sn}
             )
-            grade_row = db.fetchone()
+            grade_row = await db.fetchone()
             grade_count = grade_row.grade_count if grade_row else 0
 
             if student_count > 0 or grade_count > 0:
@@ -277,7 +322,7 @@ async def delete_class(
                     detail="该班次下有学生或成绩记录，不能删除"
                 )
             
-            db.execute(
+            await db.execute(
                 "DELETE FROM class WHERE sn=%(class_sn)s",
                 {"class_sn": class_sn}
             )
@@ -290,7 +335,11 @@ async def delete_class(
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"删除班次时发生错误: {str(e)}"
-            )          
+            )
+
+    await totals.invalidate("class")
+    await invalidate_tags("class", f"class:{class_sn}")
+
 
 @router.patch("/api/class/{class_sn}", status_code=status.HTTP_200_OK)
 async def update_class_location(
@@ -300,19 +349,21 @@ async def update_class_location(
 ):
     validate_jiaomi_role(current_user.user_name)
     
-    with dblock() as db:
+    async with dblock() as db:
         # 仅更新location字段
-        db.execute(
-            "UPDATE class SET location=%(loc)s WHERE sn=%(sn)s",
+        await db.execute(
+            "UPDATE class SET location=%(loc)s, updated_at=NOW() WHERE sn=%(sn)s",
             {"loc": location, "sn": class_sn}
         )
             # 修改返回数据，包含完整班次信息
-        db.execute("""
+        await db.execute("""
             SELECT sn AS class_sn, class_no, 
                    name, semester, location, cou_sn
             FROM class WHERE sn=%(sn)s
             """,
             {"sn": class_sn}
         )
-        updated_class = db.fetchone()
+        updated_class = await db.fetchone()
+
+    await invalidate_tags("class", f"class:{class_sn}")
     return updated_class
@@ -1,29 +1,15 @@
 from contextlib import contextmanager, asynccontextmanager
-from psycopg_pool import ConnectionPool
-from dataclasses import make_dataclass
+from psycopg_pool import ConnectionPool, AsyncConnectionPool
 from fastapi import FastAPI
 from fastapi_cache import FastAPICache
 from fastapi_cache.backends.inmemory import InMemoryBackend
+from .rows import dict_row_factory, async_dict_row_factory
+from .querystats import InstrumentedCursor
 import logging
 
 _log = logging.getLogger("dblock")
 
 
-def dict_row_factory(cursor):
-    if cursor.connection.autocommit:
-        cursor.execute("SET TRANSACTION READ ONLY")
-    if cursor.description is None:
-        return None
-
-    field_names = [c.name for c in cursor.description]
-    _dataclass = make_dataclass("Row", field_names)
-
-    def make_row(values):
-        return _dataclass(*values)
-
-    return make_row
-
-
 def create_dpool(dsn: str, min_size=4):
     pool = ConnectionPool(dsn, min_size=min_size)
 
@@ -56,3 +42,62 @@ def create_dpool(dsn: str, min_size=4):
                 raise
 
     return dblock, lifespan
+
+
+def create_async_dpool(dsn: str, min_size=4, max_size=None, timeout=30.0,
+                       max_lifetime=3600.0, max_idle=600.0, check=False, configure=None):
+    """create_dpool 的异步版本：基于 AsyncConnectionPool，
+    查询时交出事件循环，不再阻塞同一 worker 上的其他请求。
+
+    用法与同步版一致，只是需要 `async with dblock() as db`，
+    并对 execute/fetchone/fetchall 使用 await。
+
+    configure 在每个新连接加入连接池前调用（如预备热点语句）。
+
+    max_size 为 None 时连接数固定为 min_size；timeout 为等待可用连接的上限（秒），
+    超时抛出 PoolTimeout；连接使用 max_lifetime 秒后重建，空闲超过 max_idle 秒
+    且连接数多于 min_size 时关闭；check 为真时每次借出连接前先检查连接是否可用。
+
+    连接的游标记录每次查询耗时，按请求汇总（见 querystats）。
+    """
+    # open=False：AsyncConnectionPool 必须在事件循环中打开（见 lifespan）
+    pool = AsyncConnectionPool(
+        dsn,
+        min_size=min_size,
+        max_size=max_size,
+        timeout=timeout,
+        max_lifetime=max_lifetime,
+        max_idle=max_idle,
+        check=AsyncConnectionPool.check_connection if check else None,
+        configure=configure,
+        kwargs={"cursor_factory": InstrumentedCursor},
+        open=False,
+    )
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        # 数据库连接池启动
+        await pool.open()
+        _log.info("async connection pool is open")
+
+        yield
+
+        # 清理阶段
+        _log.info("Cleaning up resources...")
+        await pool.close()
+        _log.info("async connection pool is closed")
+
+    @asynccontextmanager
+    async def dblock():
+        async with pool.connection() as conn:
+            try:
+                async with conn.cursor(row_factory=async_dict_row_factory) as cur: # type: ignore
+                    yield cur
+                await conn.commit()
+            except:
+                await conn.rollback()
+                raise
+
+    # 供监控接口读取连接池统计
+    dblock.pool = pool  # type: ignore
+    return dblock, lifespan
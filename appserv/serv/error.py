@@ -1,6 +1,7 @@
 from fastapi import HTTPException
 from fastapi import Request
 from fastapi.responses import JSONResponse
+from psycopg_pool import PoolTimeout
 from .config import app
 
 
@@ -30,3 +31,13 @@ async def error_handler(request: Request, exc: HTTPException):
         status_code=exc.status_code,
         content={"message": exc.detail},
     )
+
+
+@app.exception_handler(PoolTimeout)
+async def pool_timeout_handler(request: Request, exc: PoolTimeout):
+    # 等待数据库连接超时：连接池已满，提示客户端稍后重试
+    return JSONResponse(
+        status_code=503,
+        content={"message": "服务繁忙，请稍后重试"},
+        headers={"Retry-After": "1"},
+    )
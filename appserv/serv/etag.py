@@ -0,0 +1,53 @@
+from fastapi import Depends, HTTPException, Request, Response, status
+
+from .config import dblock
+from .statements import execute
+from .auth import get_current_active_user, User
+
+
+async def touch_classes(db, class_sns) -> dict[int, str]:
+    """班次信息、名单、学生信息或成绩变化后更新 class.updated_at
+
+    class.updated_at 同时作为班次相关接口的 ETag 版本和成绩录入的冲突检测版本，
+    应与数据修改在同一事务中执行。返回各班次的新版本（与 check-conflict 格式相同）。
+    """
+    await execute(db, "class.touch", {"class_sns": list(class_sns)})
+    return {row.sn: row.updated_at.isoformat() for row in await db.fetchall()}
+
+
+async def touch_student_classes(db, stu_sn: int):
+    """学生信息变化后，更新其所在各班次的版本"""
+    await execute(db, "class.touch_by_student", {"stu_sn": stu_sn})
+
+
+async def class_etag(
+    class_sn: int,
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_active_user),
+) -> str:
+    """班次相关 GET 接口的 ETag 依赖
+
+    只按主键读取 class.updated_at；与 If-None-Match 相同时直接返回 304，
+    不再执行名单/成绩查询。返回 ETag，响应内容有缓存时须作为缓存键的一部分
+    （传给 @cached 的加载函数），否则缓存内容可能比 ETag 旧，客户端一直得到 304。
+    """
+    async with dblock() as db:
+        await execute(db, "class.version", {"class_sn": class_sn})
+        row = await db.fetchone()
+
+    if row is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail=f"无此班次(sn={class_sn})"
+        )
+
+    version = int(row.updated_at.timestamp() * 1_000_000) if row.updated_at else 0
+    etag = f'"{class_sn}-{version}"'
+    # private：响应与用户有关；no-cache：每次使用前都要向服务端验证
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if etag in (tag.strip() for tag in request.headers.get("if-none-match", "").split(",")):
+        raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    response.headers.update(headers)
+    return etag
@@ -1,19 +1,38 @@
 import asyncio
-from dataclasses import asdict
-from datetime import datetime
-from fastapi import HTTPException, APIRouter, status, Depends, UploadFile, File, Query
+from .rows import row_to_dict
+from fastapi import HTTPException, APIRouter, status, Depends, UploadFile, File, Form, Query, Request
 from typing import List
-from pydantic import BaseModel, field_validator
-from .config import dblock
+from itertools import islice
+from openpyxl import load_workbook
+import codecs
+import csv
+import io
+import json
+import math
+import os
+from pydantic import BaseModel, Field, field_validator
+from psycopg_pool import PoolTimeout
+from .config import dblock, class_events
 from .error import ConflictError, InvalidError
-from .auth import get_current_active_user, User
+from .paging import decode_cursor, next_cursor
+from .totals import totals
+from .cache import invalidate_tags
+from .etag import touch_classes
+from .statements import execute
+from .auth import get_current_active_user, issue_ticket, redeem_ticket, User
 from fastapi.responses import StreamingResponse
-import pandas as pd
-from io import BytesIO
+from .xlsx import StreamingWorkbook, XLSX_MEDIA_TYPE
 from urllib.parse import quote
 
 router = APIRouter(tags=["成绩管理"])
 
+# 上传文件导入时每批写入数据库的记录数
+IMPORT_CHUNK_SIZE = 1000
+# 上传文件的表头（与 download_template 生成的模板一致，也接受英文列名）
+IMPORT_COLUMNS = {"学号": "stu_no", "stu_no": "stu_no", "成绩": "grade", "grade": "grade"}
+# CSV 文件依次尝试的编码：UTF-8（含 BOM），中文 Windows 上 Excel 另存的 GBK/GB18030
+CSV_ENCODINGS = ("utf-8-sig", "gb18030")
+
 class Grade(BaseModel):
     stu_sn: int
     course_sn: int# ？？？？？为什么不是 class_sn
@@ -32,6 +51,8 @@ class GradeItem(BaseModel):
 
 class BatchGradeUpdate(BaseModel):
     grades: List[GradeItem]
+    # 大批量模式：按此大小分块执行同一条语句，不重新生成 SQL
+    chunk_size: int | None = Field(None, ge=1)
 
 
 class ImportRecord(BaseModel):
@@ -50,58 +71,87 @@ class ImportResult(BaseModel):
     invalid: int
     logs: List[str]
 
-class GradeQueryParams(BaseModel):
+class GradeFilterParams(BaseModel):
     course_sn: int | None = None
     class_sn: int | None = None
     semester: str | None = None
+
+class GradeQueryParams(GradeFilterParams):
     page: int = Query(1, ge=1)
     page_size: int = Query(20, ge=1, le=100)
-    
+    after: str | None = Query(None, description="分页游标（上一页返回的 next），优先于 page")
+    approx_total: bool = Query(False, description="接受规划器估算的总数，不执行 COUNT(*)")
+
+GRADE_FROM = """
+    FROM class_grade AS g
+        INNER JOIN student AS s ON g.stu_sn = s.sn
+        INNER JOIN class AS cl ON g.class_sn = cl.sn
+        INNER JOIN course AS c ON cl.cou_sn = c.sn
+"""
+GRADE_TABLES = ("class_grade", "student", "class", "course")
+
+# 成绩列表按 class_grade 的唯一键 (stu_sn, class_sn) 排序，游标分页可直接走索引
+GRADE_ORDER = "g.stu_sn, g.class_sn"
+GRADE_AFTER = "(g.stu_sn, g.class_sn) > (%(after_stu_sn)s, %(after_class_sn)s)"
+
+
+def grade_paging(params: GradeQueryParams, query_params: dict) -> tuple[str | None, str]:
+    """返回 (游标条件, LIMIT/OFFSET 子句)，并把对应参数写入 query_params"""
+    query_params["page_size"] = params.page_size
+    if params.after:
+        after_stu_sn, after_class_sn = decode_cursor(params.after, int, int)
+        query_params["after_stu_sn"] = after_stu_sn
+        query_params["after_class_sn"] = after_class_sn
+        return GRADE_AFTER, "LIMIT %(page_size)s"
+    query_params["offset"] = (params.page - 1) * params.page_size
+    return None, "LIMIT %(page_size)s OFFSET %(offset)s"
+
+
 @router.get("/api/grade/list", summary="获取成绩列表")
 async def get_grade_list(
     params: GradeQueryParams = Depends(),
     current_user: User = Depends(get_current_active_user)
 ) -> dict:
+    query_params = {}
+    after_condition, paging = grade_paging(params, query_params)
+    where_condition = after_condition or "1=1"
     try:
-        with dblock() as db:
-            # 查询总记录数
-            db.execute("""
-                SELECT COUNT(*) AS total 
-                FROM class_grade AS g
-                INNER JOIN student AS s ON g.stu_sn = s.sn
-                INNER JOIN class AS cl ON g.class_sn = cl.sn
-                INNER JOIN course AS c ON cl.cou_sn = c.sn
-            """)
-            total_row = db.fetchone()
-            total = total_row.total if total_row else 0
-            # 计算偏移量
-            offset = (params.page - 1) * params.page_size
-
-
-            db.execute("""
+        async with dblock() as db:
+            # 查询总记录数（缓存或估算）
+            total, estimated = await totals.total(
+                db, "grade", GRADE_FROM,
+                tables=GRADE_TABLES, approx=params.approx_total)
+
+            await db.execute(f"""
                 SELECT 
                     g.id AS grade_sn,
                     g.stu_sn AS stu_sn, 
+                    g.class_sn AS class_sn,
                     cl.cou_sn AS course_sn,
                     s.name AS stu_name, 
                     c.name AS course_name, 
                     g.grade AS grade
-                FROM class_grade AS g
-                    INNER JOIN student AS s ON g.stu_sn = s.sn
-                    INNER JOIN class AS cl ON g.class_sn = cl.sn
-                    INNER JOIN course AS c ON cl.cou_sn = c.sn
-                ORDER BY g.stu_sn, cl.cou_sn
-                LIMIT %(page_size)s OFFSET %(offset)s
+                {GRADE_FROM}
+                WHERE {where_condition}
+                ORDER BY {GRADE_ORDER}
+                {paging}
                 """,
-                {"page_size": params.page_size, "offset": offset})
+                query_params)
         
-            rows = db.fetchall()  # 使用fetchall避免游标问题
-            data = [asdict(row) for row in rows]  # 转换为字典列表
+            rows = await db.fetchall()  # 使用fetchall避免游标问题
+            data = [row_to_dict(row) for row in rows]  # 转换为字典列表
 
         return {
             "data": data,
-            "total": total
+            "total": total,
+            "total_estimated": estimated,
+            "next": next_cursor(rows, params.page_size, "stu_sn", "class_sn")
         }
+    except HTTPException:
+        raise
+    except PoolTimeout:
+        # 等待连接超时由 error.pool_timeout_handler 返回 503
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -111,84 +161,82 @@ async def batch_update_grades(
     update: BatchGradeUpdate,
     current_user: User = Depends(get_current_active_user)
 ):
-    """批量更新成绩记录，自动处理插入和更新"""
+    """批量更新成绩记录，自动处理插入和更新，并记录变更审计日志"""
     if not update.grades:
         return {"updated": 0}
 
-    with dblock() as db:
+    class_sns = sorted({grade.class_sn for grade in update.grades})
+    chunk_size = update.chunk_size or len(update.grades)
+
+    async with dblock() as db:
         try:
-            db.execute("BEGIN")
-
-            # 新增版本检查（防止覆盖）
-            db.execute("""
-                SELECT updated_at FROM class 
-                WHERE sn = %s FOR UPDATE
-            """, (update.grades[0].class_sn,))
-
-            # 构建批量操作SQL
-            values = []
-            params = {}
-            for i, grade in enumerate(update.grades):
-                params[f"stu_sn_{i}"] = grade.stu_sn
-                params[f"class_sn_{i}"] = grade.class_sn
-                params[f"grade_{i}"] = grade.grade
-                values.append(
-                    f"(%(stu_sn_{i})s, %(class_sn_{i})s, %(grade_{i})s)"
-                )
-
-            query = f"""
-                INSERT INTO class_grade (stu_sn, class_sn, grade)
-                VALUES {','.join(values)}
-                ON CONFLICT (stu_sn, class_sn) 
-                DO UPDATE SET grade = EXCLUDED.grade
-                RETURNING stu_sn, class_sn
-            """
-            db.execute(query, params)
-            updated = len(db.fetchall())
+            # 新增版本检查（防止覆盖）：按固定顺序锁定涉及的班次
+            await execute(db, "class.lock", {"class_sns": class_sns})
+
+            updated = 0
+            for start in range(0, len(update.grades), chunk_size):
+                chunk = update.grades[start:start + chunk_size]
+                await execute(db, "grade.batch_upsert", {
+                    "stu_sns": [grade.stu_sn for grade in chunk],
+                    "class_sns": [grade.class_sn for grade in chunk],
+                    "grades": [grade.grade for grade in chunk],
+                    "operator": current_user.user_sn,
+                })
+                updated += (await db.fetchone()).updated  # type: ignore
 
             # 新增更新时间戳
-            db.execute("""
-                UPDATE class 
-                SET updated_at = NOW()
-                WHERE sn = %s
-            """, (update.grades[0].class_sn,))
-
-            db.execute("COMMIT")
-            return {"updated": updated}
+            versions = await touch_classes(db, class_sns)
         except Exception as e:
-            db.execute("ROLLBACK")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"批量更新失败: {str(e)}"
             )
-        
-    # 记录变更日志
-    for grade in update.grades:
-        db.execute("""
-            INSERT INTO grade_audit_log 
-            (class_sn, stu_sn, old_grade, new_grade, operator)
-            SELECT %s, %s, g.grade, %s, %s
-            FROM class_grade g
-            WHERE g.stu_sn = %s AND g.class_sn = %s
-        """, (
-            grade.class_sn,
-            grade.stu_sn,
-            grade.grade,
-            current_user.user_sn,
-            grade.stu_sn,
-            grade.class_sn
-        ))
+
+    await totals.invalidate("class_grade")
+    await invalidate_tags(*(f"roster:{class_sn}" for class_sn in class_sns))
+    # 返回保存后的班次版本，前端据此识别自己的改动，不把它当作他人修改
+    return {"updated": updated, "versions": versions}
+
+# 成绩导入模板的列，与 read_grade_file 识别的表头一致
+TEMPLATE_COLUMNS = ["学号", "姓名", "成绩", "备注"]
+# 生成模板时服务端游标每次取回的行数
+TEMPLATE_FETCH_SIZE = 1000
+
+
+async def stream_template(class_sn: int):
+    """用服务端游标分批读取名单，以 constant_memory 模式写入 xlsx，再分块输出"""
+    book = StreamingWorkbook(TEMPLATE_COLUMNS)
+    try:
+        async with dblock() as db:
+            async with db.connection.cursor(name="grade_template") as cur:
+                await cur.execute("""
+                    SELECT s.no, s.name
+                    FROM student s
+                    JOIN class_student cs ON s.sn = cs.stu_sn
+                    WHERE cs.class_sn = %s
+                    ORDER BY s.no
+                """, (class_sn,))
+                while rows := await cur.fetchmany(TEMPLATE_FETCH_SIZE):
+                    await asyncio.to_thread(book.write_rows, rows)
+
+        await asyncio.to_thread(book.close)
+        while chunk := await asyncio.to_thread(book.read_chunk):
+            yield chunk
+    finally:
+        book.discard()
+
 
 @router.get("/api/grade/template/{class_sn}", summary="Excel模板")
 async def download_template(class_sn: int):
-    # 1. 获取班次学生列表
-    with dblock() as db:
-        db.execute("""
-            SELECT cl.class_no, cl.name 
+    # 1. 检查班次及学生（名单本身在生成文件时再分批读取）
+    async with dblock() as db:
+        await db.execute("""
+            SELECT cl.class_no, cl.name,
+                   EXISTS (SELECT 1 FROM class_student cs WHERE cs.class_sn = cl.sn) AS has_students
             FROM class AS cl
             WHERE cl.sn = %s
         """, (class_sn,))
-        class_info = db.fetchone()
+        class_info = await db.fetchone()
         
         if not class_info:
             raise HTTPException(
@@ -196,42 +244,87 @@ async def download_template(class_sn: int):
                 detail="班次不存在"
             )
 
-        db.execute("""
-            SELECT s.sn, s.no, s.name 
-            FROM student s
-            JOIN class_student cs ON s.sn = cs.stu_sn
-            WHERE cs.class_sn = %s
-            ORDER BY s.no
-        """, (class_sn,))
-        students = db.fetchall()
-
-        if len(students) == 0:
+        if not class_info.has_students:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="该班次暂无学生，无法生成模板"
             )
 
-    # 2. 生成Excel模板
-    df = pd.DataFrame([{
-        "学号": s.no,
-        "姓名": s.name,
-        "成绩": "",
-        "备注": ""
-    } for s in students])
-
-    buffer = BytesIO()
-    df.to_excel(buffer, index=False, engine="openpyxl")
-    buffer.seek(0)
-
-    # 3. 返回文件（修复中文文件名编码问题）
+    # 2. 流式生成并返回文件（修复中文文件名编码问题）
     return StreamingResponse(
-        iter([buffer.getvalue()]),
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        stream_template(class_sn),
+        media_type=XLSX_MEDIA_TYPE,
         headers={
             "Content-Disposition": f"attachment; filename*=UTF-8''{quote(f'{class_info.name}({class_info.class_no})成绩导入模板.xlsx')}"
         }
     )
 
+async def import_grade_rows(db, class_sn: int, operator: int, rows, stats: dict, start: int = 0):
+    """以集合方式导入一批 (学号, 成绩) 记录，结果累加到 stats
+
+    记录先通过 COPY 载入临时表，再用一次连接校验班次归属，
+    最后各用一条语句完成成绩 upsert 和导入日志写入。
+    往返次数与记录数无关。start 为本批第一条记录的序号（分批导入时使用）。
+    """
+    await db.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS grade_import_rows (
+            ord    INTEGER,
+            stu_no TEXT,
+            grade  NUMERIC,
+            stu_sn INTEGER
+        ) ON COMMIT DROP
+    """)
+    await db.execute("TRUNCATE grade_import_rows")
+    async with db.copy("COPY grade_import_rows (ord, stu_no, grade) FROM STDIN") as copy:
+        for ord, (stu_no, grade) in enumerate(rows, start):
+            await copy.write_row((ord, stu_no, grade))
+
+    # 验证学生是否存在于此班次（一次连接）
+    await db.execute("""
+        UPDATE grade_import_rows AS r SET stu_sn = s.sn
+        FROM student AS s
+        JOIN class_student AS cs ON s.sn = cs.stu_sn
+        WHERE s.no = r.stu_no AND cs.class_sn = %(class_sn)s
+    """, {"class_sn": class_sn})
+
+    # 按原始顺序报告无效记录，成绩范围检查优先于班次归属
+    await db.execute("""
+        SELECT stu_no,
+               COALESCE(grade NOT BETWEEN 0 AND 100, FALSE) AS out_of_range
+        FROM grade_import_rows
+        WHERE stu_sn IS NULL OR grade NOT BETWEEN 0 AND 100
+        ORDER BY ord
+    """)
+    for row in await db.fetchall():
+        if row.out_of_range:
+            stats['logs'].append(f"学号 {row.stu_no} 成绩超出范围")
+        else:
+            stats['logs'].append(f"学号 {row.stu_no} 不属于本班次")
+        stats['invalid'] += 1
+
+    # 执行插入/更新：同一学号出现多次时以最后一条为准
+    await db.execute("""
+        INSERT INTO class_grade (stu_sn, class_sn, grade)
+        SELECT DISTINCT ON (stu_sn) stu_sn, %(class_sn)s, grade
+        FROM grade_import_rows
+        WHERE stu_sn IS NOT NULL AND (grade IS NULL OR grade BETWEEN 0 AND 100)
+        ORDER BY stu_sn, ord DESC
+        ON CONFLICT (stu_sn, class_sn)
+        DO UPDATE SET grade = EXCLUDED.grade
+    """, {"class_sn": class_sn})
+
+    # 记录操作日志（每条有效记录一条）
+    await db.execute("""
+        INSERT INTO grade_import_logs 
+        (class_sn, stu_sn, operator, grade, created_at)
+        SELECT %(class_sn)s, stu_sn, %(operator)s, grade, NOW()
+        FROM grade_import_rows
+        WHERE stu_sn IS NOT NULL AND (grade IS NULL OR grade BETWEEN 0 AND 100)
+        ORDER BY ord
+    """, {"class_sn": class_sn, "operator": operator})
+    stats['success'] += db.rowcount
+
+
 @router.post("/api/grade/import", summary="Excel导入成绩")
 async def import_grades(
     request: ImportRequest,
@@ -245,166 +338,386 @@ async def import_grades(
         'logs': []
     }
     
-    with dblock() as db:
+    # 事务由 dblock 管理：正常退出时提交，出错时回滚；缓存在提交之后失效
+    async with dblock() as db:
         try:
-            db.execute("BEGIN")
-            
             # 1. 验证班次有效性
-            db.execute("SELECT class_no FROM class WHERE sn = %s", (request.class_sn,))
-            class_info = db.fetchone()
+            await db.execute("SELECT class_no FROM class WHERE sn = %s", (request.class_sn,))
+            class_info = await db.fetchone()
             if not class_info:
                 raise HTTPException(400, "班次不存在")
             
-            # 2. 处理每条记录
-            for record in request.records:
-                try:
-                    # 新增类型检查
-                    if record.grade is not None:
-                        if not (0 <= record.grade <= 100):
-                            stats['logs'].append(f"学号 {record.stu_no} 成绩超出范围")
-                            stats['invalid'] += 1
-                            continue
-                        if not isinstance(record.grade, (int, float)):
-                            stats['logs'].append(f"学号 {record.stu_no} 成绩格式错误")
-                            stats['invalid'] += 1
-                            continue
-
-                    # 验证学生是否存在于此班次
-                    db.execute("""
-                        SELECT s.sn FROM student s
-                        JOIN class_student cs ON s.sn = cs.stu_sn
-                        WHERE s.no = %s AND cs.class_sn = %s
-                    """, (record.stu_no, request.class_sn))
-                    student = db.fetchone()
-                    
-                    if not student:
-                        stats['logs'].append(f"学号 {record.stu_no} 不属于本班次")
-                        stats['invalid'] += 1
-                        continue
-                        
-                    # 验证成绩范围
-                    if record.grade is not None and (record.grade < 0 or record.grade > 100):
-                        stats['logs'].append(f"学号 {record.stu_no} 成绩超出范围")
-                        stats['invalid'] += 1
-                        continue
-                        
-                    # 执行插入/更新
-                    db.execute("""
-                        INSERT INTO class_grade (stu_sn, class_sn, grade)
-                        VALUES (%s, %s, %s)
-                        ON CONFLICT (stu_sn, class_sn)
-                        DO UPDATE SET grade = EXCLUDED.grade
-                        RETURNING id
-                    """, (student.sn, request.class_sn, record.grade))
-                    
-                    if db.fetchone():
-                        stats['success'] += 1
-                        # 记录操作日志
-                        db.execute("""
-                            INSERT INTO grade_import_logs 
-                            (class_sn, stu_sn, operator, grade, created_at)
-                            VALUES (%s, %s, %s, %s, %s)
-                        """, (
-                            request.class_sn,
-                            student.sn,
-                            current_user.user_sn,
-                            record.grade,
-                            datetime.now()
-                        ))
-                    else:
-                        stats['failed'] += 1
-                        
-                except Exception as e:
-                    stats['logs'].append(f"学号 {record.stu_no} 处理失败: {str(e)}")
-                    stats['failed'] += 1
-            
-            db.execute("COMMIT")
-            return {"stats": stats}
-            
+            # 2. 集合式处理全部记录
+            await import_grade_rows(
+                db, request.class_sn, current_user.user_sn,
+                ((record.stu_no, record.grade) for record in request.records),
+                stats)
+            await touch_classes(db, [request.class_sn])
+
+        except HTTPException:
+            raise
         except Exception as e:
-            db.execute("ROLLBACK")
             raise HTTPException(500, f"导入过程中出错: {str(e)}")
+
+    await totals.invalidate("class_grade")
+    await invalidate_tags(f"roster:{request.class_sn}")
+    return {"stats": stats}
         
+def detect_csv_encoding(file, chunk_size: int = 1 << 16) -> str:
+    """逐块试解码整个文件，返回第一个能完整解码的编码，并把文件位置移回开头"""
+    for encoding in CSV_ENCODINGS:
+        decoder = codecs.getincrementaldecoder(encoding)()
+        file.seek(0)
+        try:
+            while chunk := file.read(chunk_size):
+                decoder.decode(chunk)
+            decoder.decode(b"", final=True)
+        except UnicodeDecodeError:
+            continue
+        file.seek(0)
+        return encoding
+    raise InvalidError("无法识别 CSV 文件编码，请另存为 UTF-8 或 GBK 编码")
+
+
+def read_grade_file(file, filename: str | None):
+    """逐行读取上传的 xlsx/CSV 文件（只读流式，不整体载入内存）"""
+    suffix = os.path.splitext(filename or "")[1].lower()
+    if suffix == ".xlsx":
+        workbook = load_workbook(file, read_only=True, data_only=True)
+        try:
+            yield from workbook.worksheets[0].iter_rows(values_only=True)
+        finally:
+            workbook.close()
+    elif suffix == ".csv":
+        encoding = detect_csv_encoding(file)
+        yield from csv.reader(io.TextIOWrapper(file, encoding=encoding, newline=""))
+    else:
+        raise InvalidError("仅支持 .xlsx 或 .csv 文件")
+
+
+def grade_file_columns(header) -> tuple[int, int]:
+    """根据表头定位 (学号列, 成绩列)"""
+    columns = {}
+    for idx, title in enumerate(header or ()):
+        key = IMPORT_COLUMNS.get(str(title).strip()) if title is not None else None
+        if key and key not in columns:
+            columns[key] = idx
+    if "stu_no" not in columns or "grade" not in columns:
+        raise InvalidError("文件缺少必要列(学号/成绩)")
+    return columns["stu_no"], columns["grade"]
+
+
+def is_blank(value) -> bool:
+    """空单元格：None、空白字符串或 NaN"""
+    if value is None:
+        return True
+    if isinstance(value, float):
+        return math.isnan(value)
+    return str(value).strip() == ""
+
+
+def normalize_stu_no(value) -> str | None:
+    """单元格中的学号转为字符串，无法识别时返回 None"""
+    if is_blank(value):
+        return None
+    # Excel 中的学号可能被存成数字
+    if isinstance(value, float):
+        return str(int(value)) if value.is_integer() else None
+    return str(value).strip()
+
+
+def grade_file_records(rows, columns: tuple[int, int], stats: dict):
+    """将数据行转换为 (学号, 成绩)
+
+    学号为空或格式错误、成绩格式错误的行逐行记入 stats（带行号），不中断整个导入；
+    整行为空时直接跳过。
+    """
+    no_idx, grade_idx = columns
+    # 第 1 行为表头
+    for line, row in enumerate(rows, start=2):
+        if all(is_blank(cell) for cell in row):
+            continue  # 跳过空行
+        raw_no = row[no_idx] if len(row) > no_idx else None
+        grade = row[grade_idx] if len(row) > grade_idx else None
+
+        stu_no = normalize_stu_no(raw_no)
+        if stu_no is None:
+            stats['logs'].append(f"第 {line} 行 学号为空或格式错误")
+            stats['invalid'] += 1
+            continue
+
+        if is_blank(grade):
+            grade = None
+        else:
+            try:
+                grade = float(grade)
+            except (TypeError, ValueError):
+                grade = math.nan
+            if not math.isfinite(grade):
+                stats['logs'].append(f"第 {line} 行 学号 {stu_no} 成绩格式错误")
+                stats['invalid'] += 1
+                continue
+        yield stu_no, grade
+
+
+@router.post("/api/grade/import/file", summary="上传Excel/CSV文件导入成绩")
+async def import_grades_file(
+    class_sn: int = Form(...),
+    file: UploadFile = File(...),
+    current_user: User = Depends(get_current_active_user)
+):
+    """服务端流式解析上传的成绩文件，分批写入，返回与 /api/grade/import 相同的报告
+
+    文件格式与 download_template 生成的模板一致（学号/姓名/成绩/备注）。
+    """
+    stats = {
+        'success': 0,
+        'failed': 0,
+        'invalid': 0,
+        'logs': []
+    }
+
+    # 解析在线程中进行，避免阻塞事件循环
+    rows = read_grade_file(file.file, file.filename)
+    columns = grade_file_columns(await asyncio.to_thread(next, rows, None))
+    records = grade_file_records(rows, columns, stats)
+
+    async with dblock() as db:
+        try:
+            await db.execute("SELECT class_no FROM class WHERE sn = %s", (class_sn,))
+            if not await db.fetchone():
+                raise HTTPException(400, "班次不存在")
+
+            start = 0
+            while chunk := await asyncio.to_thread(list, islice(records, IMPORT_CHUNK_SIZE)):
+                await import_grade_rows(db, class_sn, current_user.user_sn, chunk, stats, start)
+                start += len(chunk)
+
+            await touch_classes(db, [class_sn])
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(500, f"导入过程中出错: {str(e)}")
+
+    await totals.invalidate("class_grade")
+    await invalidate_tags(f"roster:{class_sn}")
+    return {"stats": stats}
+
 # 冲突检测接口
 @router.get("/api/grade/check-conflict/{class_sn}", summary="检测前端成绩数据改动")
 async def check_grade_conflict(
     class_sn: int,
     current_user: User = Depends(get_current_active_user)
 ):
-    with dblock() as db:
-        db.execute("""
-            SELECT updated_at 
-            FROM class 
-            WHERE sn = %s
-        """, (class_sn,))
-        row = db.fetchone()
+    async with dblock() as db:
+        await execute(db, "class.version", {"class_sn": class_sn})
+        row = await db.fetchone()
         return {"version": row.updated_at.isoformat() if row else None}
 
+
+# SSE 心跳间隔（秒），防止代理关闭空闲连接
+EVENTS_HEARTBEAT = 25
+
+
+def events_scope(class_sn: int) -> str:
+    return f"grade-events:{class_sn}"
+
+
+@router.post("/api/grade/events/{class_sn}/ticket", summary="获取订阅班次改动的一次性票据")
+async def grade_events_ticket(
+    class_sn: int,
+    current_user: User = Depends(get_current_active_user)
+):
+    """EventSource 不能携带 Authorization 头；先用令牌换取票据，再以 ?ticket= 订阅"""
+    return {"ticket": await issue_ticket(current_user, events_scope(class_sn))}
+
+
+async def get_events_user(
+    class_sn: int,
+    ticket: str = Query(..., description="grade_events_ticket 签发的一次性票据")
+) -> User:
+    return await redeem_ticket(ticket, events_scope(class_sn))
+
+
+@router.get("/api/grade/events/{class_sn}", summary="订阅班次成绩数据改动（SSE）")
+async def grade_events(
+    class_sn: int,
+    request: Request,
+    current_user: User = Depends(get_events_user)
+):
+    """以 Server-Sent Events 推送班次版本，替代轮询 check-conflict
+
+    连接建立时推送一次当前版本，之后每次 class.updated_at 变化推送新版本
+    （由数据库触发器 NOTIFY，进程内统一监听后分发）。
+    订阅期间不占用连接池中的连接。票据只能使用一次，断线重连时需要重新获取。
+    """
+    if (await check_grade_conflict(class_sn, current_user))["version"] is None:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, f"无此班次(sn={class_sn})")
+
+    async def stream():
+        async with class_events.subscribe(class_sn) as queue:
+            # 先订阅再读取当前版本，两者之间的改动不会丢失
+            version = (await check_grade_conflict(class_sn, current_user))["version"]
+            yield f"event: version\ndata: {version}\n\n"
+            while not await request.is_disconnected():
+                try:
+                    latest = await asyncio.wait_for(queue.get(), EVENTS_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                else:
+                    yield f"event: version\ndata: {latest}\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+def grade_query_filter(params: GradeFilterParams) -> tuple[str, dict]:
+    """查询成绩的过滤条件：返回 (WHERE 条件, 参数)"""
+    where_clauses = []
+    query_params = {}
+
+    if params.course_sn:
+        where_clauses.append("cl.cou_sn = %(course_sn)s")
+        query_params["course_sn"] = params.course_sn
+
+        if params.class_sn:
+            where_clauses.append("g.class_sn = %(class_sn)s")
+            query_params["class_sn"] = params.class_sn
+
+        elif params.semester:
+            where_clauses.append("cl.semester = %(semester)s")
+            query_params["semester"] = params.semester
+
+    where_condition = " AND ".join(where_clauses) if where_clauses else "1=1"
+    return where_condition, query_params
+
+
+GRADE_QUERY_COLUMNS = ["grade_sn", "stu_sn", "class_sn", "course_sn", "stu_name", "course_name", "grade"]
+GRADE_QUERY_SELECT = """
+    SELECT 
+        g.id AS grade_sn,
+        g.stu_sn AS stu_sn, 
+        g.class_sn AS class_sn,
+        cl.cou_sn AS course_sn,
+        s.name AS stu_name, 
+        c.name AS course_name, 
+        g.grade AS grade
+"""
+
+
 @router.get("/api/grade/query", summary="查询成绩")
 async def query_grades(
     params: GradeQueryParams = Depends(),
     current_user: User = Depends(get_current_active_user)
 ):
+    where_condition, query_params = grade_query_filter(params)
+    # 总数的缓存键只包含过滤参数，分页参数在取总数之后再加入
+    count_key = f"grade:{sorted(query_params.items())}"
+    count_from = f"{GRADE_FROM} WHERE {where_condition}"
+    count_params = dict(query_params)
+    # 游标在 try 之前解码，无效游标返回 422 而不是 500
+    after_condition, paging = grade_paging(params, query_params)
+    if after_condition:
+        where_condition = f"{where_condition} AND {after_condition}"
+
     try:
-        with dblock() as db:
-            where_clauses = []
-            query_params = {}
-
-            if params.course_sn:
-                where_clauses.append("cl.cou_sn = %(course_sn)s")
-                query_params["course_sn"] = params.course_sn
-
-                if params.class_sn:
-                    where_clauses.append("g.class_sn = %(class_sn)s")
-                    query_params["class_sn"] = params.class_sn
-
-                elif params.semester:
-                    where_clauses.append("cl.semester = %(semester)s")
-                    query_params["semester"] = params.semester
-
-            where_condition = " AND ".join(where_clauses) if where_clauses else "1=1"
-
-            # 查询总记录数
-            count_query = f"""
-                SELECT COUNT(*) as total 
-                FROM class_grade AS g
-                    INNER JOIN student AS s ON g.stu_sn = s.sn
-                    INNER JOIN class AS cl ON g.class_sn = cl.sn
-                    INNER JOIN course AS c ON cl.cou_sn = c.sn
-                WHERE {where_condition}
-            """
-            db.execute(count_query, query_params)
-            total_row = db.fetchone()
-            total = total_row.total if total_row else 0
+        async with dblock() as db:
+            # 查询总记录数（缓存或估算），缓存键包含全部过滤参数
+            total, estimated = await totals.total(
+                db, count_key, count_from, count_params,
+                tables=GRADE_TABLES, approx=params.approx_total)
 
-            # 计算偏移量
-            offset = (params.page - 1) * params.page_size
-                # 查询当前页数据
+            # 查询当前页数据（按唯一键排序，保证翻页稳定）
             data_query = f"""
-                SELECT 
-                    g.id AS grade_sn,
-                    g.stu_sn AS stu_sn, 
-                    cl.cou_sn AS course_sn,
-                    s.name AS stu_name, 
-                    c.name AS course_name, 
-                    g.grade AS grade
-                FROM class_grade AS g
-                    INNER JOIN student AS s ON g.stu_sn = s.sn
-                    INNER JOIN class AS cl ON g.class_sn = cl.sn
-                    INNER JOIN course AS c ON cl.cou_sn = c.sn
+                {GRADE_QUERY_SELECT}
+                {GRADE_FROM}
                 WHERE {where_condition}
-                LIMIT %(page_size)s OFFSET %(offset)s
+                ORDER BY {GRADE_ORDER}
+                {paging}
             """
-            query_params["page_size"] = params.page_size
-            query_params["offset"] = offset
 
-            db.execute(data_query, query_params)
-            rows = db.fetchall()
-            data = [asdict(row) for row in rows]
+            await db.execute(data_query, query_params)
+            rows = await db.fetchall()
+            data = [row_to_dict(row) for row in rows]
 
             return {
                 "data": data,
-                "total": total
+                "total": total,
+                "total_estimated": estimated,
+                "next": next_cursor(rows, params.page_size, "stu_sn", "class_sn")
             }
+    except HTTPException:
+        raise
+    except PoolTimeout:
+        # 等待连接超时由 error.pool_timeout_handler 返回 503
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# 流式查询时服务端游标每次取回的行数
+STREAM_FETCH_SIZE = 2000
+
+
+def encode_ndjson(rows) -> str:
+    return "".join(
+        json.dumps(dict(zip(GRADE_QUERY_COLUMNS, row)), ensure_ascii=False, default=float) + "\n"
+        for row in rows
+    )
+
+
+def encode_csv(rows) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+
+def csv_header() -> str:
+    # 带 BOM，Excel 打开时能正确识别中文
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(GRADE_QUERY_COLUMNS)
+    return "\ufeff" + buffer.getvalue()
+
+
+STREAM_FORMATS = {
+    "ndjson": ("application/x-ndjson", encode_ndjson, None),
+    "csv": ("text/csv; charset=utf-8", encode_csv, csv_header),
+}
+
+
+@router.get("/api/grade/query/stream", summary="流式导出查询结果（NDJSON/CSV）")
+async def stream_grades(
+    request: Request,
+    params: GradeFilterParams = Depends(),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    current_user: User = Depends(get_current_active_user)
+):
+    """与 /api/grade/query 过滤条件相同，但不分页、不统计总数
+
+    通过服务端游标分批读取并立即输出，内存占用与结果行数无关；
+    客户端断开后停止读取并释放连接。
+    """
+    where_condition, query_params = grade_query_filter(params)
+    media_type, encode, header = STREAM_FORMATS[format]
+
+    async def stream():
+        if header:
+            yield header()
+        async with dblock() as db:
+            async with db.connection.cursor(name="grade_query_stream") as cur:
+                await cur.execute(f"""
+                    {GRADE_QUERY_SELECT}
+                    {GRADE_FROM}
+                    WHERE {where_condition}
+                    ORDER BY {GRADE_ORDER}
+                """, query_params)
+                while rows := await cur.fetchmany(STREAM_FETCH_SIZE):
+                    if await request.is_disconnected():
+                        break
+                    yield encode(rows)
+
+    return StreamingResponse(stream(), media_type=media_type, headers={
+        "Content-Disposition": f"attachment; filename=grades.{format}",
+    })
@@ -0,0 +1,82 @@
+import os
+import secrets
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+from fastapi.security import HTTPAuthorizationCredentials
+
+from .auth import oauth2_scheme, pwd_hasher, user_from_token
+from .config import dblock
+from .course_class import validate_jiaomi_role
+from .metrics import REGISTRY, prometheus_text
+
+# 监控系统抓取指标用的固定令牌（Authorization: Bearer <INTERNAL_TOKEN>），未设置时只允许教秘用户访问
+INTERNAL_TOKEN = os.getenv("INTERNAL_TOKEN", "")
+
+
+async def require_internal_access(
+    credentials: HTTPAuthorizationCredentials = Depends(oauth2_scheme)
+):
+    """内部接口的访问校验：监控令牌或教秘用户"""
+    token = credentials.credentials
+    if INTERNAL_TOKEN and secrets.compare_digest(token.encode(), INTERNAL_TOKEN.encode()):
+        return
+    user = await user_from_token(token)
+    validate_jiaomi_role(user.user_name)
+
+
+router = APIRouter(tags=["内部监控"], dependencies=[Depends(require_internal_access)])
+
+# 连接池统计项（psycopg_pool get_stats）：(键, 类型, 说明)
+# 计数项只在发生过时才出现在 get_stats 中，缺省按 0 处理
+POOL_STATS = [
+    ("pool_min", "gauge", "最小连接数"),
+    ("pool_max", "gauge", "最大连接数"),
+    ("pool_size", "gauge", "当前连接数（含借出与正在建立的连接）"),
+    ("pool_available", "gauge", "空闲连接数"),
+    ("requests_waiting", "gauge", "正在等待连接的请求数"),
+    ("requests_num", "counter", "借用连接的请求总数"),
+    ("requests_queued", "counter", "需要排队等待连接的请求数"),
+    ("requests_wait_ms", "counter", "排队等待连接的总时间（毫秒）"),
+    ("requests_errors", "counter", "等待连接超时或出错的请求数"),
+    ("usage_ms", "counter", "连接被借出的总时间（毫秒）"),
+    ("returns_bad", "counter", "归还时状态异常的连接数"),
+    ("connections_num", "counter", "建立连接的总次数"),
+    ("connections_ms", "counter", "建立连接的总耗时（毫秒）"),
+    ("connections_errors", "counter", "建立连接失败次数"),
+    ("connections_lost", "counter", "检查时发现已断开的连接数"),
+]
+
+
+def pool_stats() -> dict:
+    stats = dblock.pool.get_stats()  # type: ignore
+    return {key: stats.get(key, 0) for key, _, _ in POOL_STATS}
+
+
+@router.get("/internal/metrics", summary="进程内运行指标")
+async def get_metrics():
+    metrics = {name: metric.snapshot() for name, metric in REGISTRY.items()}
+    metrics["password_hash_queue_depth"] = pwd_hasher.queue_depth
+    return metrics
+
+
+@router.get("/internal/pool", summary="数据库连接池统计")
+async def get_pool_stats():
+    """排队请求多、等待时间长而数据库本身不忙时，说明连接池不够用"""
+    stats = pool_stats()
+    queued = stats["requests_queued"]
+    stats["avg_wait_ms"] = round(stats["requests_wait_ms"] / queued, 2) if queued else 0
+    return stats
+
+
+@router.get("/internal/metrics/prometheus", summary="运行指标（Prometheus 格式）",
+            response_class=PlainTextResponse)
+async def get_prometheus_metrics():
+    stats = pool_stats()
+    extra = [
+        (f"db_{key}", kind, help, stats[key]) for key, kind, help in POOL_STATS
+    ]
+    extra.append(("password_hash_queue_depth", "gauge", "等待密码哈希的请求数",
+                  pwd_hasher.queue_depth))
+    return PlainTextResponse(prometheus_text(extra),
+                             media_type="text/plain; version=0.0.4")
@@ -15,6 +15,7 @@ from .auth import (
     Token,
     User
 )
+from .authcache import token_cache
 from .config import app, dblock
 from datetime import timedelta
 from .error import ConflictError, InvalidError
@@ -23,7 +24,9 @@ from .error import ConflictError, InvalidError
 ACCESS_TOKEN_EXPIRE_MINUTES = 30  # 设置访问令牌的过期时间为30分钟
 
 # 初始化限流器
-limiter = Limiter(key_func=get_remote_address)
+# 压测时可设置 RATELIMIT_ENABLED=0 关闭限流
+limiter = Limiter(key_func=get_remote_address,
+                  enabled=os.getenv("RATELIMIT_ENABLED", "1") != "0")
 router = APIRouter(tags=["用户认证"])
 
 # 定义请求体模型
@@ -72,34 +75,35 @@ async def create_user(user_data: UserCreate):
     password = user_data.password
     
     # 检查用户名是否存在
-    with dblock() as db:
-        db.execute("""
+    async with dblock() as db:
+        await db.execute("""
             SELECT user_sn 
             FROM sys_users 
             WHERE username = %(username)s
             """,
             {"username": username}
         )
-        if db.fetchone():
+        if await db.fetchone():
             raise ConflictError("Username already registered")
     
     # 密码复杂度验证
     if not re.match(r"^(?=.*[A-Z])(?=.*[a-z])(?=.*\d).{8,}$", password):
         raise InvalidError("Password too weak")
     
+    # 哈希模式存储密码（在线程池中计算，不占用数据库连接）
+    hashed_password = await get_password_hash(password)
+
     # 创建用户
-    with dblock() as db:
-        db.execute("""
+    async with dblock() as db:
+        await db.execute("""
             INSERT INTO sys_users (username)
             VALUES (%(username)s)
             RETURNING user_sn
             """, {"username": username}
         )
-        user = db.fetchone()
+        user = await db.fetchone()
         
-        # 哈希模式存储密码
-        hashed_password = get_password_hash(password)
-        db.execute("""
+        await db.execute("""
             INSERT INTO user_passwords (user_sn, hashed_password)
             VALUES (%(user_sn)s, %(hashed_password)s)
             """,{
@@ -120,16 +124,20 @@ async def change_password(
     if not re.match(r"^(?=.*[A-Z])(?=.*[a-z])(?=.*\d).{8,}$", new_password):
         raise InvalidError("密码必须包含大小写字母和数字，至少8位")
     
-    # 更新密码
-    with dblock() as db:
-        db.execute("""
-            UPDATE passwords 
+    # 更新密码（先在线程池中算好哈希，不占用数据库连接等待）
+    hashed_password = await get_password_hash(new_password)
+    async with dblock() as db:
+        await db.execute("""
+            UPDATE user_passwords 
             SET hashed_password = %(hashed_password)s
             WHERE user_sn = %(user_sn)s
             """, {
-                "hashed_password": get_password_hash(new_password),
+                "hashed_password": hashed_password,
                 "user_sn": current_user.user_sn
             }
         )
+
+    # 丢弃该用户已缓存的令牌认证结果
+    await token_cache.invalidate_user(current_user.user_sn)
     
     return {"message": "密码修改成功"}
\ No newline at end of file
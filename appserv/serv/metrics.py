@@ -0,0 +1,63 @@
+from collections import deque
+import math
+
+
+class Summary:
+    """耗时统计：累计次数与总和，并保留最近 window 个样本用于计算分位数"""
+
+    def __init__(self, name: str, help: str, window: int = 1024):
+        self.name = name
+        self.help = help
+        self.count = 0
+        self.sum = 0.0
+        self._samples = deque(maxlen=window)
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        self._samples.append(value)
+
+    def quantile(self, q: float) -> float:
+        if not self._samples:
+            return 0.0
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)]
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "p50": round(self.quantile(0.5), 6),
+            "p99": round(self.quantile(0.99), 6),
+        }
+
+
+# 进程内所有指标，按名称登记
+REGISTRY: dict[str, Summary] = {}
+
+
+def summary(name: str, help: str) -> Summary:
+    """获取（或创建并登记）一个 Summary 指标"""
+    if name not in REGISTRY:
+        REGISTRY[name] = Summary(name, help)
+    return REGISTRY[name]
+
+
+def prometheus_text(extra: list[tuple[str, str, str, float]] = ()) -> str:
+    """以 Prometheus 文本格式输出所有 Summary 指标
+
+    extra 为附加的 (名称, 类型, 说明, 值)，类型为 gauge 或 counter。
+    """
+    lines = []
+    for metric in REGISTRY.values():
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} summary")
+        for q in (0.5, 0.99):
+            lines.append(f'{metric.name}{{quantile="{q}"}} {metric.quantile(q)}')
+        lines.append(f"{metric.name}_sum {metric.sum}")
+        lines.append(f"{metric.name}_count {metric.count}")
+    for name, kind, help, value in extra:
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
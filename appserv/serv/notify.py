@@ -0,0 +1,88 @@
+import asyncio
+import datetime as dt
+import json
+import logging
+from contextlib import asynccontextmanager
+
+import psycopg
+
+_log = logging.getLogger("notify")
+
+# 与 dbscripts/1_table.sql 中 notify_class_version 触发器使用的通道一致
+CLASS_VERSION_CHANNEL = "class_version"
+# 监听连接断开后的重连间隔（秒）
+RECONNECT_DELAY = 2
+
+
+class ClassEventHub:
+    """班次版本变更的进程内分发
+
+    整个进程只用一条独立连接 LISTEN（不占用连接池），
+    收到通知后分发给订阅该班次的各个队列。订阅者只关心最新版本，
+    每个队列只保留最后一条，空闲的订阅者不占用数据库资源。
+    """
+
+    def __init__(self, dsn: str, channel: str = CLASS_VERSION_CHANNEL):
+        self.dsn = dsn
+        self.channel = channel
+        self._subscribers: dict[int, set[asyncio.Queue]] = {}
+        self._task: asyncio.Task | None = None
+
+    @property
+    def subscriber_count(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    @asynccontextmanager
+    async def lifespan(self):
+        self._task = asyncio.create_task(self._listen())
+        try:
+            yield
+        finally:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    @asynccontextmanager
+    async def subscribe(self, class_sn: int):
+        queue = asyncio.Queue(maxsize=1)
+        self._subscribers.setdefault(class_sn, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            queues = self._subscribers.get(class_sn)
+            if queues is not None:
+                queues.discard(queue)
+                if not queues:
+                    del self._subscribers[class_sn]
+
+    def publish(self, class_sn: int, version: str):
+        for queue in self._subscribers.get(class_sn, ()):
+            if queue.full():
+                queue.get_nowait()  # 丢弃尚未取走的旧版本
+            queue.put_nowait(version)
+
+    async def _listen(self):
+        while True:
+            try:
+                conn = await psycopg.AsyncConnection.connect(self.dsn, autocommit=True)
+                async with conn:
+                    await conn.execute(f"LISTEN {self.channel}")
+                    _log.info("listening on %s", self.channel)
+                    async for notify in conn.notifies():
+                        self._dispatch(notify.payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                _log.exception("listener connection lost, reconnecting")
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    def _dispatch(self, payload: str):
+        try:
+            data = json.loads(payload)
+            # 统一成与 check-conflict 相同的 isoformat 格式
+            version = dt.datetime.fromisoformat(data["updated_at"]).isoformat()
+            self.publish(int(data["class_sn"]), version)
+        except (ValueError, KeyError, TypeError):
+            _log.warning("invalid %s payload: %r", self.channel, payload)
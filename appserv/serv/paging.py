@@ -0,0 +1,40 @@
+import base64
+import json
+
+from .error import InvalidError
+
+
+def encode_cursor(*values) -> str:
+    """将排序键编码为不透明的分页游标（after= 参数）"""
+    raw = json.dumps(values, ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str, *types: type | tuple[type, ...]) -> list:
+    """解码 after= 游标，返回排序键列表；types 为各排序键的类型
+
+    可为空的排序键传入类型元组，如 (str, type(None))。
+
+    游标来自客户端，格式或类型不符时抛出 InvalidError（422），
+    不会把错误的值带入 SQL。
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except ValueError:
+        raise InvalidError("无效的分页游标")
+    if not isinstance(values, list) or len(values) != len(types):
+        raise InvalidError("无效的分页游标")
+    for value, expected in zip(values, types):
+        # bool 是 int 的子类，需要单独排除
+        if not isinstance(value, expected) or isinstance(value, bool):
+            raise InvalidError("无效的分页游标")
+    return values
+
+
+def next_cursor(rows: list, page_size: int, *keys: str) -> str | None:
+    """若本页已满，用最后一行的排序键生成下一页游标，否则返回 None"""
+    if len(rows) < page_size:
+        return None
+    last = rows[-1]
+    return encode_cursor(*(getattr(last, k) for k in keys))
@@ -0,0 +1,69 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException, status
+
+from .metrics import summary
+
+# 哈希线程数与排队上限（超过上限的请求直接返回 503，而不是无限堆积）
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "64"))
+
+hash_latency = summary("password_hash_seconds", "bcrypt 哈希/校验耗时")
+hash_queue_wait = summary("password_hash_queue_wait_seconds", "哈希任务排队等待时间")
+
+
+class PasswordHasher:
+    """在独立线程池中执行 bcrypt，避免阻塞事件循环
+
+    bcrypt 计算期间会释放 GIL，因此线程即可并行；
+    排队中的任务数超过 max_queue 时拒绝新的请求。
+    """
+
+    def __init__(self, context, workers: int, max_queue: int):
+        self.context = context
+        self.workers = workers
+        self.max_queue = max_queue
+        self._pending = 0
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="pwhash"
+        )
+
+    @property
+    def queue_depth(self) -> int:
+        return max(self._pending - self.workers, 0)
+
+    async def _run(self, fn, *args):
+        if self._pending >= self.workers + self.max_queue:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="登录请求过多，请稍后重试",
+                headers={"Retry-After": "1"},
+            )
+
+        queued_at = time.perf_counter()
+
+        def job():
+            started = time.perf_counter()
+            result = fn(*args)
+            return result, started - queued_at, time.perf_counter() - started
+
+        self._pending += 1
+        try:
+            result, waited, elapsed = await asyncio.get_running_loop().run_in_executor(
+                self._executor, job
+            )
+        finally:
+            self._pending -= 1
+
+        hash_queue_wait.observe(waited)
+        hash_latency.observe(elapsed)
+        return result
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(self.context.verify, plain_password, hashed_password)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
@@ -0,0 +1,172 @@
+"""按请求统计数据库查询
+
+dblock 的游标在每次 execute 时记录耗时，累计到当前请求的 RequestStats 中
+（通过 contextvar 传递，不需要修改处理函数），由 QueryStatsMiddleware 汇总：
+
+- 响应头 Server-Timing 给出查询次数与数据库总耗时，浏览器开发者工具可直接查看；
+- 响应结束后 access 日志输出一行 JSON（接口、状态码、耗时、查询次数、最慢语句）；
+- 单条语句超过 SLOW_QUERY_MS 时立即记录警告；
+- 同一请求中同一语句执行超过 QUERY_REPEAT_WARN 次时记录警告（疑似 N+1 查询）。
+
+流式响应开始输出后不再做慢查询与 N+1 告警。
+
+服务端命名游标（流式导出）逐批取数的时间不计入。
+"""
+import json
+import logging
+import os
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from psycopg import AsyncCursor
+from starlette.datastructures import MutableHeaders
+
+# 慢查询阈值（毫秒）
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+# 同一请求中同一语句执行次数超过该值时告警
+QUERY_REPEAT_WARN = int(os.getenv("QUERY_REPEAT_WARN", "10"))
+# 是否输出 access 日志
+ACCESS_LOG = os.getenv("ACCESS_LOG", "1") != "0"
+# 日志中 SQL 的最大长度
+SQL_LOG_LENGTH = 200
+
+_log = logging.getLogger("querystats")
+_access_log = logging.getLogger("access")
+
+
+def sql_shape(query) -> str:
+    """语句文本去掉多余空白，用于日志"""
+    if isinstance(query, bytes):
+        query = query.decode()
+    text = query if isinstance(query, str) else repr(query)
+    return " ".join(text.split())[:SQL_LOG_LENGTH]
+
+
+@dataclass(slots=True)
+class RequestStats:
+    count: int = 0
+    total: float = 0.0
+    slowest: float = 0.0
+    slowest_query: object = None
+    # 已开始分块输出响应体（流式响应）
+    streaming: bool = False
+    # 参数与语句分离，语句文本即语句“形状”；SQL 常量是同一对象，计数时哈希开销很小
+    shapes: Counter = field(default_factory=Counter)
+
+    def record(self, query, elapsed: float):
+        self.count += 1
+        self.total += elapsed
+        self.shapes[query] += 1
+        if elapsed > self.slowest:
+            self.slowest = elapsed
+            self.slowest_query = query
+
+
+_request_stats: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+def record_query(query, elapsed: float):
+    stats = _request_stats.get()
+    if stats is not None:
+        # psycopg.sql 组合对象不可哈希，按其表示计数
+        stats.record(query if isinstance(query, (str, bytes)) else repr(query), elapsed)
+    if elapsed * 1000 >= SLOW_QUERY_MS and not (stats and stats.streaming):
+        _log.warning("slow query %.1fms: %s", elapsed * 1000, sql_shape(query))
+
+
+class InstrumentedCursor(AsyncCursor):
+    """记录每次 execute 耗时的游标，由 create_async_dpool 设为连接的 cursor_factory"""
+
+    async def execute(self, query, params=None, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await super().execute(query, params, **kwargs)
+        finally:
+            record_query(query, time.perf_counter() - started)
+
+    async def executemany(self, query, params_seq, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await super().executemany(query, params_seq, **kwargs)
+        finally:
+            record_query(query, time.perf_counter() - started)
+
+
+class QueryStatsMiddleware:
+    """按请求汇总数据库查询的 ASGI 中间件
+
+    直接包装 send，不经过 BaseHTTPMiddleware 的响应代理：
+    Server-Timing 加在 http.response.start 的响应头中，最后一块响应体发出后记录日志。
+    流式响应（SSE、NDJSON/CSV 导出、ZIP 打包）可能持续很久，Server-Timing 只统计到响应头发出时，
+    不做 N+1 与慢查询告警，access 日志中标记 streamed。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        started = time.perf_counter()
+        status = 500
+        done = False
+
+        async def send_with_stats(message):
+            nonlocal status, done
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message.setdefault("headers", [])
+                MutableHeaders(scope=message).append("Server-Timing", (
+                    f'db;dur={stats.total * 1000:.2f};desc="{stats.count} queries", '
+                    f"total;dur={(time.perf_counter() - started) * 1000:.2f}"
+                ))
+            elif message["type"] == "http.response.body":
+                if message.get("more_body", False):
+                    stats.streaming = True
+                elif not done:
+                    # 先发出响应，再记录日志
+                    await send(message)
+                    done = True
+                    self.finish(scope, stats, status, started)
+                    return
+            await send(message)
+
+        # 同一任务中运行，流式响应的子任务复制上下文，拿到的是同一个 RequestStats 对象
+        token = _request_stats.set(stats)
+        try:
+            await self.app(scope, receive, send_with_stats)
+        finally:
+            _request_stats.reset(token)
+            # 出错或客户端中途断开时没有最后一块响应体
+            if not done:
+                self.finish(scope, stats, status, started)
+
+    @staticmethod
+    def finish(scope, stats: "RequestStats", status: int, started: float):
+        elapsed = time.perf_counter() - started
+        route = scope.get("route")
+        endpoint = getattr(route, "path", scope["path"])
+
+        if not stats.streaming:
+            for query, times in stats.shapes.items():
+                if times > QUERY_REPEAT_WARN:
+                    _log.warning("%s %s: query repeated %d times (N+1?): %s",
+                                 scope["method"], endpoint, times, sql_shape(query))
+
+        if ACCESS_LOG:
+            _access_log.info(json.dumps({
+                "method": scope["method"],
+                "path": endpoint,
+                "status": status,
+                "ms": round(elapsed * 1000, 2),
+                "streamed": stats.streaming,
+                "db_queries": stats.count,
+                "db_ms": round(stats.total * 1000, 2),
+                "slowest_ms": round(stats.slowest * 1000, 2),
+                "slowest_sql": sql_shape(stats.slowest_query) if stats.slowest_query else None,
+            }, ensure_ascii=False))
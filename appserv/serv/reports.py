@@ -0,0 +1,310 @@
+import asyncio
+import datetime as dt
+import io
+import logging
+import os
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import xlsxwriter
+from fastapi import HTTPException, status
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFError, TTFont
+from reportlab.pdfgen import canvas
+from reportlab.platypus import Table, TableStyle
+
+from .metrics import summary
+
+# 报表渲染进程数与排队上限（超过上限的请求直接返回 503）
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "2"))
+REPORT_MAX_QUEUE = int(os.getenv("REPORT_MAX_QUEUE", "16"))
+
+render_latency = summary("report_render_seconds", "报表渲染耗时（含进程间传输）")
+
+_log = logging.getLogger("reports")
+
+# 需要字体文件；找不到时服务照常启动，PDF 导出接口会提示安装字体
+for font_file in ('../fonts/simsun.ttc', '../fonts/simsun.ttf'):  # 尝试不同格式
+    try:
+        pdfmetrics.registerFont(TTFont('SimSun', font_file))
+        break
+    except TTFError:
+        continue
+else:
+    _log.warning("SimSun font not found, PDF export is unavailable")
+
+REPORT_HEADER = ['课程名称', '班次号', '学期', '成绩', '学分', '是否通过']
+
+
+def gender_label(gender) -> str:
+    return '男' if gender == 'M' else '女'
+
+
+def render_xlsx(report: dict) -> bytes:
+    """学生成绩报表 -> xlsx 文件内容；report 为 load_student_report 返回的普通数据"""
+    student, stats = report['student'], report['stats']
+    output = io.BytesIO()
+    with xlsxwriter.Workbook(output) as workbook:
+        worksheet = workbook.add_worksheet()
+
+        # 定义格式样式
+        header_format = workbook.add_format({
+            'bold': True,
+            'bg_color': '#D3D3D3',
+            'border': 1,
+            'align': 'center'
+        })
+        info_format = workbook.add_format({
+            'bold': True,
+            'bg_color': '#E8F4FF',
+            'border': 1,
+            'align': 'center'
+        })
+        stats_format = workbook.add_format({
+            'bold': True,
+            'bg_color': '#FFF2E0',
+            'border': 1,
+            'align': 'center'
+        })
+
+        # 学生基本信息
+        worksheet.merge_range(0, 0, 0, 2, '学生基本信息', info_format)
+        worksheet.write_row(1, 0, [
+            f"学号：{student['stu_no']}",
+            f"姓名：{student['stu_name']}",
+            f"性别：{gender_label(student['gender'])}",
+        ], info_format)
+
+        # 课程表头
+        header_row = 2
+        worksheet.write_row(header_row, 0, REPORT_HEADER, header_format)
+
+        # 动态计算列宽
+        col_widths = [10]*6  # 初始最小宽度
+        max_data_row = header_row
+
+        # 写入课程数据
+        for row_idx, item in enumerate(report['grades'], start=header_row+1):
+            # 更新列宽
+            col_widths[0] = max(col_widths[0], len(item['course_name'])*2.3) # type: ignore
+            col_widths[1] = max(col_widths[1], len(str(item['class_no']))*1.5) # type: ignore
+            col_widths[2] = max(col_widths[2], len(item['semester'])*1.5) # type: ignore
+            col_widths[3] = max(col_widths[3], len(str(item['grade'] or '未录入')))
+            col_widths[4] = max(col_widths[4], len(str(item['credit'])))
+            col_widths[5] = max(col_widths[5], len(item['passed']))
+
+            # 写入数据
+            worksheet.write(row_idx, 0, item['course_name'])
+            worksheet.write(row_idx, 1, item['class_no'])
+            worksheet.write(row_idx, 2, item['semester'])
+            worksheet.write(row_idx, 3, item['grade'] or '未录入')
+            worksheet.write(row_idx, 4, item['credit'])
+            worksheet.write(row_idx, 5, item['passed'])
+            max_data_row = row_idx
+
+        # 设置动态列宽（限制最大40）
+        for col, width in enumerate(col_widths):
+            worksheet.set_column(col, col, min(width, 40))
+
+        # 统计摘要
+        stats_row = max_data_row + 2
+        worksheet.merge_range(stats_row, 0, stats_row, 2, "成绩统计", stats_format)
+        worksheet.write_row(stats_row+1, 0, [
+            f"总学分：{stats['total_credits']}",
+            f"加权平均分：{stats['gpa']}",
+            f"不及格门数：{stats['failed_count']}",
+        ], stats_format)
+
+    return output.getvalue()
+
+
+def render_pdf(report: dict) -> bytes:
+    """学生成绩报表 -> PDF 文件内容"""
+    student, stats = report['student'], report['stats']
+    output = io.BytesIO()
+    c = canvas.Canvas(output, pagesize=A4)
+    width, height = A4
+
+    # 报表标题和导出时间
+    y_position = height - 40  # 初始Y坐标
+    c.setFont('SimSun', 16)
+    c.drawCentredString(width/2, y_position, "学生成绩报表")
+    c.setFont('SimSun', 10)
+    c.drawRightString(width-50, y_position, f"导出时间：{dt.datetime.now().strftime('%Y-%m-%d %H:%M')}")
+
+    # 学生基本信息
+    y_position -= 60
+    c.setFont('SimSun', 12)
+    c.drawString(50, y_position, f"学号：{student['stu_no']}")
+    y_position -= 30
+    c.drawString(50, y_position, f"姓名：{student['stu_name']}")
+    y_position -= 30
+    c.drawString(50, y_position, f"性别：{gender_label(student['gender'])}")
+
+    # 创建成绩表格
+    data = [REPORT_HEADER]
+    for g in report['grades']:
+        data.append([
+            g['course_name'],
+            g['class_no'],
+            g['semester'],
+            str(g['grade']) if g['grade'] else '未录入',
+            str(g['credit']),
+            g['passed']
+        ])
+
+    # 自动计算列宽
+    col_widths = [width*0.3, width*0.15, width*0.15, width*0.1, width*0.1, width*0.1]
+
+    # 创建表格并设置样式
+    table = Table(data, colWidths=col_widths)
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0,0), (-1,0), colors.lightgrey),
+        ('TEXTCOLOR', (0,0), (-1,0), colors.black),
+        ('ALIGN', (0,0), (-1,-1), 'CENTER'),
+        ('FONTNAME', (0,0), (-1,-1), 'SimSun'),  # 修改这里，应用全局字体
+        ('FONTSIZE', (0,0), (-1,0), 10),         # 表头字号
+        ('FONTSIZE', (0,1), (-1,-1), 9),         # 数据行字号
+        ('BOTTOMPADDING', (0,0), (-1,0), 12),
+        ('BACKGROUND', (0,1), (-1,-1), colors.white),
+        ('GRID', (0,0), (-1,-1), 1, colors.black)
+    ]))
+
+    # 绘制表格
+    y_position -= 40  # 基本信息与表格间距
+    table.wrapOn(c, width, height)
+    table.drawOn(c, 30, y_position - table._height)  # type: ignore # 自动计算表格高度
+
+    # 统计信息
+    stats_text = [
+        f"总学分：{stats['total_credits']}",
+        f"加权平均分：{stats['gpa']}",
+        f"不及格门数：{stats['failed_count']}"
+    ]
+    y_position -= (table._height + 60) # type: ignore
+    c.setFont('SimSun', 14)
+    c.drawString(50, y_position, "成绩统计：")
+    y_position -= 30
+    c.setFont('SimSun', 12)
+    for i, text in enumerate(stats_text):
+        c.drawString(100, y_position - i*30, text)
+
+    c.save()
+    return output.getvalue()
+
+
+# 导出格式 -> (渲染函数, MIME 类型)
+RENDERERS = {
+    'xlsx': (render_xlsx, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    'pdf': (render_pdf, "application/pdf"),
+}
+
+
+class ReportRenderer:
+    """在独立进程池中渲染报表，避免 CPU 密集的排版阻塞事件循环
+
+    渲染函数只接收普通数据（dict/list/标量），便于跨进程传递；
+    排队中的任务数超过 max_queue 时拒绝新的请求。
+    """
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._pending = 0
+        # 进程在首次提交任务时才启动
+        self._executor = ProcessPoolExecutor(max_workers=workers)
+
+    async def render(self, fmt: str, report: dict) -> bytes:
+        if self._pending >= self.workers + self.max_queue:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="报表导出请求过多，请稍后重试",
+                headers={"Retry-After": "1"},
+            )
+
+        render, _ = RENDERERS[fmt]
+        return await self._run(render, report)
+
+    async def render_many(self, fmt: str, reports):
+        """批量渲染：按完成顺序产出 (report, 文件内容)
+
+        reports 为异步可迭代对象，按需读取；同时在途的任务数不超过进程数，
+        因此不受 max_queue 限制，也不会一次性读入全部数据。
+        """
+        render, _ = RENDERERS[fmt]
+
+        async def render_one(report):
+            return report, await self._run(render, report)
+
+        pending = set()
+        try:
+            async for report in reports:
+                if len(pending) >= self.workers:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        yield task.result()
+                pending.add(asyncio.create_task(render_one(report)))
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        finally:
+            # 客户端断开等情况下取消尚未完成的任务
+            for task in pending:
+                task.cancel()
+
+    async def _run(self, render, report: dict) -> bytes:
+        started = time.perf_counter()
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, render, report
+            )
+        finally:
+            self._pending -= 1
+            render_latency.observe(time.perf_counter() - started)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+report_renderer = ReportRenderer(REPORT_WORKERS, REPORT_MAX_QUEUE)
+
+
+class ZipStreamBuffer(io.RawIOBase):
+    """只追加、不可 seek 的写缓冲
+
+    zipfile 写入不可 seek 的对象时改用数据描述符，不需要回写文件头，
+    因此每写完一个文件就可以把已生成的字节取走发送，压缩包不会整体留在内存中。
+    """
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def stream_reports_zip(fmt: str, reports):
+    """渲染一批报表并以 ZIP 流的形式逐块产出，每个学生一个文件"""
+    buffer = ZipStreamBuffer()
+    # PDF/xlsx 本身已经压缩，不再二次压缩
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as archive:
+        async for report, content in report_renderer.render_many(fmt, reports):
+            student = report['student']
+            archive.writestr(f"{student['stu_no']}_{student['stu_name']}.{fmt}", content)
+            yield buffer.drain()
+    # 中央目录在关闭压缩包时写入
+    yield buffer.drain()
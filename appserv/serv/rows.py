@@ -0,0 +1,55 @@
+from dataclasses import make_dataclass
+from functools import lru_cache
+from operator import attrgetter
+
+# 最多缓存的行类型数量（不同的列签名），超出后按 LRU 淘汰
+ROW_CLASS_CACHE_SIZE = 256
+
+
+@lru_cache(maxsize=ROW_CLASS_CACHE_SIZE)
+def row_class(field_names: tuple[str, ...]):
+    """按列签名返回（并缓存）一个带 __slots__ 的 Row 数据类
+
+    同一条 SQL 每次执行得到相同的列签名，因此只在第一次创建类型，
+    之后直接复用，省去每次查询都调用 make_dataclass 的开销。
+    """
+    getter = attrgetter(*field_names)
+    if len(field_names) == 1:
+        def _values(row):
+            return (getter(row),)
+    else:
+        _values = getter
+
+    def _asdict(self):
+        # 浅拷贝为普通 dict，可直接交给 FastAPI 序列化，
+        # 不需要 dataclasses.asdict 的递归深拷贝
+        return dict(zip(field_names, _values(self)))
+
+    return make_dataclass(
+        "Row", field_names, slots=True, namespace={"_asdict": _asdict}
+    )
+
+
+def row_to_dict(row) -> dict:
+    """将查询得到的 Row 转为 dict，替代 dataclasses.asdict"""
+    return row._asdict()
+
+
+def _row_maker(cursor):
+    if cursor.description is None:
+        return None
+
+    _dataclass = row_class(tuple(c.name for c in cursor.description))
+    return lambda values: _dataclass(*values)
+
+
+def dict_row_factory(cursor):
+    if cursor.connection.autocommit:
+        cursor.execute("SET TRANSACTION READ ONLY")
+    return _row_maker(cursor)
+
+
+def async_dict_row_factory(cursor):
+    # AsyncCursor 的行工厂不能 await，连接池中的连接均非 autocommit，
+    # 因此不需要同步版本里的 SET TRANSACTION READ ONLY
+    return _row_maker(cursor)
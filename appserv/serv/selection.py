@@ -2,11 +2,15 @@ from fastapi import APIRouter, Depends, HTTPException, status, Query
 from pydantic import BaseModel, Field
 from typing import List
 import datetime as dt
-from dataclasses import asdict
+from .rows import row_to_dict
+from .totals import totals
+from .cache import cached, invalidate_tags
 
 from .config import dblock
 from .auth import get_current_active_user, User
-from .course_class import validate_jiaomi_role
+from .course_class import validate_jiaomi_role, require_jiaomi_user
+from .etag import class_etag, touch_classes
+from .statements import execute
 
 
 router = APIRouter(tags=["选课管理"])
@@ -29,29 +33,18 @@ class ClassStudentsResponse(BaseModel):
 
 async def get_current_students(db, class_sn: int) -> List[dict]:
     """辅助函数：获取当前关联学生"""
-    db.execute("""
-        SELECT s.sn AS stu_sn, 
-               s.no AS stu_no, 
-               s.name AS stu_name, 
-               s.gender, s.enrollment_date
-        FROM student AS s
-        JOIN class_student AS cs ON s.sn = cs.stu_sn
-        WHERE cs.class_sn = %(class_sn)s
-        ORDER BY s.no
-        """, 
-        {"class_sn": class_sn}
-    )
-    return [asdict(row) for row in db]
+    await execute(db, "roster.students", {"class_sn": class_sn})
+    return [row_to_dict(row) async for row in db]
 
 @router.get("/api/class/{class_sn}/students", 
-            summary="获取班次关联学生")
+            summary="获取班次关联学生",
+            dependencies=[Depends(require_jiaomi_user), Depends(class_etag)])
 async def get_class_students(
     class_sn: int,
     current_user: User = Depends(get_current_active_user)
 ):
     """获取指定班次已关联的学生列表"""
-    validate_jiaomi_role(current_user.user_name)
-    with dblock() as db:
+    async with dblock() as db:
         return await get_current_students(db, class_sn)
 
 @router.get("/api/class/{class_sn}/students/conflicts", 
@@ -63,19 +56,19 @@ async def check_student_conflicts(
 ):
     """检查学生是否在其他班次有冲突"""
     validate_jiaomi_role(current_user.user_name)
-    with dblock() as db:
-        db.execute("""
+    async with dblock() as db:
+        await db.execute("""
             SELECT c.cou_sn 
             FROM class AS c 
             WHERE c.sn = %(class_sn)s
             """, 
             {"class_sn": class_sn}
         )
-        class_info = db.fetchone()
+        class_info = await db.fetchone()
         if not class_info:
             raise HTTPException(404, "班次不存在")
         
-        db.execute("""
+        await db.execute("""
             SELECT s.sn AS stu_sn, 
                    s.no AS stu_no, 
                    s.name AS stu_name, 
@@ -93,7 +86,7 @@ async def check_student_conflicts(
                 "class_sn": class_sn
             }
         )
-        return [asdict(row) for row in db]
+        return [row_to_dict(row) async for row in db]
 
 
 @router.put("/api/class/{class_sn}/students",
@@ -113,10 +106,10 @@ async def update_class_students(
     """
     validate_jiaomi_role(current_user.user_name)
     
-    with dblock() as db:
+    async with dblock() as db:
         try:
             # 1. 获取课程和当前关联信息
-            db.execute("""
+            await db.execute("""
                 SELECT c.cou_sn, 
                     ARRAY(
                         SELECT stu_sn 
@@ -127,7 +120,7 @@ async def update_class_students(
                 """, 
                 {"class_sn": class_sn}
             )
-            class_info = db.fetchone()
+            class_info = await db.fetchone()
             if not class_info:
                 raise HTTPException(404, "班次不存在")
             
@@ -149,7 +142,7 @@ async def update_class_students(
                 }
             
             if to_add:
-                db.execute("""
+                await db.execute("""
                     SELECT s.sn AS stu_sn, s.no AS stu_no, s.name AS stu_name, c.class_no AS class_no
                     FROM student AS s
                     JOIN class_student AS cs ON s.sn = cs.stu_sn
@@ -164,7 +157,7 @@ async def update_class_students(
                         "class_sn": class_sn
                     }
                 )
-                conflicts = [asdict(row) for row in db]
+                conflicts = [row_to_dict(row) async for row in db]
                 if conflicts:
                     return {
                         "total_count": len(current_sns),
@@ -176,16 +169,16 @@ async def update_class_students(
             
 
 
-            db.execute("BEGIN")
+            await db.execute("BEGIN")
 
             # 4. 执行删除
             if to_remove:
-                db.execute("""
+                await db.execute("""
                     DELETE FROM class_student
                     WHERE class_sn = %(class_sn)s
                     AND stu_sn = ANY(%(sns)s)
                     """, {"class_sn": class_sn, "sns": to_remove})
-                db.execute("""
+                await db.execute("""
                     DELETE FROM class_grade
                     WHERE class_sn = %(class_sn)s
                     AND stu_sn = ANY(%(sns)s)
@@ -193,7 +186,7 @@ async def update_class_students(
 
             # 5. 执行新增（使用 PostgreSQL 的 UNNEST 语法）
             if to_add:
-                db.execute("""
+                await db.execute("""
                     INSERT INTO class_student (class_sn, stu_sn)
                     SELECT %(class_sn)s, unnest(%(sns)s)
                     ON CONFLICT DO NOTHING
@@ -201,10 +194,16 @@ async def update_class_students(
                     {"class_sn": class_sn, "sns": to_add}
                 )
 
+            await touch_classes(db, [class_sn])
+
             # 6. 获取最新列表
             students = await get_current_students(db, class_sn)
             
-            db.execute("COMMIT")
+            await db.execute("COMMIT")
+            if to_remove:
+                # 移除关联时同时删除了成绩记录
+                await totals.invalidate("class_grade")
+            await invalidate_tags(f"roster:{class_sn}")
             
             return {
                 "total_count": len(students),
@@ -215,30 +214,31 @@ async def update_class_students(
             }
         
         except Exception as e:
-            db.execute("ROLLBACK")
+            await db.execute("ROLLBACK")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"数据库关联失败: {str(e)}"
             )
 
-@router.get("/api/class/{class_sn}/students-with-grades", summary="获取班次学生及成绩")
+@router.get("/api/class/{class_sn}/students-with-grades", summary="获取班次学生及成绩",
+            dependencies=[Depends(require_jiaomi_user)])
 async def get_class_students_with_grades(
     class_sn: int,
+    version: str = Depends(class_etag),
     current_user: User = Depends(get_current_active_user)
 ):
-    """获取班次学生列表及已有成绩"""
-    validate_jiaomi_role(current_user.user_name)
-    with dblock() as db:
-        db.execute("""
-            SELECT 
-                s.sn AS stu_sn,
-                s.no AS stu_no,
-                s.name AS stu_name,
-                g.grade
-            FROM student AS s
-            JOIN class_student AS cs ON s.sn = cs.stu_sn
-            LEFT JOIN class_grade AS g ON g.stu_sn = s.sn AND g.class_sn = cs.class_sn
-            WHERE cs.class_sn = %(class_sn)s
-            ORDER BY s.no
-        """, {"class_sn": class_sn})
-        return [asdict(row) for row in db]
\ No newline at end of file
+    """获取班次学生列表及已有成绩
+
+    未变化时由 class_etag 直接返回 304。
+    """
+    return await load_students_with_grades(class_sn=class_sn, version=version)
+
+
+# 角色校验与 ETag 校验在路由依赖中进行，缓存只包住查询部分。
+# version（即 ETag）是缓存键的一部分：数据在读取版本之后查询，
+# 缓存内容不会比其 ETag 旧，也不依赖标签失效的时机或所在 worker
+@cached("roster:{class_sn}", "student")
+async def load_students_with_grades(class_sn: int, version: str):
+    async with dblock() as db:
+        await execute(db, "roster.with_grades", {"class_sn": class_sn})
+        return [row_to_dict(row) async for row in db]
\ No newline at end of file
@@ -0,0 +1,166 @@
+"""热点语句目录
+
+语句按名称登记，处理函数通过 execute(db, 名称, 参数) 调用。
+每条语句在每个连接上只解析/规划一次（服务端预备语句），
+登记了预热参数的只读语句在连接加入连接池时即完成预备。
+
+psycopg 以 (SQL 文本, 参数类型) 识别预备语句，因此登记的 SQL 必须是固定文本，
+可变部分（如批量数据）应通过数组参数传入；整数参数统一按 int4 传递（见 typed_params）。
+"""
+import logging
+from dataclasses import dataclass
+
+from psycopg.types.numeric import Int4
+
+_log = logging.getLogger("statements")
+
+
+@dataclass(frozen=True, slots=True)
+class Statement:
+    name: str
+    sql: str
+    # 预热参数：None 表示不预热（写语句只在首次使用时预备）
+    warmup: dict | None = None
+
+
+STATEMENTS: dict[str, Statement] = {}
+
+
+def statement(name: str, sql: str, warmup: dict | None = None) -> str:
+    """登记一条语句，返回名称；名称重复时报错"""
+    if name in STATEMENTS:
+        raise ValueError(f"语句重复登记: {name}")
+    STATEMENTS[name] = Statement(name, sql, warmup)
+    return name
+
+
+def typed_params(params):
+    """整数参数固定为 int4
+
+    psycopg 按数值大小选择 int2/int4/int8，同一语句传入 30000 与 40000 时参数类型不同，
+    会被当作两条预备语句（预热的那条用不上）。各 sn 列均为 INTEGER，统一按 int4 传递。
+    """
+    if not isinstance(params, dict):
+        return params
+    return {
+        key: Int4(value) if type(value) is int else value
+        for key, value in params.items()
+    }
+
+
+async def execute(db, name: str, params=None):
+    """按名称执行已登记的语句（始终使用预备语句）"""
+    return await db.execute(STATEMENTS[name].sql, typed_params(params), prepare=True)
+
+
+async def warm_up(conn):
+    """连接池 configure 回调：在新连接上预备所有可预热的语句"""
+    count = 0
+    async with conn.cursor() as cur:
+        for stmt in STATEMENTS.values():
+            if stmt.warmup is not None:
+                await cur.execute(stmt.sql, typed_params(stmt.warmup), prepare=True)
+                count += 1
+    # 连接归还连接池前必须处于空闲状态
+    await conn.rollback()
+    _log.debug("prepared %d statements", count)
+
+
+# ---- 语句目录 ----
+# 预热参数只决定参数类型，取值不影响预备结果。class.sn 从 30000 开始。
+SAMPLE_CLASS_SN = 30000
+
+# 登录与令牌校验
+statement("user.by_name", """
+    SELECT user_sn, username
+    FROM sys_users
+    WHERE username = %(username)s
+""", warmup={"username": ""})
+
+statement("user.credentials", """
+    SELECT u.user_sn, u.username, p.hashed_password
+    FROM sys_users u
+    JOIN user_passwords p ON u.user_sn = p.user_sn
+    WHERE u.username = %(username)s
+""", warmup={"username": ""})
+
+# 班次版本：ETag 校验与成绩冲突检测，每次班次相关请求都会执行
+statement("class.version", """
+    SELECT updated_at FROM class WHERE sn = %(class_sn)s
+""", warmup={"class_sn": SAMPLE_CLASS_SN})
+
+# 班次名单
+statement("roster.students", """
+    SELECT s.sn AS stu_sn,
+           s.no AS stu_no,
+           s.name AS stu_name,
+           s.gender, s.enrollment_date
+    FROM student AS s
+    JOIN class_student AS cs ON s.sn = cs.stu_sn
+    WHERE cs.class_sn = %(class_sn)s
+    ORDER BY s.no
+""", warmup={"class_sn": SAMPLE_CLASS_SN})
+
+statement("roster.with_grades", """
+    SELECT
+        s.sn AS stu_sn,
+        s.no AS stu_no,
+        s.name AS stu_name,
+        g.grade
+    FROM student AS s
+    JOIN class_student AS cs ON s.sn = cs.stu_sn
+    LEFT JOIN class_grade AS g ON g.stu_sn = s.sn AND g.class_sn = cs.class_sn
+    WHERE cs.class_sn = %(class_sn)s
+    ORDER BY s.no
+""", warmup={"class_sn": SAMPLE_CLASS_SN})
+
+# 以下为写语句，不预热，首次执行时预备
+
+# 成绩录入前按固定顺序锁定涉及的班次
+statement("class.lock", """
+    SELECT updated_at FROM class
+    WHERE sn = ANY(%(class_sns)s::int[])
+    ORDER BY sn FOR UPDATE
+""")
+
+statement("class.touch", """
+    UPDATE class SET updated_at = NOW()
+    WHERE sn = ANY(%(class_sns)s::int[])
+    RETURNING sn, updated_at
+""")
+
+statement("class.touch_by_student", """
+    UPDATE class SET updated_at = NOW()
+    WHERE sn IN (SELECT class_sn FROM class_student WHERE stu_sn = %(stu_sn)s)
+""")
+
+# 批量 upsert：参数为三个等长数组，语句文本与批量大小无关。
+# 旧成绩在同一条语句中取出并写入审计日志（CTE 共享语句开始时的快照）
+statement("grade.batch_upsert", """
+    WITH input AS (
+        SELECT *
+        FROM unnest(%(stu_sns)s::int[], %(class_sns)s::int[], %(grades)s::numeric[])
+            AS t(stu_sn, class_sn, grade)
+    ),
+    old AS (
+        SELECT g.stu_sn, g.class_sn, g.grade
+        FROM class_grade AS g
+        JOIN input AS i USING (stu_sn, class_sn)
+    ),
+    upserted AS (
+        INSERT INTO class_grade (stu_sn, class_sn, grade)
+        SELECT stu_sn, class_sn, grade FROM input
+        ON CONFLICT (stu_sn, class_sn)
+        DO UPDATE SET grade = EXCLUDED.grade, updated_at = NOW()
+        RETURNING stu_sn, class_sn, grade
+    ),
+    audit AS (
+        INSERT INTO grade_audit_log
+        (class_sn, stu_sn, old_grade, new_grade, operator)
+        SELECT u.class_sn, u.stu_sn, o.grade, u.grade, %(operator)s
+        FROM upserted AS u
+        LEFT JOIN old AS o USING (stu_sn, class_sn)
+        WHERE o.grade IS DISTINCT FROM u.grade
+    )
+    SELECT COUNT(*) AS updated FROM upserted
+""")
@@ -0,0 +1,183 @@
+import json
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.encoders import jsonable_encoder
+from fastapi_cache import FastAPICache
+
+from .config import dblock
+from .cache import NS_REPORT, cache_key
+from .auth import get_current_active_user, User
+
+router = APIRouter(tags=["成绩统计"])
+
+# 统计结果缓存有效期（秒）；键中包含班次版本，数据变化后不会命中旧结果
+STATS_CACHE_TTL = 3600
+# 直方图分段边界：[0,60) [60,70) [70,80) [80,90) [90,100]
+HISTOGRAM_EDGES = (60, 70, 80, 90)
+PASS_GRADE = 60
+
+
+def histogram_sql(column: str) -> str:
+    bounds = (None, *HISTOGRAM_EDGES, None)
+    buckets = []
+    for low, high in zip(bounds, bounds[1:]):
+        conditions = [f"{column} >= {low}" if low is not None else f"{column} IS NOT NULL"]
+        if high is not None:
+            conditions.append(f"{column} < {high}")
+        buckets.append(f"COUNT(*) FILTER (WHERE {' AND '.join(conditions)})")
+    return f"ARRAY[{', '.join(buckets)}]"
+
+
+def histogram_labels() -> list[str]:
+    bounds = (0, *HISTOGRAM_EDGES, 101)
+    return [f"{low}-{high - 1}" for low, high in zip(bounds, bounds[1:])]
+
+
+# 统计项全部在数据库中聚合，不在 Python 中逐行计算
+STATS_COLUMNS = f"""
+    COUNT(*) AS student_count,
+    COUNT(g.grade) AS graded_count,
+    ROUND(AVG(g.grade), 2) AS mean,
+    ROUND(PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY g.grade)::NUMERIC, 2) AS median,
+    ROUND(STDDEV_POP(g.grade), 2) AS stddev,
+    MIN(g.grade) AS min_grade,
+    MAX(g.grade) AS max_grade,
+    ROUND(COUNT(*) FILTER (WHERE g.grade >= {PASS_GRADE})::NUMERIC
+          / NULLIF(COUNT(g.grade), 0), 4) AS pass_rate,
+    {histogram_sql("g.grade")} AS histogram
+"""
+
+# 以选课记录为基础，未录入成绩的学生计入 student_count
+STATS_FROM = """
+    FROM class cl
+    JOIN class_student cs ON cs.class_sn = cl.sn
+    LEFT JOIN class_grade g ON g.stu_sn = cs.stu_sn AND g.class_sn = cs.class_sn
+"""
+
+# 汇总行与分班次行由一次 GROUPING SETS 查询得到
+GROUPED_STATS_SQL = f"""
+    SELECT cl.sn AS class_sn, MIN(cl.class_no) AS class_no, {STATS_COLUMNS}
+    {STATS_FROM}
+    WHERE {{where}}
+    GROUP BY GROUPING SETS ((cl.sn), ())
+    ORDER BY GROUPING(cl.sn), MIN(cl.class_no)
+"""
+
+
+def stats_dict(row) -> dict:
+    return {
+        "student_count": row.student_count,
+        "graded_count": row.graded_count,
+        "mean": row.mean,
+        "median": row.median,
+        "stddev": row.stddev,
+        "min": row.min_grade,
+        "max": row.max_grade,
+        "pass_rate": row.pass_rate,
+        "histogram": dict(zip(histogram_labels(), row.histogram)),
+    }
+
+
+def stats_dict_empty() -> dict:
+    """班次没有学生时的统计结果"""
+    return {
+        "student_count": 0,
+        "graded_count": 0,
+        "mean": None,
+        "median": None,
+        "stddev": None,
+        "min": None,
+        "max": None,
+        "pass_rate": None,
+        "histogram": dict.fromkeys(histogram_labels(), 0),
+    }
+
+
+async def scope_version(db, where: str, params: dict) -> str | None:
+    """统计范围内班次的版本，范围内没有班次时返回 None
+
+    取各班次行的 (sn, xmin) 摘要：成绩改动都会在同一事务中更新 class 行，
+    每次提交都会产生新的 xmin。不能用 MAX(updated_at)——NOW() 是事务开始时间，
+    先开始、后提交的事务写入的时间戳可能比已缓存的版本还早。
+    """
+    await db.execute(f"""
+        SELECT COUNT(*) AS class_count,
+               md5(string_agg(cl.sn::text || ':' || cl.xmin::text, ',' ORDER BY cl.sn)) AS digest
+        FROM class cl WHERE {where}
+    """, params)
+    row = await db.fetchone()
+    if not row or not row.class_count:
+        return None
+    return f"{row.class_count}-{row.digest}"
+
+
+async def grouped_stats(where: str, params: dict, scope: str) -> dict | None:
+    """按条件统计：返回汇总及各班次的统计，按班次版本缓存"""
+    async with dblock() as db:
+        version = await scope_version(db, where, params)
+        if version is None:
+            return None
+
+        backend = FastAPICache.get_backend()
+        key = cache_key(NS_REPORT, "stats", scope, version)
+        raw = await backend.get(key)
+        if raw is not None:
+            return json.loads(raw)
+
+        await db.execute(GROUPED_STATS_SQL.format(where=where), params)
+        rows = await db.fetchall()
+
+    total = rows[-1] if rows else None
+    result = jsonable_encoder({
+        "overall": stats_dict(total) if total and total.student_count else None,
+        "classes": [
+            {"class_sn": row.class_sn, "class_no": row.class_no, **stats_dict(row)}
+            for row in rows[:-1]
+        ],
+    })
+    await backend.set(key, json.dumps(result).encode(), expire=STATS_CACHE_TTL)
+    return result
+
+
+@router.get("/api/class/{class_sn}/stats", summary="班次成绩统计")
+async def get_class_stats(
+    class_sn: int,
+    current_user: User = Depends(get_current_active_user)
+):
+    """平均分、中位数、标准差、及格率及分段人数"""
+    result = await grouped_stats("cl.sn = %(class_sn)s", {"class_sn": class_sn}, f"class:{class_sn}")
+    if result is None:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, f"无此班次(sn={class_sn})")
+    return {"class_sn": class_sn, **(result["overall"] or stats_dict_empty())}
+
+
+@router.get("/api/course/{course_sn}/stats", summary="课程成绩统计")
+async def get_course_stats(
+    course_sn: int,
+    semester: str | None = Query(None, description="只统计该学期的班次"),
+    current_user: User = Depends(get_current_active_user)
+):
+    """课程所有班次（或指定学期的班次）合并统计，并附各班次统计"""
+    where = "cl.cou_sn = %(course_sn)s"
+    if semester:
+        where += " AND cl.semester = %(semester)s"
+    result = await grouped_stats(
+        where, {"course_sn": course_sn, "semester": semester},
+        f"course:{course_sn}:{semester or ''}")
+    if result is None:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "该课程没有班次")
+    return {"course_sn": course_sn, "semester": semester, **result}
+
+
+@router.get("/api/semester/{semester}/stats", summary="学期成绩统计")
+async def get_semester_stats(
+    semester: str,
+    current_user: User = Depends(get_current_active_user)
+):
+    """学期内所有班次合并统计，并附各班次统计（一次查询）"""
+    result = await grouped_stats(
+        "cl.semester = %(semester)s", {"semester": semester}, f"semester:{semester}")
+    if result is None:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "该学期没有班次")
+    return {"semester": semester, **result}
+
@@ -1,33 +1,26 @@
 import asyncio  # noqa: F401
-from dataclasses import asdict
+from .rows import row_to_dict
 from fastapi import status, Query, Depends
 import datetime as dt
 from fastapi import HTTPException, APIRouter
-from fastapi.responses import StreamingResponse
-import io
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-import xlsxwriter
-from reportlab.pdfgen import canvas
 from .auth import get_current_active_user, User
 from .course_class import validate_jiaomi_role
 from urllib.parse import quote_plus
 
 from pydantic import BaseModel, field_validator
+from psycopg_pool import PoolTimeout
 from .config import app, dblock
 from .error import ConflictError, InvalidError
+from .paging import decode_cursor, next_cursor
+from .totals import totals
+from .cache import cached, invalidate_tags
+from .etag import touch_student_classes
+from .reports import RENDERERS, report_renderer, stream_reports_zip
 
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.platypus import Table, TableStyle, Paragraph
-from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-
-try:
-    pdfmetrics.registerFont(TTFont('SimSun', '../fonts/simsun.ttc'))  # 需要字体文件
-except:
-    pdfmetrics.registerFont(TTFont('SimSun', '../fonts/simsun.ttf'))  # 尝试不同格式
 
 router = APIRouter(tags=["学生管理"])
 
@@ -52,33 +45,44 @@ class Student(BaseModel):
 
 
 @router.get("/api/student/list")
+@cached("student")
 async def get_student_list(
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
+    after: str | None = Query(None, description="分页游标（上一页返回的 next），优先于 page"),
+    approx_total: bool = Query(False, description="接受规划器估算的总数，不执行 COUNT(*)"),
     current_user: User = Depends(get_current_active_user)
 ) -> dict:
+    after_key = decode_cursor(after, int) if after else None
     try:
-        with dblock() as db:
-            # 计算偏移量
-            offset = (page - 1) * page_size
-
-            # 查询总记录数
-            db.execute("SELECT COUNT(*) AS total FROM student")
-            total_row = db.fetchone()
-            total = total_row.total if total_row and hasattr(total_row, "total") else 0
+        async with dblock() as db:
+            # 查询总记录数（缓存或估算）
+            total, estimated = await totals.total(
+                db, "student", "FROM student",
+                tables=("student",), approx=approx_total)
+
+            # 游标模式按主键定位，不再用 OFFSET 跳过前面的所有行
+            if after_key:
+                where, paging = "WHERE sn > %(after_sn)s", ""
+                params = {"page_size": page_size, "after_sn": after_key[0]}
+            else:
+                where, paging = "", "OFFSET %(offset)s"
+                params = {"page_size": page_size, "offset": (page - 1) * page_size}
 
             # 查询当前页数据
-            db.execute("""
+            await db.execute(f"""
                     SELECT sn AS stu_sn, 
                         no AS stu_no, 
                         name AS stu_name, 
                         gender, 
                         enrollment_date 
                     FROM student
-                    LIMIT %(page_size)s OFFSET %(offset)s
+                    {where}
+                    ORDER BY sn
+                    LIMIT %(page_size)s {paging}
                     """, 
-                    {"page_size": page_size, "offset": offset})
-            result = db.fetchall()
+                    params)
+            result = await db.fetchall()
 
             students = [
                 {
@@ -93,26 +97,107 @@ async def get_student_list(
 
             return {
                 "data": students,
-                "total": total
+                "total": total,
+                "total_estimated": estimated,
+                "next": next_cursor(result, page_size, "stu_sn")
             }
+    except PoolTimeout:
+        # 等待连接超时由 error.pool_timeout_handler 返回 503
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def like_escape(text: str) -> str:
+    """转义 LIKE 模式中的特殊字符"""
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+@router.get("/api/student/search", summary="按学号前缀或姓名搜索学生")
+async def search_students(
+    q: str = Query(..., min_length=1, max_length=20, description="学号前缀或姓名（支持模糊匹配）"),
+    exclude_class_sn: int | None = Query(None, description="排除已关联该班次的学生"),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: User = Depends(get_current_active_user)
+):
+    """全数字按学号前缀匹配（idx_student_no_prefix），否则按姓名模糊匹配（idx_student_name_trgm）
+
+    结果按匹配程度排序：完全匹配、前缀匹配、包含，再按相似度。
+    """
+    q = q.strip()
+    params = {
+        "q": q,
+        "prefix": like_escape(q) + "%",
+        "contains": "%" + like_escape(q) + "%",
+        "exclude_class_sn": exclude_class_sn,
+        "limit": limit,
+    }
+    if q.isdigit():
+        match = "s.no LIKE %(prefix)s"
+        rank = "CASE WHEN s.no = %(q)s THEN 0 ELSE 1 END, s.no"
+    else:
+        # %% 为 pg_trgm 的相似度运算符（转义后的 %）
+        match = "(s.name ILIKE %(contains)s OR s.name %% %(q)s)"
+        rank = """CASE WHEN s.name = %(q)s THEN 0
+                       WHEN s.name ILIKE %(prefix)s THEN 1
+                       WHEN s.name ILIKE %(contains)s THEN 2
+                       ELSE 3 END,
+                  similarity(s.name, %(q)s) DESC, s.no"""
+    exclude = """
+        AND NOT EXISTS (
+            SELECT 1 FROM class_student cs
+            WHERE cs.class_sn = %(exclude_class_sn)s AND cs.stu_sn = s.sn
+        )""" if exclude_class_sn else ""
+
+    async with dblock() as db:
+        await db.execute(f"""
+            SELECT s.sn AS stu_sn, s.no AS stu_no, s.name AS stu_name,
+                   s.gender, s.enrollment_date
+            FROM student s
+            WHERE {match} {exclude}
+            ORDER BY {rank}
+            LIMIT %(limit)s
+            """, params)
+        return [row_to_dict(row) async for row in db]
+
+
+@router.get("/api/student/ranking", summary="学生加权平均分排名")
+async def get_student_ranking(
+    semester: str | None = Query(None, description="按学期排名，不指定时为全部学期"),
+    limit: int = Query(50, ge=1, le=500),
+    current_user: User = Depends(get_current_active_user)
+):
+    """直接读取汇总表，按加权平均分排序（索引扫描，不再聚合成绩）"""
+    summary_table = "student_semester_summary" if semester else "student_grade_summary"
+    async with dblock() as db:
+        await db.execute(f"""
+            SELECT RANK() OVER (ORDER BY gs.gpa DESC) AS rank,
+                   s.sn AS stu_sn, s.no AS stu_no, s.name AS stu_name,
+                   gs.gpa, gs.total_credits, gs.passed_count, gs.failed_count
+            FROM {summary_table} gs
+            JOIN student s ON s.sn = gs.stu_sn
+            WHERE gs.total_credits > 0 {"AND gs.semester = %(semester)s" if semester else ""}
+            ORDER BY gs.gpa DESC, gs.stu_sn
+            LIMIT %(limit)s
+            """, {"semester": semester, "limit": limit})
+        return [row_to_dict(row) async for row in db]
+
+
 @router.get("/api/student/{stu_sn}")
+@cached("student:{stu_sn}")
 async def get_student_profile(
     stu_sn,
     current_user: User = Depends(get_current_active_user)
 ) -> Student:
-    with dblock() as db:
-        db.execute(
+    async with dblock() as db:
+        await db.execute(
             """
             SELECT sn AS stu_sn, no AS stu_no, name AS stu_name, gender, enrollment_date 
             FROM student WHERE sn=%(stu_sn)s
             """,
             dict(stu_sn=stu_sn),
         )
-        row = db.fetchone()
+        row = await db.fetchone()
 
     if row is None:
         raise HTTPException(
@@ -129,15 +214,15 @@ async def new_student(
 ) -> Student:
     stu_no = student.stu_no
 
-    with dblock() as db:
-        db.execute(
+    async with dblock() as db:
+        await db.execute(
             """
             SELECT sn AS stu_sn, name AS stu_name FROM student
             WHERE no=%(stu_no)s
             """,
             dict(stu_no=stu_no),
         )
-        record = db.fetchone()
+        record = await db.fetchone()
         if record:
             raise ConflictError(
                 f"学号'{stu_no}'已被{record.stu_name}(#{record.stu_sn}占用"
@@ -148,16 +233,18 @@ async def new_student(
         # 1. 避免竞态条件：如果另起事务，其他连接可能在检查后插入相同学号
         # 2. 保证原子性：整个操作要么全部成功要么全部失败
         # 3. 共享事务隔离级别：确保看到一致的数据视图
-        db.execute(
+        await db.execute(
             """
             INSERT INTO student (no, name, gender, enrollment_date)
             VALUES(%(stu_no)s, %(stu_name)s, %(gender)s, %(enrollment_date)s) 
             RETURNING sn""",
             student.model_dump(),
         )
-        row = db.fetchone()
+        row = await db.fetchone()
         student.stu_sn = row.sn  # type: ignore
 
+    await totals.invalidate("student")
+    await invalidate_tags("student")
     return student
 
 
@@ -173,8 +260,8 @@ async def update_student(
 
     stu_no = student.stu_no
 
-    with dblock() as db:
-        db.execute(
+    async with dblock() as db:
+        await db.execute(
             """
             UPDATE student SET
                 no=%(stu_no)s, name=%(stu_name)s, 
@@ -183,20 +270,25 @@ async def update_student(
             """,
             student.model_dump(),
         )
+        # 所在班次的名单随之变化
+        await touch_student_classes(db, stu_sn)
+
+    # "student" 标签同时覆盖学生列表和各班次名单
+    await invalidate_tags("student", f"student:{stu_sn}")
 
 @router.get("/api/student/{stu_sn}/has-grades", summary="检查学生是否有成绩记录")
 async def student_has_grades(
     stu_sn: int,
     current_user: User = Depends(get_current_active_user)
 ):
-    with dblock() as db:
-        db.execute("""
+    async with dblock() as db:
+        await db.execute("""
             SELECT 1 AS has_grade
             FROM class_grade
             WHERE stu_sn = %(stu_sn)s
             LIMIT 1
         """, {"stu_sn": stu_sn})
-        grade_record = db.fetchone()
+        grade_record = await db.fetchone()
         return {"has_grades": bool(grade_record)}
 
 
@@ -205,9 +297,95 @@ async def delete_student(
     stu_sn,
     current_user: User = Depends(get_current_active_user)
 ):
-    with dblock() as db:
+    async with dblock() as db:
+        # 选课记录会级联删除，先更新所在班次的版本
+        await touch_student_classes(db, stu_sn)
         # 执行删除操作
-        db.execute("DELETE FROM student WHERE sn=%(stu_sn)s", {"stu_sn": stu_sn})
+        await db.execute("DELETE FROM student WHERE sn=%(stu_sn)s", {"stu_sn": stu_sn})
+
+    # 成绩记录随学生级联删除
+    await totals.invalidate("student", "class_grade")
+    await invalidate_tags("student", f"student:{stu_sn}")
+
+
+# 报表使用的学生字段，统计数据直接取自汇总表（由触发器维护）
+REPORT_STUDENT_SQL = """
+    SELECT s.sn AS stu_sn, s.no AS stu_no, s.name AS stu_name,
+        s.gender, s.enrollment_date,
+        COALESCE(gs.total_credits, 0) AS total_credits,
+        COALESCE(gs.gpa, 0) AS gpa,
+        COALESCE(gs.failed_count, 0) AS failed_count
+    FROM student s
+    LEFT JOIN student_grade_summary gs ON gs.stu_sn = s.sn
+"""
+# 批量导出时每批读取成绩的学生数
+BULK_REPORT_BATCH = 200
+
+
+async def fetch_report_grades(db, stu_sns: list[int]) -> dict[int, list]:
+    """一次查询一批学生的成绩（基于已有视图），按学生分组"""
+    await db.execute("""
+        SELECT g.stu_sn,
+               c.name as course_name, 
+               cl.class_no, cl.semester, 
+               g.grade, c.credit
+        FROM student_grade_report g
+        JOIN class cl ON g.class_sn = cl.sn
+        JOIN course c ON cl.cou_sn = c.sn
+        WHERE g.stu_sn = ANY(%(stu_sns)s)
+        ORDER BY g.stu_sn
+        """,
+        {"stu_sns": stu_sns})
+    grades = {}
+    async for row in db:
+        grades.setdefault(row.stu_sn, []).append(row)
+    return grades
+
+
+def build_student_report(student, grades) -> dict:
+    """学生信息（含汇总统计）+ 成绩行 -> 报表所需的普通数据（可直接交给渲染进程）"""
+    return {
+        "student": {
+            "stu_sn": student.stu_sn,
+            "stu_no": student.stu_no,
+            "stu_name": student.stu_name,
+            "gender": student.gender,
+            "enrollment_date": student.enrollment_date,
+        },
+        "grades": [{
+            "course_name": g.course_name,
+            "class_no": g.class_no,
+            "semester": g.semester,
+            "grade": g.grade,
+            "credit": g.credit,
+            "passed": "是" if (g.grade or 0) >= 60 else "否"
+        } for g in grades],
+        "stats": {
+            "total_credits": student.total_credits,
+            "gpa": student.gpa,
+            "failed_count": student.failed_count
+        }
+    }
+
+
+async def load_student_report(db, stu_sn: int) -> dict | None:
+    """一次读取学生信息和成绩，学生不存在时返回 None"""
+    await db.execute(REPORT_STUDENT_SQL + "WHERE s.sn=%(stu_sn)s", {"stu_sn": stu_sn})
+    student = await db.fetchone()
+    if not student:
+        return None
+    grades = await fetch_report_grades(db, [stu_sn])
+    return build_student_report(student, grades.get(stu_sn, []))
+
+
+async def iter_student_reports(students):
+    """按批读取成绩并逐个产出报表数据，每批一次查询、只占用一次连接"""
+    for start in range(0, len(students), BULK_REPORT_BATCH):
+        batch = students[start:start + BULK_REPORT_BATCH]
+        async with dblock() as db:
+            grades = await fetch_report_grades(db, [s.stu_sn for s in batch])
+        for student in batch:
+            yield build_student_report(student, grades.get(student.stu_sn, []))
 
 
 @router.get("/api/student/{stu_sn}/report", summary="生成学生报表")
@@ -215,51 +393,56 @@ async def generate_student_report(
     stu_sn: int,
     current_user: User = Depends(get_current_active_user)
 ):
-    
-    with dblock() as db:
-        # 获取学生基本信息（复用已有查询逻辑）
-        db.execute("""
-            SELECT sn AS stu_sn, no AS stu_no, name AS stu_name 
-            FROM student WHERE sn=%(stu_sn)s
-            """, {"stu_sn": stu_sn})
-        student = db.fetchone()
-        if not student:
-            raise HTTPException(status_code=404, detail="学生不存在")
-        
-        # 获取成绩数据（基于已有视图）
-        db.execute("""
-            SELECT c.name as course_name, 
-                   cl.class_no, cl.semester, 
-                   g.grade, c.credit
-            FROM student_grade_report g
-            JOIN class cl ON g.class_sn = cl.sn
-            JOIN course c ON cl.cou_sn = c.sn
-            WHERE g.stu_sn = %(stu_sn)s
-            """,
-            {"stu_sn": stu_sn})
-        grades = db.fetchall()
-
-        # 计算统计信息
-        passed_courses = [g for g in grades if g.grade and g.grade >= 60]
-        failed_courses = [g for g in grades if g.grade and g.grade < 60]
-        total_credits = sum(g.credit for g in passed_courses)
-        
-        # 计算加权平均分
-        weighted_sum = sum(g.grade * g.credit for g in passed_courses if g.grade)
-        gpa = weighted_sum / total_credits if total_credits else 0
-        
-    return {
-        "student": asdict(student),
-        "grades": [{
-            **asdict(g),
-            "passed": "是" if (g.grade or 0) >= 60 else "否"
-        } for g in grades],
-        "stats": {
-            "total_credits": total_credits,
-            "gpa": round(gpa, 2),
-            "failed_count": len(failed_courses)
+    async with dblock() as db:
+        report = await load_student_report(db, stu_sn)
+    if report is None:
+        raise HTTPException(status_code=404, detail="学生不存在")
+    return report
+
+@router.get("/api/student/reports/export", summary="批量导出学生报表（ZIP）")
+async def export_reports_bulk(
+    class_sn: int | None = Query(None, description="按班次导出"),
+    cohort: int | None = Query(None, description="按入学年份导出"),
+    format: str = 'pdf',
+    current_user: User = Depends(get_current_active_user)
+):
+    """每个学生一个文件，多进程并行渲染，完成一个就写入 ZIP 流发送一个"""
+    if format not in RENDERERS:
+        raise HTTPException(status_code=400, detail="不支持的导出格式")
+    if (class_sn is None) == (cohort is None):
+        raise HTTPException(status_code=400, detail="请指定班次或入学年份（二选一）")
+    if format == 'pdf' and 'SimSun' not in pdfmetrics.getRegisteredFontNames():
+        raise HTTPException(status_code=500, detail="请安装SimSun字体")
+
+    async with dblock() as db:
+        if class_sn is not None:
+            await db.execute(REPORT_STUDENT_SQL + """
+                WHERE s.sn IN (SELECT stu_sn FROM class_student WHERE class_sn = %(class_sn)s)
+                ORDER BY s.no
+                """, {"class_sn": class_sn})
+            label = f"班次{class_sn}"
+        else:
+            await db.execute(REPORT_STUDENT_SQL + """
+                WHERE s.enrollment_date >= make_date(%(cohort)s, 1, 1)
+                  AND s.enrollment_date < make_date(%(cohort)s + 1, 1, 1)
+                ORDER BY s.no
+                """, {"cohort": cohort})
+            label = f"{cohort}级"
+        students = await db.fetchall()
+
+    if not students:
+        raise HTTPException(status_code=404, detail="没有符合条件的学生")
+
+    filename = f"学生成绩_{label}_{dt.date.today().strftime('%Y%m%d')}.zip"
+    return StreamingResponse(
+        stream_reports_zip(format, iter_student_reports(students)),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": 
+            f"attachment; filename*=UTF-8''{quote_plus(filename, encoding='utf-8')}"
         }
-    }
+    )
+
 
 @router.get("/api/student/{stu_sn}/report/export", summary="导出学生报表")
 async def export_report(
@@ -267,214 +450,30 @@ async def export_report(
     format: str = 'xlsx',
     current_user: User = Depends(get_current_active_user)
 ):
-    if format not in ('xlsx', 'pdf'):
+    if format not in RENDERERS:
         raise HTTPException(status_code=400, detail="不支持的导出格式")
 
-    with dblock() as db:  # 将整个操作放在同一个数据库连接中
-        # 获取学生信息和报表数据
-        db.execute("""
-            SELECT no AS stu_no, name AS stu_name, 
-                gender, enrollment_date
-            FROM student 
-            WHERE sn=%(stu_sn)s
-        """, {"stu_sn": stu_sn})
-        student = db.fetchone()
-        if not student:
-            raise HTTPException(status_code=404, detail="学生不存在")
-
-        # 获取成绩数据
-        db.execute("""
-            SELECT c.name as course_name, 
-                   cl.class_no, cl.semester, 
-                   g.grade, c.credit
-            FROM student_grade_report g
-            JOIN class cl ON g.class_sn = cl.sn
-            JOIN course c ON cl.cou_sn = c.sn
-            WHERE g.stu_sn = %(stu_sn)s
-            """, {"stu_sn": stu_sn})
-        grades = db.fetchall()
-
-    report_data = await generate_student_report(stu_sn, current_user)
-    
-    # Excel导出实现
-    if format == 'xlsx':
-        output = io.BytesIO()
-        with xlsxwriter.Workbook(output) as workbook:
-            worksheet = workbook.add_worksheet()
-            
-            # 定义格式样式
-            header_format = workbook.add_format({
-                'bold': True, 
-                'bg_color': '#D3D3D3',
-                'border': 1,
-                'align': 'center'
-            })
-            info_format = workbook.add_format({
-                'bold': True,
-                'bg_color': '#E8F4FF',
-                'border': 1,
-                'align': 'center'
-            })
-            stats_format = workbook.add_format({
-                'bold': True,
-                'bg_color': '#FFF2E0',
-                'border': 1,
-                'align': 'center'
-            })
-            
-            # 学生基本信息
-            worksheet.merge_range(0, 0, 0, 2, '学生基本信息', info_format)
-            worksheet.write_row(1, 0, [
-                f"学号：{student.stu_no}",
-                f"姓名：{student.stu_name}",
-                f"性别：{'男' if student.gender == 'M' else '女'}",
-            ], info_format)
-
-            # 课程表头
-            header_row = 2
-            worksheet.write_row(header_row, 0, [
-                '课程名称', '班次号', '学期', '成绩', '学分', '是否通过'
-            ], header_format)
-
-            # 动态计算列宽
-            col_widths = [10]*6  # 初始最小宽度
-            max_data_row = header_row
-            
-            # 写入课程数据
-            for row_idx, item in enumerate(report_data['grades'], start=header_row+1):
-                # 更新列宽
-                col_widths[0] = max(col_widths[0], len(item['course_name'])*2.3) # type: ignore
-                col_widths[1] = max(col_widths[1], len(str(item['class_no']))*1.5) # type: ignore
-                col_widths[2] = max(col_widths[2], len(item['semester'])*1.5) # type: ignore
-                col_widths[3] = max(col_widths[3], len(str(item['grade'] or '未录入')))
-                col_widths[4] = max(col_widths[4], len(str(item['credit'])))
-                col_widths[5] = max(col_widths[5], len(item['passed']))
-                
-                # 写入数据
-                worksheet.write(row_idx, 0, item['course_name'])
-                worksheet.write(row_idx, 1, item['class_no'])
-                worksheet.write(row_idx, 2, item['semester'])
-                worksheet.write(row_idx, 3, item['grade'] or '未录入')
-                worksheet.write(row_idx, 4, item['credit'])
-                worksheet.write(row_idx, 5, item['passed'])
-                max_data_row = row_idx
-
-            # 设置动态列宽（限制最大40）
-            for col, width in enumerate(col_widths):
-                worksheet.set_column(col, col, min(width, 40))
-
-            # 统计摘要
-            stats_row = max_data_row + 2
-            worksheet.merge_range(stats_row, 0, stats_row, 2, "成绩统计", stats_format)
-            worksheet.write_row(stats_row+1, 0, [
-                f"总学分：{report_data['stats']['total_credits']}",
-                f"加权平均分：{report_data['stats']['gpa']}",
-                f"不及格门数：{report_data['stats']['failed_count']}",
-            ], stats_format)
-
-        filename = f"学生成绩_{student.stu_no}_{dt.date.today().strftime('%Y%m%d')}.xlsx"
-        encoded_filename = quote_plus(filename, encoding='utf-8')
-        # 调整列宽
-        for i in range(6):  # 6列数据
-            worksheet.set_column(i, i, 15)  # 宽度设为15个字符
-        
-        return StreamingResponse(
-            io.BytesIO(output.getvalue()),
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={
-                "Content-Disposition": 
-                f"attachment; filename*=UTF-8''{encoded_filename}"
-            }
-        )
-    
-    # PDF导出实现
-    if format == 'pdf':
-        # 确保字体已注册
-        if 'SimSun' not in pdfmetrics.getRegisteredFontNames():
-            raise HTTPException(status_code=500, detail="请安装SimSun字体")
-
-        output = io.BytesIO()
-        c = canvas.Canvas(output, pagesize=A4)
-        width, height = A4
-
-        # 报表标题和导出时间
-        y_position = height - 40  # 初始Y坐标
-        c.setFont('SimSun', 16)
-        c.drawCentredString(width/2, y_position, "学生成绩报表")
-        c.setFont('SimSun', 10)
-        c.drawRightString(width-50, y_position, f"导出时间：{dt.datetime.now().strftime('%Y-%m-%d %H:%M')}")
-
-
-        # 学生基本信息
-        y_position -= 60 
-        c.setFont('SimSun', 12)
-        c.drawString(50, y_position, f"学号：{student.stu_no}")
-        y_position -= 30
-        c.drawString(50, y_position, f"姓名：{student.stu_name}")
-        y_position -= 30 
-        c.drawString(50, y_position, f"性别：{'男' if student.gender == 'M' else '女'}")
-        
-        
-        # 创建成绩表格
-        data = [
-            ['课程名称', '班次号', '学期', '成绩', '学分', '是否通过']
-        ]
-        for g in report_data['grades']:
-            data.append([
-                g['course_name'],
-                g['class_no'],
-                g['semester'],
-                str(g['grade']) if g['grade'] else '未录入',
-                str(g['credit']),
-                g['passed']
-            ])
-
-        # 自动计算列宽
-        col_widths = [width*0.3, width*0.15, width*0.15, width*0.1, width*0.1, width*0.1]
-        
-        # 创建表格并设置样式
-        table = Table(data, colWidths=col_widths)
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0,0), (-1,0), colors.lightgrey),
-            ('TEXTCOLOR', (0,0), (-1,0), colors.black),
-            ('ALIGN', (0,0), (-1,-1), 'CENTER'),
-            ('FONTNAME', (0,0), (-1,-1), 'SimSun'),  # 修改这里，应用全局字体
-            ('FONTSIZE', (0,0), (-1,0), 10),         # 表头字号
-            ('FONTSIZE', (0,1), (-1,-1), 9),         # 数据行字号
-            ('BOTTOMPADDING', (0,0), (-1,0), 12),
-            ('BACKGROUND', (0,1), (-1,-1), colors.white),
-            ('GRID', (0,0), (-1,-1), 1, colors.black)
-        ]))
-
-        # 绘制表格
-        y_position -= 40  # 基本信息与表格间距
-        table.wrapOn(c, width, height)
-        table.drawOn(c, 30, y_position - table._height)  # type: ignore # 自动计算表格高度
-
-        # 统计信息
-        stats_text = [
-            f"总学分：{report_data['stats']['total_credits']}",
-            f"加权平均分：{report_data['stats']['gpa']}",
-            f"不及格门数：{report_data['stats']['failed_count']}"
-        ]
-        y_position -= (table._height + 60) # type: ignore
-        c.setFont('SimSun', 14)
-        c.drawString(50, y_position, "成绩统计：")
-        y_position -= 30
-        c.setFont('SimSun', 12)
-        for i, text in enumerate(stats_text):
-            c.drawString(100, y_position - i*30, text)
-
-        c.save()
-        
-        filename = f"学生成绩_{student.stu_no}_{dt.date.today().strftime('%Y%m%d')}.pdf"
-        encoded_filename = quote_plus(filename, encoding='utf-8')
-        
-        return StreamingResponse(
-            io.BytesIO(output.getvalue()),
-            media_type="application/pdf",
-            headers={
-                "Content-Disposition": 
-                f"attachment; filename*=UTF-8''{encoded_filename}"
-            }
-        )
+    # PDF 需要中文字体
+    if format == 'pdf' and 'SimSun' not in pdfmetrics.getRegisteredFontNames():
+        raise HTTPException(status_code=500, detail="请安装SimSun字体")
+
+    async with dblock() as db:
+        report = await load_student_report(db, stu_sn)
+    if report is None:
+        raise HTTPException(status_code=404, detail="学生不存在")
+
+    # 渲染在进程池中进行，不占用事件循环
+    content = await report_renderer.render(format, report)
+    _, media_type = RENDERERS[format]
+
+    filename = f"学生成绩_{report['student']['stu_no']}_{dt.date.today().strftime('%Y%m%d')}.{format}"
+    encoded_filename = quote_plus(filename, encoding='utf-8')
+
+    return Response(
+        content,
+        media_type=media_type,
+        headers={
+            "Content-Disposition": 
+            f"attachment; filename*=UTF-8''{encoded_filename}"
+        }
+    )
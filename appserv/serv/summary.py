@@ -0,0 +1,33 @@
+"""成绩汇总表重建
+
+汇总表（student_grade_summary / student_semester_summary）平时由触发器增量维护；
+批量导入时禁用了触发器、或怀疑数据不一致时，在 appserv 目录下运行：
+
+    python -m serv.summary
+"""
+import argparse
+import time
+
+import psycopg
+
+from .config import DB_DSN
+
+
+def rebuild(dsn: str = DB_DSN) -> int:
+    """全量重建汇总表，返回处理的学生数"""
+    with psycopg.connect(dsn) as conn:
+        return conn.execute("SELECT rebuild_grade_summary()").fetchone()[0]  # type: ignore
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dsn", default=DB_DSN)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    count = rebuild(args.dsn)
+    print(f"已重建 {count} 名学生的成绩汇总，用时 {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
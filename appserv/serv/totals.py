@@ -0,0 +1,88 @@
+import time
+
+from .cache import invalidate_tags, tag_versions
+
+
+def table_tag(table: str) -> str:
+    return f"table:{table}"
+
+
+class TotalsCache:
+    """分页总数服务：按过滤条件缓存精确的 COUNT(*)，由写操作按表失效
+
+    - 每个缓存项记录它依赖的表，写接口在提交后调用 await invalidate(表名)
+    - 总数缓存在进程内，但每项同时记录所依赖表的标签版本（与响应缓存共用 cache.tag_versions），
+      版本变化即不再命中：使用共享缓存后端时，任何 worker 的写操作都会让所有 worker 的旧总数失效
+    - 调用方接受近似值时，未命中缓存则返回规划器估算的行数（EXPLAIN），
+      不执行 COUNT(*)
+    """
+
+    def __init__(self, ttl: float = 60, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # 键 -> (总数, 过期时间, 依赖的表, 表的标签版本)；表 -> 依赖它的键，两个方向同时维护
+        self._counts: dict[str, tuple[int, float, tuple[str, ...], list[str]]] = {}
+        self._tables: dict[str, set[str]] = {}
+
+    async def total(self, db, key: str, from_sql: str, params: dict | None = None,
+                    tables: tuple[str, ...] = (), approx: bool = False) -> tuple[int, bool]:
+        """返回 (总数, 是否为估算值)
+
+        from_sql 为 "FROM ... WHERE ..." 部分，与分页查询共用同一组过滤参数；
+        key 必须唯一标识这组过滤条件（含参数值）。
+        """
+        # 版本在 COUNT(*) 之前读取：计数期间有写入时，存入的是旧版本，下次不会命中
+        versions = await tag_versions([table_tag(table) for table in tables])
+        cached = self._counts.get(key)
+        if cached and cached[1] > time.monotonic() and cached[3] == versions:
+            return cached[0], False
+
+        if approx:
+            return await self.estimate(db, from_sql, params), True
+
+        await db.execute(f"SELECT COUNT(*) AS total {from_sql}", params)
+        row = await db.fetchone()
+        count = row.total if row else 0
+        self._store(key, count, tables, versions)
+        return count, False
+
+    async def estimate(self, db, from_sql: str, params: dict | None = None) -> int:
+        """用规划器估算行数（基于 pg_class.reltuples 与统计信息），不扫描数据"""
+        # EXPLAIN 的列名为 "QUERY PLAN"，不能生成 Row 数据类，改用默认的元组游标
+        async with db.connection.cursor() as cur:
+            await cur.execute(f"EXPLAIN (FORMAT JSON) SELECT 1 {from_sql}", params)
+            (plan,) = await cur.fetchone()
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+    async def invalidate(self, *tables: str):
+        """写操作提交后调用：丢弃本进程中依赖这些表的总数，并更新表的共享标签版本"""
+        for table in tables:
+            for key in list(self._tables.get(table, ())):
+                self._drop(key)
+        await invalidate_tags(*(table_tag(table) for table in tables))
+
+    def _drop(self, key: str):
+        """删除缓存项，并从它依赖的每个表的索引中移除"""
+        entry = self._counts.pop(key, None)
+        if entry is None:
+            return
+        for table in entry[2]:
+            keys = self._tables.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tables[table]
+
+    def _store(self, key: str, count: int, tables: tuple[str, ...], versions: list[str]):
+        # 覆盖旧值时先清理旧的依赖关系
+        self._drop(key)
+        if len(self._counts) >= self.max_entries:
+            # 淘汰最早写入的缓存项
+            self._drop(next(iter(self._counts)))
+        self._counts[key] = (count, time.monotonic() + self.ttl, tuple(tables), versions)
+        for table in tables:
+            self._tables.setdefault(table, set()).add(key)
+
+
+# 缓存后端为 memory 时标签版本也在进程内，多个 worker 间仍有最长 ttl 秒的旧总数
+totals = TotalsCache(ttl=60)
@@ -0,0 +1,38 @@
+import tempfile
+
+import xlsxwriter
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+# 向客户端输出时每块的大小
+XLSX_CHUNK_SIZE = 64 * 1024
+
+
+class StreamingWorkbook:
+    """constant_memory 模式的单表 xlsx 写入
+
+    每行写入后立即刷到临时文件，生成的 xlsx 也写入临时文件，
+    内存占用与行数无关；close() 后用 read_chunk() 分块读出。
+    """
+
+    def __init__(self, header):
+        self.output = tempfile.TemporaryFile()
+        self.workbook = xlsxwriter.Workbook(self.output, {"constant_memory": True})
+        self.worksheet = self.workbook.add_worksheet()
+        self.worksheet.write_row(0, 0, header)
+        self.row_no = 1
+
+    def write_rows(self, rows):
+        # constant_memory 模式下必须按行号递增顺序写入
+        for row in rows:
+            self.worksheet.write_row(self.row_no, 0, row)
+            self.row_no += 1
+
+    def close(self):
+        self.workbook.close()
+        self.output.seek(0)
+
+    def read_chunk(self, size: int = XLSX_CHUNK_SIZE) -> bytes:
+        return self.output.read(size)
+
+    def discard(self):
+        self.output.close()
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# 测试在 appserv 目录外运行时也能导入 serv 包
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,58 @@
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("fastapi_cache")
+
+from fastapi_cache import FastAPICache  # noqa: E402
+from fastapi_cache.backends.inmemory import InMemoryBackend  # noqa: E402
+
+from serv.authcache import TokenCache  # noqa: E402
+from serv.cache import CACHE_PREFIX  # noqa: E402
+
+
+class FakeUser:
+    user_sn = 7
+
+
+@pytest.fixture(autouse=True)
+def backend():
+    backend = InMemoryBackend()
+    FastAPICache.init(backend, prefix=CACHE_PREFIX)
+    yield backend
+    FastAPICache.reset()
+
+
+def worker(shared=True):
+    return TokenCache(max_entries=16, ttl=300, shared=shared)
+
+
+def test_l1_hit_honours_revocation_from_other_worker():
+    """两个实例模拟两个 worker：一个修改密码后，另一个的 L1 条目不再命中"""
+    a, b = worker(), worker()
+    user = FakeUser()
+
+    async def scenario():
+        a.put_local("d", user, time.time() + 300)
+        assert await a.get("d") is user
+        await b.invalidate_user(user.user_sn)
+        assert await a.get("d") is None
+        # 撤销之后重新缓存的条目正常命中
+        await asyncio.sleep(0.01)
+        a.put_local("d", user, time.time() + 300)
+        assert await a.get("d") is user
+
+    asyncio.run(scenario())
+
+
+def test_local_only_cache_skips_backend():
+    a = worker(shared=False)
+    user = FakeUser()
+
+    async def scenario():
+        a.put_local("d", user, time.time() + 300)
+        await a.invalidate_user(user.user_sn)
+        assert await a.get("d") is None
+
+    asyncio.run(scenario())
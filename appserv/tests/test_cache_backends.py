@@ -0,0 +1,106 @@
+import asyncio
+import builtins
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("fastapi_cache")
+
+from fastapi_cache.backends.inmemory import InMemoryBackend  # noqa: E402
+
+from serv import cache  # noqa: E402
+from serv.cache import FileBackend, create_backend  # noqa: E402
+
+
+class Clock:
+    """替换 serv.cache 中的 time.time，测试过期时不需要真的等待"""
+
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "time", clock.time)
+    return clock
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_file_backend_roundtrip(tmp_path):
+    backend = FileBackend(str(tmp_path))
+    run(backend.set("cgms:list:a", b"value"))
+    assert run(backend.get("cgms:list:a")) == b"value"
+    assert run(backend.get_with_ttl("cgms:list:a")) == (-1, b"value")
+    assert run(backend.get("cgms:list:missing")) is None
+
+
+def test_file_backend_expiry(tmp_path, clock):
+    backend = FileBackend(str(tmp_path))
+    run(backend.set("cgms:list:a", b"value", expire=10))
+
+    clock.now += 9
+    assert run(backend.get_with_ttl("cgms:list:a")) == (1, b"value")
+
+    clock.now += 1
+    assert run(backend.get("cgms:list:a")) is None
+    # 过期条目在读取时删除
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_file_backend_clear_namespace(tmp_path):
+    backend = FileBackend(str(tmp_path))
+    run(backend.set("cgms:list:a", b"1"))
+    run(backend.set("cgms:list:b", b"2"))
+    run(backend.set("cgms:auth:c", b"3"))
+
+    assert run(backend.clear(namespace="cgms:list")) == 2
+    assert run(backend.get("cgms:auth:c")) == b"3"
+    assert run(backend.clear(key="cgms:auth:c")) == 1
+
+
+def test_create_backend_kinds(tmp_path):
+    assert isinstance(create_backend("memory"), InMemoryBackend)
+    assert isinstance(create_backend("file", directory=str(tmp_path / "c")), FileBackend)
+    with pytest.raises(ValueError):
+        create_backend("memcached")
+
+
+def test_create_backend_falls_back_without_redis(monkeypatch):
+    real_import = builtins.__import__
+
+    def no_redis(name, *args, **kwargs):
+        if name == "redis" or name.startswith("redis."):
+            raise ImportError(name)
+        return real_import(name, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, "__import__", no_redis)
+    assert isinstance(create_backend("redis"), InMemoryBackend)
+
+
+def test_create_backend_falls_back_on_unusable_directory(tmp_path):
+    blocker = tmp_path / "file"
+    blocker.write_text("")
+    # 路径的上级是普通文件，目录无法创建
+    assert isinstance(create_backend("file", directory=str(blocker / "cache")), InMemoryBackend)
+
+
+def test_redis_backend_against_stand_in_server():
+    fakeredis = pytest.importorskip("fakeredis")
+    from fastapi_cache.backends.redis import RedisBackend
+
+    backend = RedisBackend(fakeredis.FakeAsyncRedis())
+
+    async def scenario():
+        await backend.set("cgms:list:a", b"value", expire=60)
+        assert await backend.get("cgms:list:a") == b"value"
+        ttl, value = await backend.get_with_ttl("cgms:list:a")
+        assert value == b"value" and 0 < ttl <= 60
+
+    run(scenario())
@@ -0,0 +1,91 @@
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("fastapi_cache")
+
+from fastapi_cache import FastAPICache  # noqa: E402
+from fastapi_cache.backends.inmemory import InMemoryBackend  # noqa: E402
+
+from serv.cache import CACHE_PREFIX, TAG_VERSION_TTL, cached, invalidate_tags  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def backend():
+    backend = InMemoryBackend()
+    FastAPICache.init(backend, prefix=CACHE_PREFIX)
+    yield backend
+    FastAPICache.reset()
+
+
+def make_loader():
+    calls = []
+
+    @cached("course", "course:{course_sn}")
+    async def load(course_sn: int, current_user=None):
+        calls.append(course_sn)
+        return {"course_sn": course_sn, "version": len(calls)}
+
+    return load, calls
+
+
+def test_hit_until_tag_invalidated():
+    load, calls = make_loader()
+
+    async def scenario():
+        assert (await load(course_sn=1))["version"] == 1
+        # current_user 不参与缓存键
+        assert (await load(course_sn=1, current_user="other"))["version"] == 1
+        await load(course_sn=2)
+        assert calls == [1, 2]
+
+        await invalidate_tags("course:1")
+        assert (await load(course_sn=1))["version"] == 3
+        # 其他实体的条目不受影响
+        assert (await load(course_sn=2))["version"] == 2
+
+        await invalidate_tags("course")
+        assert (await load(course_sn=2))["version"] == 4
+
+    asyncio.run(scenario())
+
+
+def test_invalidation_survives_in_memory_expiry_sweep():
+    """InMemoryBackend 对未设 expire 的条目会在约 1s 后的读取时删除，
+    标签版本若因此丢失，会退回失效前的版本并命中旧条目"""
+    load, calls = make_loader()
+
+    async def scenario():
+        await load(course_sn=1)
+        await invalidate_tags("course:1")
+        time.sleep(1.1)
+        assert (await load(course_sn=1))["version"] == 2
+        time.sleep(1.1)
+        assert (await load(course_sn=1))["version"] == 2
+
+    asyncio.run(scenario())
+
+
+def test_version_param_keys_entry_without_invalidation():
+    """带版本参数（如班次 ETag）时，版本变化即不再命中，不需要先失效标签"""
+    calls = []
+
+    @cached("roster:{class_sn}")
+    async def load(class_sn: int, version: str):
+        calls.append(version)
+        return {"version": version}
+
+    async def scenario():
+        assert (await load(class_sn=1, version="v1"))["version"] == "v1"
+        assert (await load(class_sn=1, version="v1"))["version"] == "v1"
+        assert (await load(class_sn=1, version="v2"))["version"] == "v2"
+        assert calls == ["v1", "v2"]
+
+    asyncio.run(scenario())
+
+
+def test_expire_longer_than_tag_versions_is_rejected():
+    with pytest.raises(ValueError):
+        cached("course", expire=TAG_VERSION_TTL + 1)
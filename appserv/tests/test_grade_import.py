@@ -0,0 +1,89 @@
+import asyncio
+import io
+import math
+from contextlib import asynccontextmanager
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("openpyxl")
+pytest.importorskip("psycopg")
+
+from fastapi import HTTPException  # noqa: E402
+
+from serv import grade  # noqa: E402
+from serv.auth import User  # noqa: E402
+from serv.error import InvalidError  # noqa: E402
+from serv.grade import grade_file_columns, grade_file_records, read_grade_file  # noqa: E402
+
+CSV_TEXT = "学号,姓名,成绩,备注\n230650101,张三,88,\n230650118,李四,,缺考\n"
+
+
+def new_stats():
+    return {'success': 0, 'failed': 0, 'invalid': 0, 'logs': []}
+
+
+def parse(rows):
+    rows = iter(rows)
+    columns = grade_file_columns(next(rows))
+    stats = new_stats()
+    return list(grade_file_records(rows, columns, stats)), stats
+
+
+@pytest.mark.parametrize("encoding", ["utf-8-sig", "utf-8", "gbk", "gb18030"])
+def test_csv_encodings(encoding):
+    rows = read_grade_file(io.BytesIO(CSV_TEXT.encode(encoding)), "成绩.csv")
+    records, stats = parse(rows)
+    assert records == [("230650101", 88.0), ("230650118", None)]
+    assert stats['invalid'] == 0
+
+
+def test_undecodable_csv_is_rejected():
+    rows = read_grade_file(io.BytesIO(b"\xff\xfe\x00" + bytes(range(128, 256))), "x.csv")
+    with pytest.raises(InvalidError):
+        next(rows)
+
+
+def test_bad_rows_are_reported_per_row():
+    header = ("学号", "姓名", "成绩", "备注")
+    records, stats = parse([
+        header,
+        (230650101.0, "张三", 90, None),     # 数字学号
+        (None, "李四", 80, None),            # 学号为空
+        (math.nan, "王五", 70, None),        # 学号为 NaN
+        (2306501.5, "赵六", 60, None),       # 学号不是整数
+        ("230650118", "钱七", "优", None),   # 成绩格式错误
+        (None, None, None, None),            # 空行
+        ("230650235", "孙八", "nan", None),  # 成绩为 NaN
+    ])
+    assert records == [("230650101", 90.0)]
+    assert stats['invalid'] == 5
+    assert stats['logs'][0].startswith("第 3 行")
+    assert stats['logs'][3].startswith("第 6 行")
+
+
+class FakeCursor:
+    def __init__(self):
+        self.queries = []
+
+    async def execute(self, query, params=None, **kwargs):
+        self.queries.append(query)
+
+    async def fetchone(self):
+        return None
+
+
+def test_import_unknown_class_is_400(monkeypatch):
+    cursor = FakeCursor()
+
+    @asynccontextmanager
+    async def dblock():
+        yield cursor
+
+    monkeypatch.setattr(grade, "dblock", dblock)
+    request = grade.ImportRequest(class_sn=1, records=[])
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(grade.import_grades(request, User(user_sn=1, user_name="t")))
+    assert exc.value.status_code == 400
+    # 事务由 dblock 管理，不再手工发送 BEGIN/COMMIT/ROLLBACK
+    assert not any(q in ("BEGIN", "COMMIT", "ROLLBACK") for q in cursor.queries)
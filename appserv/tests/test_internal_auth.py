@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("jose")
+pytest.importorskip("passlib")
+pytest.importorskip("psycopg")
+
+from fastapi import HTTPException  # noqa: E402
+from fastapi.security import HTTPAuthorizationCredentials  # noqa: E402
+
+from serv import internal  # noqa: E402
+from serv.auth import User  # noqa: E402
+
+USERS = {
+    "jiaomi-token": User(user_sn=1, user_name="jiaomi_admin"),
+    "teacher-token": User(user_sn=2, user_name="teacher"),
+}
+
+
+@pytest.fixture(autouse=True)
+def tokens(monkeypatch):
+    async def user_from_token(token):
+        if token not in USERS:
+            raise HTTPException(status_code=401, detail="无效的令牌")
+        return USERS[token]
+
+    monkeypatch.setattr(internal, "user_from_token", user_from_token)
+    monkeypatch.setattr(internal, "INTERNAL_TOKEN", "scrape-secret")
+
+
+def check(token):
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    return asyncio.run(internal.require_internal_access(credentials))
+
+
+def test_routes_require_access_check():
+    assert any(dep.dependency is internal.require_internal_access
+               for dep in internal.router.dependencies)
+
+
+def test_monitoring_token_and_jiaomi_allowed():
+    check("scrape-secret")
+    check("jiaomi-token")
+
+
+@pytest.mark.parametrize("token, status", [("teacher-token", 403), ("garbage", 401)])
+def test_others_rejected(token, status):
+    with pytest.raises(HTTPException) as exc:
+        check(token)
+    assert exc.value.status_code == status
+
+
+def test_empty_monitoring_token_disabled(monkeypatch):
+    monkeypatch.setattr(internal, "INTERNAL_TOKEN", "")
+    with pytest.raises(HTTPException):
+        check("")
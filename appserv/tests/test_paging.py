@@ -0,0 +1,33 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from serv.error import InvalidError  # noqa: E402
+from serv.paging import decode_cursor, encode_cursor, next_cursor  # noqa: E402
+
+
+def test_round_trip():
+    assert decode_cursor(encode_cursor(10001, 30002), int, int) == [10001, 30002]
+
+
+def test_nullable_key_round_trip():
+    # 班次列表：本页最后一个班次未设置学期
+    rows = [SimpleNamespace(semester=None, class_no="10055-2023S1-01")]
+    cursor = next_cursor(rows, 1, "semester", "class_no")
+    assert decode_cursor(cursor, (str, type(None)), str) == [None, "10055-2023S1-01"]
+    assert decode_cursor(encode_cursor("2023-2024-1", "x"), (str, type(None)), str) == \
+        ["2023-2024-1", "x"]
+
+
+@pytest.mark.parametrize("token, types", [
+    ("not-base64!", (int,)),
+    (encode_cursor(1), (int, int)),
+    (encode_cursor("1"), (int,)),
+    (encode_cursor(True), (int,)),
+    (encode_cursor(None, "x"), (str, str)),
+])
+def test_invalid_cursor(token, types):
+    with pytest.raises(InvalidError):
+        decode_cursor(token, *types)
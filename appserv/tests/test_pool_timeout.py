@@ -0,0 +1,67 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("fastapi_cache")
+pytest.importorskip("psycopg_pool")
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi_cache import FastAPICache  # noqa: E402
+from fastapi_cache.backends.inmemory import InMemoryBackend  # noqa: E402
+from psycopg_pool import PoolTimeout  # noqa: E402
+
+from serv import course  # noqa: E402
+from serv.auth import User, get_current_active_user  # noqa: E402
+from serv.cache import CACHE_PREFIX  # noqa: E402
+from serv.dblock import create_async_dpool  # noqa: E402
+from serv.error import pool_timeout_handler  # noqa: E402
+
+# 没有可用连接的单连接池：借连接只能等到超时
+UNREACHABLE_DSN = "host=127.0.0.1 port=1 connect_timeout=1"
+
+
+async def request(app, path):
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(),
+        "root_path": "", "query_string": b"", "headers": [],
+        "client": ("test", 1), "server": ("test", 80),
+    }
+    await app(scope, receive, send)
+    start = next(m for m in sent if m["type"] == "http.response.start")
+    body = b"".join(m.get("body", b"") for m in sent if m["type"] == "http.response.body")
+    return start["status"], dict(start["headers"]), json.loads(body)
+
+
+def test_pool_timeout_returns_503(monkeypatch):
+    dblock, _ = create_async_dpool(UNREACHABLE_DSN, min_size=0, max_size=1, timeout=0.2)
+    monkeypatch.setattr(course, "dblock", dblock)
+
+    app = FastAPI()
+    app.include_router(course.router)
+    app.add_exception_handler(PoolTimeout, pool_timeout_handler)
+    app.dependency_overrides[get_current_active_user] = lambda: User(user_sn=1, user_name="t")
+
+    async def scenario():
+        FastAPICache.init(InMemoryBackend(), prefix=CACHE_PREFIX)
+        await dblock.pool.open()
+        try:
+            return await request(app, "/api/course/list")
+        finally:
+            await dblock.pool.close(timeout=0)
+            FastAPICache.reset()
+
+    status, headers, body = asyncio.run(scenario())
+    assert status == 503
+    assert headers[b"retry-after"] == b"1"
+    assert body == {"message": "服务繁忙，请稍后重试"}
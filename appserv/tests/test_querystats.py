@@ -0,0 +1,76 @@
+import asyncio
+import json
+import logging
+
+import pytest
+
+pytest.importorskip("starlette")
+pytest.importorskip("psycopg")
+
+from serv import querystats  # noqa: E402
+from serv.querystats import QueryStatsMiddleware, record_query  # noqa: E402
+
+SCOPE = {"type": "http", "method": "GET", "path": "/api/x", "headers": []}
+
+
+def run(app):
+    sent = []
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(QueryStatsMiddleware(app)(dict(SCOPE), receive, send))
+    return sent
+
+
+def access_entries(caplog):
+    return [json.loads(r.getMessage()) for r in caplog.records if r.name == "access"]
+
+
+@pytest.fixture(autouse=True)
+def logs(caplog, monkeypatch):
+    monkeypatch.setattr(querystats, "ACCESS_LOG", True)
+    monkeypatch.setattr(querystats, "QUERY_REPEAT_WARN", 2)
+    caplog.set_level(logging.INFO)
+
+
+def test_server_timing_and_access_log(caplog):
+    async def app(scope, receive, send):
+        for _ in range(3):
+            record_query("SELECT 1", 0.001)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    sent = run(app)
+    headers = dict(sent[0]["headers"])
+    assert b'desc="3 queries"' in headers[b"server-timing"]
+    [entry] = access_entries(caplog)
+    assert entry["status"] == 200 and entry["db_queries"] == 3 and not entry["streamed"]
+    assert any("N+1" in r.getMessage() for r in caplog.records)
+
+
+def test_streaming_response_skips_warnings(caplog):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        for _ in range(3):
+            record_query("SELECT 1", 0.001)
+            await send({"type": "http.response.body", "body": b"x", "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+
+    run(app)
+    [entry] = access_entries(caplog)
+    assert entry["streamed"] and entry["db_queries"] == 3
+    assert not any("N+1" in r.getMessage() for r in caplog.records)
+
+
+def test_logged_when_app_fails(caplog):
+    async def app(scope, receive, send):
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        run(app)
+    [entry] = access_entries(caplog)
+    assert entry["status"] == 500
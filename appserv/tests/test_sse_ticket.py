@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("fastapi_cache")
+pytest.importorskip("jose")
+pytest.importorskip("passlib")
+pytest.importorskip("psycopg")
+
+from fastapi import HTTPException  # noqa: E402
+from fastapi_cache import FastAPICache  # noqa: E402
+from fastapi_cache.backends.inmemory import InMemoryBackend  # noqa: E402
+
+from serv.auth import User, issue_ticket, redeem_ticket  # noqa: E402
+from serv.cache import CACHE_PREFIX  # noqa: E402
+
+USER = User(user_sn=1, user_name="teacher")
+
+
+@pytest.fixture(autouse=True)
+def backend():
+    backend = InMemoryBackend()
+    FastAPICache.init(backend, prefix=CACHE_PREFIX)
+    yield backend
+    FastAPICache.reset()
+
+
+def test_ticket_is_single_use():
+    async def scenario():
+        ticket = await issue_ticket(USER, "grade-events:1")
+        assert await redeem_ticket(ticket, "grade-events:1") == USER
+        with pytest.raises(HTTPException) as exc:
+            await redeem_ticket(ticket, "grade-events:1")
+        assert exc.value.status_code == 401
+
+    asyncio.run(scenario())
+
+
+def test_ticket_bound_to_scope():
+    async def scenario():
+        ticket = await issue_ticket(USER, "grade-events:1")
+        with pytest.raises(HTTPException):
+            await redeem_ticket(ticket, "grade-events:2")
+        # 用错范围也会作废票据
+        with pytest.raises(HTTPException):
+            await redeem_ticket(ticket, "grade-events:1")
+
+    asyncio.run(scenario())
+
+
+def test_unknown_ticket_rejected():
+    with pytest.raises(HTTPException):
+        asyncio.run(redeem_ticket("forged", "grade-events:1"))
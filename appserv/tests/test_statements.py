@@ -0,0 +1,32 @@
+import pytest
+
+psycopg = pytest.importorskip("psycopg")
+
+from psycopg.adapt import PyFormat, Transformer  # noqa: E402
+
+from serv.statements import STATEMENTS, typed_params  # noqa: E402
+
+
+def param_oids(params):
+    tx = Transformer()
+    return {key: tx.get_dumper(value, PyFormat.AUTO).oid for key, value in params.items()}
+
+
+def test_int_params_share_one_type():
+    # 30000 默认按 int2、40000 按 int4 传递，统一后两者为同一条预备语句
+    assert param_oids(typed_params({"class_sn": 30000})) == \
+        param_oids(typed_params({"class_sn": 40000}))
+
+
+def test_warmup_matches_real_values():
+    for stmt in STATEMENTS.values():
+        if stmt.warmup is None:
+            continue
+        real = {key: 10**6 if type(value) is int else value for key, value in stmt.warmup.items()}
+        assert param_oids(typed_params(stmt.warmup)) == param_oids(typed_params(real)), stmt.name
+
+
+def test_non_int_params_unchanged():
+    params = {"username": "u", "flag": True, "grades": [1, 2]}
+    assert typed_params(params) == params
+    assert typed_params(None) is None
@@ -0,0 +1,92 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("fastapi_cache")
+
+from fastapi_cache import FastAPICache  # noqa: E402
+from fastapi_cache.backends.inmemory import InMemoryBackend  # noqa: E402
+
+from serv.cache import CACHE_PREFIX  # noqa: E402
+from serv.totals import TotalsCache  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def backend():
+    backend = InMemoryBackend()
+    FastAPICache.init(backend, prefix=CACHE_PREFIX)
+    yield backend
+    FastAPICache.reset()
+
+
+class CountingDb:
+    """只记录 COUNT(*) 执行次数的游标替身"""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.queries = 0
+
+    async def execute(self, sql, params=None):
+        self.queries += 1
+
+    async def fetchone(self):
+        return SimpleNamespace(total=self.total)
+
+
+def total(cache, db, key, tables):
+    return asyncio.run(cache.total(db, key, "FROM t", tables=tables))
+
+
+def invalidate(cache, *tables):
+    asyncio.run(cache.invalidate(*tables))
+
+
+def test_cached_until_invalidated():
+    cache, db = TotalsCache(), CountingDb(5)
+    assert total(cache, db, "k", ("a",)) == (5, False)
+    assert total(cache, db, "k", ("a",)) == (5, False)
+    assert db.queries == 1
+
+    invalidate(cache, "a")
+    db.total = 6
+    assert total(cache, db, "k", ("a",)) == (6, False)
+    assert db.queries == 2
+
+
+def test_invalidate_removes_key_from_every_table():
+    cache, db = TotalsCache(), CountingDb(1)
+    total(cache, db, "join", ("a", "b", "c"))
+
+    invalidate(cache, "a")
+    assert "join" not in cache._counts
+    assert cache._tables == {}
+
+
+def test_repeated_store_does_not_grow_indexes():
+    cache, db = TotalsCache(), CountingDb(1)
+    for _ in range(100):
+        total(cache, db, "join", ("a", "b"))
+        invalidate(cache, "b")
+    assert cache._tables == {}
+
+
+def test_eviction_cleans_table_index():
+    cache, db = TotalsCache(max_entries=2), CountingDb(1)
+    for key in ("k1", "k2", "k3"):
+        total(cache, db, key, ("a", "b"))
+    assert set(cache._counts) == {"k2", "k3"}
+    assert cache._tables == {"a": {"k2", "k3"}, "b": {"k2", "k3"}}
+
+
+def test_invalidation_reaches_other_workers():
+    """两个实例模拟两个 worker，共用缓存后端中的表版本"""
+    writer, reader, db = TotalsCache(), TotalsCache(), CountingDb(1)
+    assert total(reader, db, "k", ("a",)) == (1, False)
+    assert total(reader, db, "k", ("a",)) == (1, False)
+    assert db.queries == 1
+
+    db.total = 2
+    invalidate(writer, "a")
+    assert total(reader, db, "k", ("a",)) == (2, False)
+    assert db.queries == 2
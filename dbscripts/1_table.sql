@@ -157,6 +157,10 @@ CREATE INDEX IF NOT EXISTS idx_grade_stu_class ON class_grade(stu_sn, class_sn);
 CREATE INDEX IF NOT EXISTS idx_class_course ON class 
     USING BTREE (sn, cou_sn);
 
+-- 班次列表游标分页（ORDER BY semester DESC, class_no）
+CREATE INDEX IF NOT EXISTS idx_class_semester_no ON class
+    USING BTREE (semester DESC, class_no);
+
 -- === 确保一个学生只能关联到同一课程的一个班次
 -- 添加辅助列并创建函数索引
 ALTER TABLE class_student ADD COLUMN cou_sn INTEGER;
@@ -224,3 +228,212 @@ JOIN class_student cs ON s.sn = cs.stu_sn  -- 先连接学生与班次关系
 JOIN class cl ON cs.class_sn = cl.sn       -- 再连接班次信息
 JOIN course c ON cl.cou_sn = c.sn          -- 最后连接课程信息
 LEFT JOIN class_grade g ON g.stu_sn = s.sn AND g.class_sn = cl.sn;  -- 左联成绩表
+
+
+-- === 班次版本变更通知
+-- class.updated_at 变化时通知应用（成绩录入页面据此刷新，替代轮询）
+CREATE OR REPLACE FUNCTION notify_class_version()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('class_version', json_build_object(
+        'class_sn', NEW.sn,
+        'updated_at', NEW.updated_at
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_notify_class_version
+AFTER UPDATE OF updated_at ON class
+FOR EACH ROW
+WHEN (OLD.updated_at IS DISTINCT FROM NEW.updated_at)
+EXECUTE FUNCTION notify_class_version();
+
+
+-- === 成绩汇总表（每个学生一行，及每个学生每学期一行）
+-- 由下面的触发器随 class_grade / class_student / course / class 的变化增量维护，
+-- 报表、排名直接读取；数据不一致时执行 SELECT rebuild_grade_summary() 重建
+CREATE TABLE IF NOT EXISTS student_semester_summary (
+    stu_sn        INTEGER NOT NULL REFERENCES student(sn) ON DELETE CASCADE,
+    semester      VARCHAR(11) NOT NULL,           -- 学期（班次未设置学期时为空串）
+    course_count  INTEGER NOT NULL DEFAULT 0,     -- 选课门数
+    passed_count  INTEGER NOT NULL DEFAULT 0,     -- 及格门数
+    failed_count  INTEGER NOT NULL DEFAULT 0,     -- 不及格门数
+    total_credits NUMERIC(7,2) NOT NULL DEFAULT 0,   -- 已获学分（及格课程）
+    weighted_sum  NUMERIC(10,2) NOT NULL DEFAULT 0,  -- 及格课程 成绩×学分 之和
+    gpa           NUMERIC(5,2) GENERATED ALWAYS AS (  -- 加权平均分
+        CASE WHEN total_credits > 0 THEN ROUND(weighted_sum / total_credits, 2) ELSE 0 END
+    ) STORED,
+    PRIMARY KEY (stu_sn, semester)
+);
+
+CREATE TABLE IF NOT EXISTS student_grade_summary (
+    stu_sn        INTEGER PRIMARY KEY REFERENCES student(sn) ON DELETE CASCADE,
+    course_count  INTEGER NOT NULL DEFAULT 0,
+    passed_count  INTEGER NOT NULL DEFAULT 0,
+    failed_count  INTEGER NOT NULL DEFAULT 0,
+    total_credits NUMERIC(7,2) NOT NULL DEFAULT 0,
+    weighted_sum  NUMERIC(10,2) NOT NULL DEFAULT 0,
+    gpa           NUMERIC(5,2) GENERATED ALWAYS AS (
+        CASE WHEN total_credits > 0 THEN ROUND(weighted_sum / total_credits, 2) ELSE 0 END
+    ) STORED,
+    updated_at    TIMESTAMP DEFAULT NOW()
+);
+
+-- 排名查询
+CREATE INDEX IF NOT EXISTS idx_grade_summary_gpa
+    ON student_grade_summary (gpa DESC, stu_sn);
+CREATE INDEX IF NOT EXISTS idx_semester_summary_gpa
+    ON student_semester_summary (semester, gpa DESC, stu_sn);
+
+-- 重新计算一批学生的汇总（集合方式，每个学生只涉及自己的选课记录）
+-- 先按 sn 顺序锁定学生行：并发事务刷新同一学生时依次执行，
+-- 否则两边都 DELETE 后 INSERT，后提交的一方违反主键约束。
+-- 等到锁后，READ COMMITTED 下后续语句能看到先提交事务的改动，汇总结果是最新的。
+-- FOR NO KEY UPDATE 不阻塞选课/成绩表外键检查所需的 KEY SHARE 锁
+CREATE OR REPLACE FUNCTION refresh_grade_summary(p_stu_sns INTEGER[])
+RETURNS VOID AS $$
+BEGIN
+    IF p_stu_sns IS NULL OR cardinality(p_stu_sns) = 0 THEN
+        RETURN;
+    END IF;
+
+    PERFORM 1 FROM student WHERE sn = ANY(p_stu_sns) ORDER BY sn FOR NO KEY UPDATE;
+
+    DELETE FROM student_semester_summary WHERE stu_sn = ANY(p_stu_sns);
+    INSERT INTO student_semester_summary
+        (stu_sn, semester, course_count, passed_count, failed_count, total_credits, weighted_sum)
+    SELECT cs.stu_sn, COALESCE(cl.semester, ''),
+           COUNT(*),
+           COUNT(*) FILTER (WHERE g.grade >= 60),
+           COUNT(*) FILTER (WHERE g.grade < 60),
+           COALESCE(SUM(c.credit) FILTER (WHERE g.grade >= 60), 0),
+           COALESCE(SUM(g.grade * c.credit) FILTER (WHERE g.grade >= 60), 0)
+    FROM class_student cs
+    JOIN class cl ON cl.sn = cs.class_sn
+    JOIN course c ON c.sn = cl.cou_sn
+    LEFT JOIN class_grade g ON g.stu_sn = cs.stu_sn AND g.class_sn = cs.class_sn
+    WHERE cs.stu_sn = ANY(p_stu_sns)
+    GROUP BY cs.stu_sn, COALESCE(cl.semester, '');
+
+    INSERT INTO student_grade_summary
+        (stu_sn, course_count, passed_count, failed_count, total_credits, weighted_sum, updated_at)
+    SELECT s.sn,
+           COALESCE(SUM(ss.course_count), 0),
+           COALESCE(SUM(ss.passed_count), 0),
+           COALESCE(SUM(ss.failed_count), 0),
+           COALESCE(SUM(ss.total_credits), 0),
+           COALESCE(SUM(ss.weighted_sum), 0),
+           NOW()
+    FROM student s
+    LEFT JOIN student_semester_summary ss ON ss.stu_sn = s.sn
+    WHERE s.sn = ANY(p_stu_sns)
+    GROUP BY s.sn
+    ON CONFLICT (stu_sn) DO UPDATE SET
+        course_count = EXCLUDED.course_count,
+        passed_count = EXCLUDED.passed_count,
+        failed_count = EXCLUDED.failed_count,
+        total_credits = EXCLUDED.total_credits,
+        weighted_sum = EXCLUDED.weighted_sum,
+        updated_at = EXCLUDED.updated_at;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 全量重建
+CREATE OR REPLACE FUNCTION rebuild_grade_summary()
+RETURNS INTEGER AS $$
+DECLARE
+    v_stu_sns INTEGER[] := ARRAY(SELECT sn FROM student);
+BEGIN
+    TRUNCATE student_semester_summary, student_grade_summary;
+    PERFORM refresh_grade_summary(v_stu_sns);
+    RETURN cardinality(v_stu_sns);
+END;
+$$ LANGUAGE plpgsql;
+
+-- class_grade / class_student 变化：按语句汇总受影响的学生，一条语句只刷新一次
+CREATE OR REPLACE FUNCTION trg_refresh_grade_summary()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM refresh_grade_summary(ARRAY(SELECT DISTINCT stu_sn FROM changed_rows));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- UPDATE 可能改动 stu_sn 或 class_sn（换班）：新旧两侧的学生都要刷新
+CREATE OR REPLACE FUNCTION trg_refresh_grade_summary_upd()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM refresh_grade_summary(ARRAY(
+        SELECT stu_sn FROM old_rows UNION SELECT stu_sn FROM new_rows
+    ));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_grade_summary_grade_ins
+AFTER INSERT ON class_grade REFERENCING NEW TABLE AS changed_rows
+FOR EACH STATEMENT EXECUTE FUNCTION trg_refresh_grade_summary();
+CREATE TRIGGER trg_grade_summary_grade_upd
+AFTER UPDATE ON class_grade REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION trg_refresh_grade_summary_upd();
+CREATE TRIGGER trg_grade_summary_grade_del
+AFTER DELETE ON class_grade REFERENCING OLD TABLE AS changed_rows
+FOR EACH STATEMENT EXECUTE FUNCTION trg_refresh_grade_summary();
+
+CREATE TRIGGER trg_grade_summary_enroll_ins
+AFTER INSERT ON class_student REFERENCING NEW TABLE AS changed_rows
+FOR EACH STATEMENT EXECUTE FUNCTION trg_refresh_grade_summary();
+CREATE TRIGGER trg_grade_summary_enroll_upd
+AFTER UPDATE ON class_student REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION trg_refresh_grade_summary_upd();
+CREATE TRIGGER trg_grade_summary_enroll_del
+AFTER DELETE ON class_student REFERENCING OLD TABLE AS changed_rows
+FOR EACH STATEMENT EXECUTE FUNCTION trg_refresh_grade_summary();
+
+-- 课程学分变化：刷新选了该课程的学生
+CREATE OR REPLACE FUNCTION trg_refresh_grade_summary_course()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM refresh_grade_summary(ARRAY(
+        SELECT DISTINCT cs.stu_sn
+        FROM new_courses n
+        JOIN old_courses o ON o.sn = n.sn
+        JOIN class cl ON cl.cou_sn = n.sn
+        JOIN class_student cs ON cs.class_sn = cl.sn
+        WHERE n.credit IS DISTINCT FROM o.credit
+    ));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_grade_summary_course
+AFTER UPDATE ON course REFERENCING OLD TABLE AS old_courses NEW TABLE AS new_courses
+FOR EACH STATEMENT EXECUTE FUNCTION trg_refresh_grade_summary_course();
+
+-- 班次学期或所属课程变化：刷新该班次的学生
+CREATE OR REPLACE FUNCTION trg_refresh_grade_summary_class()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM refresh_grade_summary(ARRAY(
+        SELECT stu_sn FROM class_student WHERE class_sn = NEW.sn
+    ));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_grade_summary_class
+AFTER UPDATE OF semester, cou_sn ON class
+FOR EACH ROW
+WHEN (OLD.semester IS DISTINCT FROM NEW.semester OR OLD.cou_sn IS DISTINCT FROM NEW.cou_sn)
+EXECUTE FUNCTION trg_refresh_grade_summary_class();
+
+
+-- === 学生搜索（/api/student/search）
+-- 学号前缀匹配：text_pattern_ops 使 LIKE 'xxx%' 在任何排序规则下都能走索引
+CREATE INDEX IF NOT EXISTS idx_student_no_prefix ON student
+    USING BTREE (no text_pattern_ops);
+-- 姓名模糊匹配：三元组索引支持 ILIKE '%xx%' 与相似度运算符 %
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS idx_student_name_trgm ON student
+    USING GIN (name gin_trgm_ops);
@@ -0,0 +1,244 @@
+"""生成大数据量测试数据
+
+2_data.sql 只有几百行，查询计划、分页等问题在开发环境中显现不出来。
+本脚本按指定规模生成学生、课程、多学期班次、选课记录与成绩，用 COPY 装入数据库：
+
+    python dbscripts/gen_data.py --students 100000
+
+- 学生分属 4 个年级（2021–2024 级），学号格式与现有数据一致（年级2位+专业3位+班2位+序号2位）；
+- 每个学生在入学后的每个学期选 --per-semester 门课，同一门课只选一次（满足 idx_student_course_unique）；
+- 班次按每学期每门课的预计选课人数与 --capacity 分班，班次号格式为“课程号-年份S学期-序号”；
+- 已结束学期的选课基本都有成绩，当前学期只有少部分已录入。
+
+会清空学生、课程、班次、选课、成绩及日志表（保留 sys_users 用户）。
+全部数据在一个事务中装入：先 TRUNCATE 再 COPY FREEZE，装入期间停用选课/成绩表上的触发器
+（cou_sn 由脚本直接写入），最后调用 rebuild_grade_summary() 重建成绩汇总表。
+数据装入后需要重启服务（进程内的总数缓存不会自动失效）。
+"""
+import argparse
+import math
+import os
+import random
+import tempfile
+import time
+
+import psycopg
+
+DSN = os.getenv("DATABASE_URL", "host=localhost dbname=examdb user=examdb")
+
+# 与 1_table.sql 中各序列的起始值一致
+STUDENT_SN_START = 10000
+COURSE_SN_START = 20000
+CLASS_SN_START = 30000
+
+COHORTS = (2021, 2022, 2023, 2024)
+# 每个年级每个专业的人数（学号中班 2 位、序号 2 位）
+MAJOR_SIZE = 200
+CLASS_SIZE = 40
+
+SURNAMES = "王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗郑梁谢宋唐许韩冯邓曹彭曾肖田董袁潘于蒋蔡余杜叶程苏魏吕丁任沈姚卢姜"
+GIVEN = "伟芳娜敏静丽强磊军洋勇艳杰娟涛明超秀霞平刚桂英华玉萍红鹏辉建国文斌宇浩凯佳欣雨晨子涵怡轩博"
+SUBJECTS = ("高等数学", "线性代数", "概率论", "大学英语", "大学物理", "程序设计", "数据结构",
+            "操作系统", "计算机网络", "数据库原理", "软件工程", "管理学", "经济学", "会计学",
+            "市场营销", "统计学", "机械制图", "电路分析", "有机化学", "细胞生物学")
+BUILDINGS = ("教学楼A", "教学楼B", "教学楼C", "实验楼", "外语楼", "综合楼")
+
+
+def semesters(years: int) -> list[tuple[int, int]]:
+    """最近 years 个学年的学期：(学年起始年份, 学期 1/2)，最后一个学期为当前学期"""
+    last = COHORTS[-1]
+    return [(year, term) for year in range(last - years + 1, last + 1) for term in (1, 2)]
+
+
+def semester_label(year: int, term: int) -> str:
+    return f"{year}-{year + 1}-{term}"
+
+
+def student_rows(rng: random.Random, count: int):
+    """(sn, no, name, gender, enrollment_date, 年级)"""
+    per_cohort = math.ceil(count / len(COHORTS))
+    if per_cohort > 999 * MAJOR_SIZE:
+        raise SystemExit(f"每个年级最多 {999 * MAJOR_SIZE} 名学生")
+    for i in range(count):
+        cohort = COHORTS[i % len(COHORTS)]
+        k = i // len(COHORTS)
+        major, rest = divmod(k, MAJOR_SIZE)
+        klass, seq = divmod(rest, CLASS_SIZE)
+        no = f"{cohort % 100:02d}{major + 1:03d}{klass + 1:02d}{seq + 1:02d}"
+        name = rng.choice(SURNAMES) + "".join(rng.choices(GIVEN, k=rng.choice((1, 2, 2))))
+        yield STUDENT_SN_START + i, no, name, rng.choice("MF"), f"{cohort}-09-01", cohort
+
+
+def course_rows(rng: random.Random, count: int):
+    """(sn, no, name, credit, hours)"""
+    for i in range(count):
+        credit = rng.choice((1, 2, 2, 3, 3, 4))
+        name = f"{SUBJECTS[i % len(SUBJECTS)]}{'' if i < len(SUBJECTS) else i // len(SUBJECTS) + 1}"
+        yield COURSE_SN_START + i, f"{10000 + i:05d}", name, credit, credit * 16
+
+
+def generate(conn, args):
+    rng = random.Random(args.seed)
+    terms = semesters(args.years)
+    n_courses = args.courses or max(50, args.students // 200)
+    if n_courses > 90000:
+        raise SystemExit("课程号为 5 位数字，最多 90000 门课程")
+    if n_courses < args.per_semester * len(terms):
+        raise SystemExit("课程数不足以让学生每学期选满且不重复选课")
+
+    timings = {}
+
+    def timed(label, started):
+        timings[label] = time.perf_counter() - started
+
+    # 触发器与序列等对象属于建表用户；停用触发器的语句随事务回滚
+    conn.execute("""
+        TRUNCATE class_grade, class_student, class, course, student,
+                 grade_import_logs, grade_audit_log,
+                 student_semester_summary, student_grade_summary
+        RESTART IDENTITY
+    """)
+    conn.execute("ALTER TABLE class_student DISABLE TRIGGER USER")
+    conn.execute("ALTER TABLE class_grade DISABLE TRIGGER USER")
+
+    started = time.perf_counter()
+    cohorts = []
+    with conn.cursor().copy(
+        "COPY student (sn, no, name, gender, enrollment_date) FROM STDIN WITH (FREEZE)"
+    ) as copy:
+        for sn, no, name, gender, enrolled, cohort in student_rows(rng, args.students):
+            copy.write_row((sn, no, name, gender, enrolled))
+            cohorts.append(cohort)
+    timed("student", started)
+
+    started = time.perf_counter()
+    courses = list(course_rows(rng, n_courses))
+    with conn.cursor().copy(
+        "COPY course (sn, no, name, credit, hours) FROM STDIN WITH (FREEZE)"
+    ) as copy:
+        for row in courses:
+            copy.write_row(row)
+    timed("course", started)
+
+    # 每学期每门课的班次数：按该学期在读人数平均分到各门课估算
+    started = time.perf_counter()
+    active = [sum(1 for cohort in cohorts if cohort <= year) for year, _ in terms]
+    sections = [[0] * len(terms) for _ in range(n_courses)]
+    class_base = [[0] * len(terms) for _ in range(n_courses)]
+    next_sn = CLASS_SN_START
+    with conn.cursor().copy(
+        "COPY class (sn, class_no, name, semester, location, cou_sn, class_seq) "
+        "FROM STDIN WITH (FREEZE)"
+    ) as copy:
+        for t, (year, term) in enumerate(terms):
+            expected = active[t] * args.per_semester / n_courses
+            count = min(99, max(1, math.ceil(expected / args.capacity)))
+            for c, (cou_sn, cou_no, cou_name, _, _) in enumerate(courses):
+                sections[c][t] = count
+                class_base[c][t] = next_sn
+                for seq in range(1, count + 1):
+                    location = f"{rng.choice(BUILDINGS)}{rng.randint(1, 5)}{rng.randint(1, 30):02d}"
+                    copy.write_row((
+                        next_sn, f"{cou_no}-{year}S{term}-{seq:02d}", f"{cou_name}_{seq:02d}",
+                        semester_label(year, term), location, cou_sn, seq,
+                    ))
+                    next_sn += 1
+    timed("class", started)
+
+    # 选课与成绩同时生成：选课直接 COPY，成绩先写入临时文件，选课装入后再 COPY
+    started = time.perf_counter()
+    enrollments = graded = 0
+    with tempfile.TemporaryFile("w+", encoding="utf-8") as grades:
+        with conn.cursor().copy(
+            "COPY class_student (stu_sn, class_sn, cou_sn) FROM STDIN WITH (FREEZE)"
+        ) as copy:
+            for i, cohort in enumerate(cohorts):
+                stu_sn = STUDENT_SN_START + i
+                taken = set()
+                for t, (year, _) in enumerate(terms):
+                    if cohort > year:
+                        continue
+                    current = t == len(terms) - 1
+                    chosen = 0
+                    while chosen < args.per_semester:
+                        c = rng.randrange(n_courses)
+                        if c in taken:
+                            continue
+                        taken.add(c)
+                        chosen += 1
+                        class_sn = class_base[c][t] + rng.randrange(sections[c][t])
+                        copy.write_row((stu_sn, class_sn, COURSE_SN_START + c))
+                        enrollments += 1
+                        if rng.random() < (args.current_graded if current else 0.97):
+                            grade = min(100.0, max(0.0, rng.gauss(76, 12)))
+                            grades.write(f"{stu_sn}\t{class_sn}\t{grade:.1f}\n")
+                            graded += 1
+        timed("class_student", started)
+
+        started = time.perf_counter()
+        grades.seek(0)
+        with conn.cursor().copy(
+            "COPY class_grade (stu_sn, class_sn, grade) FROM STDIN WITH (FREEZE)"
+        ) as copy:
+            while chunk := grades.read(1 << 20):
+                copy.write(chunk)
+        timed("class_grade", started)
+
+    conn.execute("ALTER TABLE class_student ENABLE TRIGGER USER")
+    conn.execute("ALTER TABLE class_grade ENABLE TRIGGER USER")
+
+    started = time.perf_counter()
+    conn.execute("SELECT rebuild_grade_summary()")
+    timed("summary", started)
+
+    # 显式指定了 sn，序列从已用的最大值之后继续
+    conn.execute("SELECT setval('seq_student_sn', %s)", (STUDENT_SN_START + args.students - 1,))
+    conn.execute("SELECT setval('seq_course_sn', %s)", (COURSE_SN_START + n_courses - 1,))
+    conn.execute("SELECT setval('seq_class_sn', %s)", (next_sn - 1,))
+
+    counts = {
+        "student": args.students,
+        "course": n_courses,
+        "class": next_sn - CLASS_SN_START,
+        "class_student": enrollments,
+        "class_grade": graded,
+    }
+    return counts, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dsn", default=DSN)
+    parser.add_argument("--students", type=int, default=10000, help="学生数（1000–500000）")
+    parser.add_argument("--courses", type=int, help="课程数（默认 学生数/200，至少 50）")
+    parser.add_argument("--years", type=int, default=2, choices=range(1, 5),
+                        help="生成最近几个学年的班次（每学年两个学期）")
+    parser.add_argument("--per-semester", type=int, default=5, help="每个学生每学期选课门数")
+    parser.add_argument("--capacity", type=int, default=60, help="每个班次的预计人数")
+    parser.add_argument("--current-graded", type=float, default=0.3,
+                        help="当前学期已录入成绩的比例")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    if not 1000 <= args.students <= 500000:
+        parser.error("--students 的范围为 1000–500000")
+
+    started = time.perf_counter()
+    with psycopg.connect(args.dsn) as conn:
+        counts, timings = generate(conn, args)
+    loaded = time.perf_counter() - started
+
+    # 更新统计信息，使查询计划按新的数据量估算
+    with psycopg.connect(args.dsn, autocommit=True) as conn:
+        analyze_started = time.perf_counter()
+        conn.execute("ANALYZE")
+        timings["analyze"] = time.perf_counter() - analyze_started
+
+    for table, count in counts.items():
+        print(f"{table:<14} {count:>10} 行  {timings[table]:>7.2f}s")
+    print(f"{'summary':<14} {'':>10}     {timings['summary']:>7.2f}s")
+    print(f"{'analyze':<14} {'':>10}     {timings['analyze']:>7.2f}s")
+    print(f"装入用时 {loaded:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -32,15 +32,22 @@ export default function ClassStudentSelection({ classinfo }) {
   const [initialSelected, setInitialSelected] = useState(new Set());
   const [lastSubmitted, setLastSubmitted] = useState(new Set());
 
-  // 2. 安全获取学生数据：分页获取所有学生
+  // 2. 安全获取学生数据：按游标逐页获取所有学生
   const studentFetcher = async (url) => {
     const res = await fetcher(url);
     console.log("studentFetcher response:", res); // 打印响应数据，检查是否正确
-    // 假设后端返回格式为 { data: [...] }，根据实际情况调整
-    return res?.data || [];
+    // 后端返回格式为 { data: [...], total, next }，next 为下一页游标
+    return { data: res?.data || [], next: res?.next || null };
+  };
+  const getStudentPageKey = (index, previousPage) => {
+    if (index === 0) return "/api/student/list?page_size=20";
+    if (!previousPage?.next) return null; // 已到最后一页
+    return `/api/student/list?page_size=20&after=${encodeURIComponent(
+      previousPage.next
+    )}`;
   };
   const { data, size, setSize, isValidating, error } = useSWRInfinite(
-    (index) => `/api/student/list?page=${index + 1}&page_size=20`,
+    getStudentPageKey,
     studentFetcher,
     {
       dedupingInterval: 30000, // 30秒内相同请求合并
@@ -48,6 +55,17 @@ export default function ClassStudentSelection({ classinfo }) {
       revalidateFirstPage: false, // 保持第一页数据稳定
     }
   );
+  // 有搜索词时改用服务端搜索（学号前缀 / 姓名模糊匹配）
+  const { data: searchResults } = useSWR(
+    searchTerm
+      ? `/api/student/search?q=${encodeURIComponent(searchTerm)}&limit=100`
+      : null,
+    fetcher,
+    {
+      dedupingInterval: 30000,
+      revalidateOnFocus: false,
+    }
+  );
   if (error) {
     console.error("Error loading student data:", error);
     return <div>加载学生数据时出错</div>;
@@ -86,7 +104,7 @@ export default function ClassStudentSelection({ classinfo }) {
       return [];
     }
     // 合并所有页数据并去重
-    const merged = data.flat();
+    const merged = data.flatMap((page) => page?.data || []);
     const uniqueStudents = [];
     const seen = new Set();
 
@@ -109,17 +127,12 @@ export default function ClassStudentSelection({ classinfo }) {
       : [];
   }, [linkedResponse]);
 
-  // 过滤学生列表（改进点4）
+  // 过滤学生列表（改进点4）：搜索由服务端完成
   const filteredStudents = useMemo(() => {
+    if (searchTerm) return Array.isArray(searchResults) ? searchResults : [];
     if (!Array.isArray(allStudents)) return [];
-    return allStudents.filter(
-      (
-        student // 添加空值保护：在过滤逻辑中添加可选链操作符（?.）
-      ) =>
-        student?.stu_no?.toLowerCase().includes(searchTerm.toLowerCase()) ||
-        student?.stu_name?.toLowerCase().includes(searchTerm.toLowerCase())
-    );
-  }, [allStudents, searchTerm]);
+    return allStudents;
+  }, [allStudents, searchTerm, searchResults]);
 
   useEffect(() => {
     //调试
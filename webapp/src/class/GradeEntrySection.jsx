@@ -1,6 +1,6 @@
 import { Table, InputNumber, Button, message, Modal, Alert } from "antd";
 import { useState, useEffect, useRef } from "react";
-import { fetcher } from "../utils";
+import { fetcher, subscribe } from "../utils";
 import {
   GradeEntryContainer,
   GradeToolbar,
@@ -14,6 +14,8 @@ export default function GradeEntrySection({ classinfo }) {
   const autoSaveTimer = useRef(null); // 定时器引用
   const countdownInterval = useRef(null); // 倒计时定时器引用
   const lastVersion = useRef(null); // 新增版本追踪
+  const pendingSaves = useRef(0); // 进行中的保存请求数
+  const bufferedVersion = useRef(null); // 保存期间收到的版本推送
 
   const [students, setStudents] = useState([]);
   const [loading, setLoading] = useState(false);
@@ -27,7 +29,6 @@ export default function GradeEntrySection({ classinfo }) {
   const initialGrades = useRef(new Map()); // 使用Map存储初始成绩
   const [autoSaveCountdown, setAutoSaveCountdown] = useState(0);
   const AUTO_SAVE_DELAY = 30000; // 自动保存延迟（毫秒）
-  const DATA_CHECK_INTERVAL = 60000; // 数据检查间隔（毫秒）
 
   const loadData = async () => {
     setLoading(true);
@@ -66,18 +67,42 @@ export default function GradeEntrySection({ classinfo }) {
     }
   }, [classinfo.class_sn]);
 
-  // 在组件中新增版本检查逻辑
+  // 收到的版本与本地版本不同时，说明他人修改了数据
+  const checkVersion = (version) => {
+    if (lastVersion.current && version !== lastVersion.current) {
+      message.warning("检测到数据更新，正在刷新...");
+      loadData(); // 重新加载数据
+    }
+  };
+
+  // 保存期间先暂存推送：自己保存产生的推送可能早于保存响应到达
+  const beginSave = () => {
+    pendingSaves.current += 1;
+  };
+
+  // 保存结束：记录保存后的版本，再处理暂存的推送（与该版本相同的即自己的改动）
+  const endSave = (result) => {
+    pendingSaves.current -= 1;
+    const version = result?.versions?.[classinfo.class_sn];
+    if (version) lastVersion.current = version;
+    if (pendingSaves.current === 0 && bufferedVersion.current) {
+      const buffered = bufferedVersion.current;
+      bufferedVersion.current = null;
+      checkVersion(buffered);
+    }
+  };
+
+  // 订阅班次版本变更（服务端推送，替代定时轮询）
   useEffect(() => {
-    const interval = setInterval(async () => {
-      const res = await fetcher(
-        `/api/grade/check-conflict/${classinfo.class_sn}`
-      );
-      if (res.version !== lastVersion.current) {
-        message.warning("检测到数据更新，正在刷新...");
-        loadData(); // 重新加载数据
-      }
-    }, DATA_CHECK_INTERVAL);
-    return () => clearInterval(interval);
+    return subscribe(`/api/grade/events/${classinfo.class_sn}`, {
+      version: (event) => {
+        if (pendingSaves.current > 0) {
+          bufferedVersion.current = event.data;
+          return;
+        }
+        checkVersion(event.data);
+      },
+    });
   }, [classinfo.class_sn]);
 
   // 处理成绩变更
@@ -112,12 +137,14 @@ export default function GradeEntrySection({ classinfo }) {
           }));
 
         if (changes.length > 0) {
+          beginSave();
           fetcher("/api/grade/batch", {
             method: "POST",
             headers: { "Content-Type": "application/json" },
             body: JSON.stringify({ grades: changes }),
           })
-            .then(() => {
+            .then((result) => {
+              endSave(result);
               // 自动保存成功后更新基准数据
               initialGrades.current = new Map(
                 newStudents.map((s) => [s.stu_sn, s.grade])
@@ -127,6 +154,7 @@ export default function GradeEntrySection({ classinfo }) {
               message.success("自动保存成功");
             })
             .catch((error) => {
+              endSave(null);
               console.error("自动保存失败:", error);
               message.error("自动保存失败，请手动保存");
             });
@@ -178,13 +206,19 @@ export default function GradeEntrySection({ classinfo }) {
         return;
       }
 
-      const result = await fetcher("/api/grade/batch", {
-        method: "POST",
-        headers: {
-          "Content-Type": "application/json",
-        },
-        body: JSON.stringify({ grades }),
-      });
+      beginSave();
+      let result = null;
+      try {
+        result = await fetcher("/api/grade/batch", {
+          method: "POST",
+          headers: {
+            "Content-Type": "application/json",
+          },
+          body: JSON.stringify({ grades }),
+        });
+      } finally {
+        endSave(result);
+      }
 
       message.success(`成功保存 ${result.updated} 条成绩记录`);
 
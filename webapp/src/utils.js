@@ -48,3 +48,46 @@ export async function fetcher(url, options = {}) {
 
   return await response.json();
 }
+
+// 订阅服务端推送，返回取消订阅的函数
+// EventSource 无法设置请求头：先用令牌换取一次性票据（POST {url}/ticket），
+// 票据放在查询参数中，不会把令牌留在访问日志里。票据只能用一次，断线后重新获取。
+export function subscribe(url, listeners) {
+  let source = null;
+  let retryTimer = null;
+  let closed = false;
+
+  const connect = async () => {
+    try {
+      const { ticket } = await fetcher(`${url}/ticket`, { method: "POST" });
+      if (closed) return;
+      source = new EventSource(
+        `${API_BASE}${url}?ticket=${encodeURIComponent(ticket)}`
+      );
+      Object.entries(listeners).forEach(([type, listener]) =>
+        source.addEventListener(type, listener)
+      );
+      source.onerror = () => {
+        // 连接被关闭时浏览器不会自动重连（旧票据已失效），自行换票重连
+        if (source.readyState === EventSource.CLOSED) reconnect();
+      };
+    } catch (error) {
+      console.error("订阅失败:", error);
+      if (error.status !== 401) reconnect();
+    }
+  };
+
+  const reconnect = () => {
+    if (closed) return;
+    source?.close();
+    source = null;
+    retryTimer = setTimeout(connect, 3000);
+  };
+
+  connect();
+  return () => {
+    closed = true;
+    clearTimeout(retryTimer);
+    source?.close();
+  };
+}